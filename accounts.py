@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+import threading
+
+
+class AccountStore:
+    """
+    Настройки календаря пользователей Telegram
+
+    Для каждого пользователя хранится собственная учетная запись CalDAV
+    (url, username, password) и/или выбранный календарь (calendar).
+    Пользователи без своей учетной записи работают с учетной записью
+    из config.py. Данные хранятся в JSON файле, доступном только владельцу процесса.
+    Пароли записываются открытым текстом: файл защищен только правами доступа,
+    поэтому пользователям следует подключать календарь паролем приложения.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Путь к JSON файлу с настройками (пустая строка - хранить только в памяти)
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self._accounts = None
+        self._mtime = None
+
+    def _load(self) -> dict:
+        # Файл перечитывается при изменении: его могут менять другие процессы бота
+        mtime = None
+        if self.path:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                pass
+        if self._accounts is None or mtime != self._mtime:
+            self._accounts = {}
+            self._mtime = mtime
+            if mtime is not None:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._accounts = json.load(f)
+                except FileNotFoundError:
+                    pass
+                except (OSError, ValueError) as e:
+                    logging.error(f"Не удалось прочитать файл учетных записей {self.path}: {e}")
+        return self._accounts
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            # Файл содержит пароли, поэтому создается с правами только для владельца
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._accounts, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logging.error(f"Не удалось сохранить файл учетных записей {self.path}: {e}")
+
+    def get(self, user_id: int) -> dict:
+        """
+        Настройки пользователя
+
+        :return: Словарь с ключами url, username, password, calendar (любой может отсутствовать)
+        """
+        with self.lock:
+            return dict(self._load().get(str(user_id), {}))
+
+    def set_account(self, user_id: int, url: str, username: str, password: str) -> None:
+        """Сохранение собственной учетной записи пользователя; выбранный календарь сбрасывается"""
+        with self.lock:
+            self._load()[str(user_id)] = {'url': url, 'username': username, 'password': password}
+            self._save()
+
+    def set_calendar(self, user_id: int, calendar_url: str) -> None:
+        """Сохранение выбранного пользователем календаря"""
+        with self.lock:
+            self._load().setdefault(str(user_id), {})['calendar'] = calendar_url
+            self._save()
+
+    def remove(self, user_id: int) -> bool:
+        """
+        Удаление настроек пользователя
+
+        :return: True если настройки были сохранены
+        """
+        with self.lock:
+            removed = self._load().pop(str(user_id), None) is not None
+            if removed:
+                self._save()
+            return removed
@@ -0,0 +1 @@
+"""Нагрузочные тесты бота против локальной заглушки CalDAV сервера"""
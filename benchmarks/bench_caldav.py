@@ -0,0 +1,97 @@
+"""
+Нагрузочный тест CalendarManager против локальной заглушки CalDAV
+
+Сравнивает последовательное выполнение блокирующих вызовов прямо в цикле
+событий (поведение до переноса caldav в пул потоков) с выполнением через
+ограниченный пул потоков, а также последовательное и массовое добавление событий.
+
+Запуск: python -m benchmarks.bench_caldav --requests 200 --latency 0.05 --bulk 1000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import Timer, configure_env
+from benchmarks.fake_caldav import FakeCalDAVServer
+
+
+async def _measure(timer: Timer, coro) -> None:
+    # Задержка считается от общего момента отправки всех запросов
+    await coro
+    timer.add(time.perf_counter() - timer.started)
+
+
+async def run_list_events(manager, requests: int, inline: bool) -> Timer:
+    """Одновременный запуск requests запросов недельного списка событий"""
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=7)
+
+    async def blocking_list():
+        # Поведение до переноса в пул: синхронный вызов внутри корутины
+        return manager._fetch_events(start, end)
+
+    name = "list_events (в цикле событий)" if inline else "list_events (пул потоков)"
+    with Timer(name) as timer:
+        await asyncio.gather(*(
+            _measure(timer, blocking_list() if inline else manager.list_events(start, end))
+            for _ in range(requests)
+        ))
+    return timer
+
+
+async def run_add_events(manager, count: int, bulk: bool) -> Timer:
+    """Добавление count событий по одному (как отдельные /add_event) или одним пакетом"""
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=30)
+    events = [(f"Пакетное событие {i}", start + timedelta(minutes=15 * i)) for i in range(count)]
+
+    if bulk:
+        with Timer("add_events (время пакета)") as timer:
+            results = await manager.add_events(events)
+        timer.samples = [timer.finished - timer.started] * len(results)
+    else:
+        with Timer("add_event (по одному)") as timer:
+            for summary, start_time in events:
+                started = time.perf_counter()
+                await manager.add_event(summary, start_time)
+                timer.add(time.perf_counter() - started)
+    return timer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200, help="число одновременных запросов")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка сервера в секундах")
+    parser.add_argument("--events", type=int, default=100, help="событий в календаре на неделю")
+    parser.add_argument("--workers", type=int, default=16, help="размер пула потоков CalDAV")
+    parser.add_argument("--cache-ttl", type=float, default=0,
+                        help="TTL кеша событий (0 - проверять изменения при каждом запросе)")
+    parser.add_argument("--no-sync", action="store_true", help="сервер без поддержки sync-collection")
+    parser.add_argument("--bulk", type=int, default=1000, help="число событий для массового добавления (0 - пропустить)")
+    args = parser.parse_args()
+
+    with FakeCalDAVServer(latency=args.latency, sync_support=not args.no_sync) as server:
+        configure_env(server.url, CALDAV_MAX_WORKERS=args.workers, EVENT_CACHE_TTL=args.cache_ttl)
+        import calendar_utils
+
+        server.populate(args.events, datetime.now().replace(hour=0, minute=0, second=0, microsecond=0))
+        manager = calendar_utils.CalendarManager()
+        if not asyncio.run(manager.connect()):
+            raise SystemExit("Не удалось подключиться к заглушке CalDAV")
+
+        print(f"Сервер: {server.url}, задержка {args.latency * 1000:.0f} мс, "
+              f"событий {args.events}, пул {args.workers}")
+        for inline in (True, False):
+            timer = asyncio.run(run_list_events(manager, args.requests, inline))
+            print(timer.report())
+        if args.bulk:
+            # Последовательное добавление измеряется на части событий, чтобы тест не шел минутами
+            print(asyncio.run(run_add_events(manager, min(args.bulk, 100), bulk=False)).report())
+            print(asyncio.run(run_add_events(manager, args.bulk, bulk=True)).report())
+        print(f"Кеш: {manager.cache_stats()}")
+        print(f"Запросы к серверу: {server.request_counts}")
+        calendar_utils.shutdown_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Сквозной нагрузочный тест обработчиков бота с заглушками CalDAV и Telegram
+
+В одном процессе запускаются заглушка CalDAV (задержка и число событий
+настраиваются) и заглушка Bot API, а синтетические пользователи отправляют
+команды через Dispatcher.feed_update в handlers.router: каждый пользователь
+в своем чате ждет ответа на команду и отправляет следующую (закрытая нагрузка).
+Для каждого сценария выводятся пропускная способность, перцентили задержки,
+ошибки, запросы к CalDAV и вызовы Telegram на операцию, а также память:
+пик и прирост выделений tracemalloc (отдельный проход, так как tracemalloc
+замедляет код) и максимальный RSS процесса.
+
+Результаты можно сохранить как эталон (--save-baseline) и сравнивать с ним
+следующие запуски (--baseline): при ухудшении сверх --tolerance тест
+завершается с кодом 1, что позволяет ловить регрессии до выкладки.
+
+Сценарии: events, events_pages, add_event, text_event, bulk, mixed.
+
+Запуск: python -m benchmarks.bench_e2e --users 50 --ops 20 --latency 0.02
+        python -m benchmarks.bench_e2e --save-baseline baseline.json
+        python -m benchmarks.bench_e2e --baseline baseline.json --tolerance 0.25
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.common import configure_env, percentile
+from benchmarks.fake_caldav import FakeCalDAVServer
+
+SCENARIOS = ("events", "events_pages", "add_event", "text_event", "bulk", "mixed")
+
+# Ответы, означающие, что команда не выполнена
+ERROR_MARKERS = ("ошибка", "недоступен", "Слишком много запросов", "Не удалось")
+
+# Показатели сравнения с эталоном: True - чем больше, тем лучше
+COMPARED = {"throughput": True, "p50": False, "p99": False, "memory_peak_mb": False}
+
+
+class Scenario:
+    """
+    Нагрузочный сценарий
+
+    :param make: Функция (контекст, чат, номер операции) -> обновление Telegram
+    :param prepare: Функция с теми же аргументами для обновления, выполняемого перед замером (или None)
+    :param writes: Сколько событий записывает в календарь одна операция
+    """
+
+    def __init__(self, make, prepare=None, writes: int = 0):
+        self.make = make
+        self.prepare = prepare
+        self.writes = writes
+
+
+class Context:
+    """Общее состояние прогона: бот, диспетчер, заглушки и параметры"""
+
+    def __init__(self, args, server, session, bot, dp, handlers):
+        self.args = args
+        self.server = server
+        self.session = session
+        self.bot = bot
+        self.dp = dp
+        self.handlers = handlers
+        self.rng = random.Random(args.seed)
+        self.base_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=30)
+
+    def slot(self, chat_id: int, index: int) -> datetime:
+        """Время нового события: у каждого пользователя и операции свое"""
+        return self.base_day + timedelta(days=chat_id % 60, minutes=15 * (index % 48) + 8 * 60)
+
+
+def make_session_class():
+    from aiogram.methods import EditMessageText, SendMessage
+    from benchmarks.fake_telegram import FakeTelegramSession
+
+    class RecordingSession(FakeTelegramSession):
+        """
+        Заглушка Bot API, которая помнит только последний ответ в каждом чате
+
+        Полный журнал FakeTelegramSession растет с числом операций и искажал бы замер памяти.
+        """
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.last_text = {}
+            self.last_message = {}
+            self.call_count = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            result = await super().make_request(bot, method, timeout)
+            self.call_count += 1
+            self.calls.clear()
+            self.sent.clear()
+            if isinstance(method, (SendMessage, EditMessageText)):
+                self.last_text[method.chat_id] = method.text
+                if result is not True and result.reply_markup is not None:
+                    self.last_message[method.chat_id] = result
+            return result
+
+    return RecordingSession
+
+
+def build_scenarios() -> dict:
+    from benchmarks.fake_telegram import make_callback_update, make_message_update
+
+    def events(ctx, chat_id, index):
+        return make_message_update("/events", chat_id)
+
+    def next_page(ctx, chat_id, index):
+        message = ctx.session.last_message[chat_id]
+        buttons = [button for row in message.reply_markup.inline_keyboard for button in row]
+        # Листание страниц, а если страница одна - переход между неделями
+        labels = ("›", "‹") if any(button.text == "›" for button in buttons) else ("Неделя ▶", "◀ Неделя")
+        label = labels[index % 2]
+        data = next(button.callback_data for button in buttons if button.text == label)
+        return make_callback_update(data, message)
+
+    def add_event(ctx, chat_id, index):
+        start = ctx.slot(chat_id, index)
+        return make_message_update(f"/add_event Нагрузка {chat_id}-{index} {start:%Y-%m-%d %H:%M}", chat_id)
+
+    def text_event(ctx, chat_id, index):
+        start = ctx.slot(chat_id, index + 1000)
+        return make_message_update(f"созвон с командой {chat_id}-{index} {start:%d.%m.%Y} в {start:%H:%M} на полчаса",
+                                   chat_id)
+
+    def bulk(ctx, chat_id, index):
+        lines = [f"Пакет {chat_id}-{index}-{i} {ctx.slot(chat_id, index * ctx.args.bulk_size + i):%Y-%m-%d %H:%M}"
+                 for i in range(ctx.args.bulk_size)]
+        return make_message_update("/add_events\n" + "\n".join(lines), chat_id)
+
+    mix = (events, events, events, next_page, add_event, text_event)
+
+    def mixed(ctx, chat_id, index):
+        return ctx.rng.choice(mix)(ctx, chat_id, index)
+
+    return {
+        "events": Scenario(events),
+        "events_pages": Scenario(next_page, prepare=events),
+        "add_event": Scenario(add_event, writes=1),
+        "text_event": Scenario(text_event, writes=1),
+        "bulk": Scenario(bulk),
+        "mixed": Scenario(mixed, prepare=events),
+    }
+
+
+async def run_users(ctx: Context, scenario: Scenario, ops: int) -> tuple:
+    """
+    Прогон сценария: все пользователи одновременно, каждый выполняет ops операций подряд
+
+    :return: Кортеж (задержки операций, число ошибок, длительность прогона)
+    """
+    latencies = []
+    errors = 0
+
+    async def user(chat_id: int) -> None:
+        nonlocal errors
+        if scenario.prepare is not None:
+            await ctx.dp.feed_update(ctx.bot, scenario.prepare(ctx, chat_id, 0))
+        for index in range(ops):
+            update = scenario.make(ctx, chat_id, index)
+            started = time.perf_counter()
+            await ctx.dp.feed_update(ctx.bot, update)
+            latencies.append(time.perf_counter() - started)
+            text = ctx.session.last_text.get(chat_id, "")
+            if any(marker in text for marker in ERROR_MARKERS):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(chat_id) for chat_id in range(1, ctx.args.users + 1)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def wait_written(ctx: Context, timeout: float = 120) -> float:
+    """Ожидание, пока очередь записи отправит все события на сервер"""
+    started = time.perf_counter()
+    while ctx.handlers.write_queue.pending():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Очередь записи не опустела за {timeout} с")
+        await asyncio.sleep(0.02)
+    return time.perf_counter() - started
+
+
+def _retained_mb(before) -> float:
+    """Прирост памяти, выделенной кодом бота (без заглушек и самого теста)"""
+    gc.collect()
+    after = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, "*/benchmarks/*"),))
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename")) / 2 ** 20
+
+
+async def run_scenario(ctx: Context, name: str, scenario: Scenario) -> dict:
+    calendar = ctx.server.calendars["main"]
+    objects_before = len(calendar.objects)
+    ctx.server.reset_counts()
+    calls_before = ctx.session.call_count
+
+    latencies, errors, elapsed = await run_users(ctx, scenario, ctx.args.ops)
+    operations = len(latencies)
+    result = {
+        "operations": operations,
+        "errors": errors,
+        "throughput": operations / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies, default=0.0),
+        "telegram_per_op": (ctx.session.call_count - calls_before) / max(operations, 1),
+    }
+    result["drain"] = await wait_written(ctx)
+    result["caldav_per_op"] = sum(ctx.server.request_counts.values()) / max(operations, 1)
+    if scenario.writes:
+        expected = operations * scenario.writes
+        result["written"] = f"{len(calendar.objects) - objects_before}/{expected}"
+
+    # Память - отдельным коротким проходом: tracemalloc в несколько раз замедляет выполнение
+    memory_ops = max(1, ctx.args.ops // 4)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, "*/benchmarks/*"),))
+    tracemalloc.reset_peak()
+    await run_users(ctx, scenario, memory_ops)
+    await wait_written(ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    result["memory_peak_mb"] = peak / 2 ** 20
+    result["memory_retained_mb"] = _retained_mb(before)
+    tracemalloc.stop()
+    return result
+
+
+def print_result(name: str, result: dict) -> None:
+    written = f"  записано {result['written']} за {result['drain']:.2f} с" if "written" in result else ""
+    print(f"{name:<13} n={result['operations']:<6} {result['throughput']:8.1f} оп/с  "
+          f"p50={result['p50'] * 1000:7.1f} мс  p90={result['p90'] * 1000:7.1f} мс  "
+          f"p99={result['p99'] * 1000:7.1f} мс  max={result['max'] * 1000:7.1f} мс  ошибок {result['errors']}")
+    print(f"{'':<13} CalDAV {result['caldav_per_op']:.2f}/оп  Telegram {result['telegram_per_op']:.2f}/оп  "
+          f"память: пик {result['memory_peak_mb']:.1f} МБ, прирост {result['memory_retained_mb']:+.2f} МБ{written}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Сравнение с эталоном
+
+    :return: Список описаний регрессий (пустой, если их нет)
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if reference is None:
+            continue
+        if result["errors"] > reference.get("errors", 0):
+            regressions.append(f"{name}: ошибок {result['errors']} (эталон {reference.get('errors', 0)})")
+        for metric, higher_is_better in COMPARED.items():
+            value, expected = result.get(metric), reference.get(metric)
+            if value is None or not expected:
+                continue
+            change = (value - expected) / expected
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"{name}: {metric} {value:.4g} против {expected:.4g} в эталоне ({change:+.0%})")
+    return regressions
+
+
+async def run(args) -> dict:
+    with FakeCalDAVServer(latency=args.latency, sync_support=not args.no_sync) as server:
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        server.populate(args.events, start, span_days=7, recurring_every=args.recurring_every)
+        limits = {} if args.limits else dict(
+            COMMAND_RATE_LIMIT=1e9, COMMAND_CHAT_RATE_LIMIT=1e9, COMMAND_CHAT_BURST=1e9,
+            CALDAV_RATE_LIMIT=1e9, CALDAV_CHAT_RATE_LIMIT=1e9,
+        )
+        configure_env(server.url, EVENT_CACHE_TTL=args.cache_ttl, METRICS_PORT=0, ACCOUNTS_FILE="",
+                      WRITE_QUEUE_FILE="", REMINDERS_FILE="", WRITE_QUEUE_RETRY_MIN_DELAY=0.2, **limits)
+
+        from aiogram import Dispatcher
+        from benchmarks.fake_telegram import make_bot
+        from middlewares import TelegramRateLimitMiddleware
+        import handlers
+
+        session = make_session_class()(latency=args.telegram_latency)
+        bot = make_bot(session)
+        if args.limits:
+            bot.session.middleware(TelegramRateLimitMiddleware())
+        dp = Dispatcher()
+        dp.include_router(handlers.router)
+        await dp.emit_startup(bot=bot)
+        if not await (await handlers.calendar_pool.get()).ensure_connected(30):
+            raise SystemExit("Нет подключения к заглушке CalDAV")
+
+        ctx = Context(args, server, session, bot, dp, handlers)
+        scenarios = build_scenarios()
+        print(f"Сервер: задержка {args.latency * 1000:.0f} мс, событий на неделе {args.events}, "
+              f"sync-collection {'нет' if args.no_sync else 'да'}; пользователей {args.users}, "
+              f"операций на пользователя {args.ops}\n")
+
+        results = {}
+        for name in args.scenarios:
+            results[name] = await run_scenario(ctx, name, scenarios[name])
+            print_result(name, results[name])
+
+        await dp.emit_shutdown(bot=bot)
+    # На Linux ru_maxrss в килобайтах
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nМаксимальный RSS процесса (с заглушками): {max_rss:.0f} МБ")
+    return {
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("baseline", "save_baseline", "json", "tolerance")},
+        "scenarios": results,
+        "max_rss_mb": max_rss,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=50, help="Число одновременных пользователей")
+    parser.add_argument("--ops", type=int, default=20, help="Операций на пользователя в каждом сценарии")
+    parser.add_argument("--events", type=int, default=300, help="Событий в календаре на неделе")
+    parser.add_argument("--recurring-every", type=int, default=10, help="Каждое N-е событие еженедельное (0 - нет)")
+    parser.add_argument("--bulk-size", type=int, default=20, help="Событий в одной команде /add_events")
+    parser.add_argument("--latency", type=float, default=0.02, help="Задержка ответа заглушки CalDAV, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="Задержка вызовов Bot API, с")
+    parser.add_argument("--cache-ttl", type=float, default=60, help="EVENT_CACHE_TTL бота, с")
+    parser.add_argument("--no-sync", action="store_true", help="Сервер без поддержки sync-collection")
+    parser.add_argument("--limits", action="store_true",
+                        help="Включить ограничения частоты команд, CalDAV и Telegram из настроек по умолчанию")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Файл для результатов в JSON")
+    parser.add_argument("--save-baseline", help="Сохранить результаты как эталон в файл")
+    parser.add_argument("--baseline", help="Эталон для сравнения; при регрессии код выхода 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение показателей (доля)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        differs = sorted(key for key, value in report["config"].items()
+                         if key != "scenarios" and baseline.get("config", {}).get(key, value) != value)
+        if differs:
+            print(f"\nВнимание: эталон получен с другими параметрами ({', '.join(differs)}), сравнение приблизительное")
+        regressions = compare(report["scenarios"], baseline, args.tolerance)
+        if regressions:
+            print(f"\nРегрессии относительно {args.baseline} (допуск {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nРегрессий относительно {args.baseline} нет (допуск {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
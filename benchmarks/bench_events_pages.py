@@ -0,0 +1,133 @@
+"""
+Постраничный вывод /events против одного сообщения, собранного через +=
+
+1. Отрисовка списка из N событий: прежняя конкатенация строк в одно сообщение
+   и разбиение на страницы через join. Для прежнего способа показывается,
+   сколько сообщений превысили бы лимит Telegram в 4096 символов.
+2. Сквозной сценарий через заглушки Telegram и CalDAV: /events на загруженную
+   неделю, листание страниц вперед и назад, переход на следующую неделю и обратно.
+   Для каждого шага считаются запросы к CalDAV и вызовы Telegram
+   (редактирование сообщения или новое сообщение).
+
+Запуск: python -m benchmarks.bench_events_pages --events 600
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+# Заглушка хранит время без пояса: сравнение корректно в поясе UTC
+os.environ["TZ"] = "UTC"
+time.tzset()
+
+from benchmarks.common import configure_env  # noqa: E402
+from benchmarks.fake_caldav import FakeCalDAVServer  # noqa: E402
+
+
+def legacy_render(events: list) -> str:
+    """Прежняя отрисовка /events: одно сообщение, собранное конкатенацией"""
+    response = "События на ближайшую неделю:\n\n"
+    for event in events:
+        start_time = event['start'].strftime("%d.%m.%Y %H:%M")
+        response += f"📅 {event['summary']} - {start_time}\n"
+    return response
+
+
+def bench_render(sizes: list) -> None:
+    from event_pages import EventPages, MESSAGE_LIMIT, text_length
+
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for count in sizes:
+        events = [{'summary': f"Встреча с командой по проекту номер {i}", 'start': start + timedelta(minutes=10 * i),
+                   'end': start + timedelta(minutes=10 * i + 30)} for i in range(count)]
+        repeats = max(1, 20000 // count)
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            text = legacy_render(events)
+        legacy = (time.perf_counter() - started) / repeats
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            pages = EventPages(start, start + timedelta(days=7), events)
+        paged = (time.perf_counter() - started) / repeats
+
+        longest = max(text_length(pages.render(page, "События на ближайшую неделю:")) for page in range(len(pages)))
+        print(f"{count:>6} событий: += {legacy * 1000:7.3f} мс, длина {text_length(text):>7} "
+              f"({'превышает лимит' if text_length(text) > MESSAGE_LIMIT else 'в пределах лимита'}); "
+              f"страницы {paged * 1000:7.3f} мс, страниц {len(pages):>4}, самая длинная {longest}")
+    print()
+
+
+def find_button(message, text: str) -> str:
+    for row in message.reply_markup.inline_keyboard:
+        for button in row:
+            if button.text == text:
+                return button.callback_data
+    raise KeyError(f"Нет кнопки {text}")
+
+
+async def run_e2e(args) -> None:
+    with FakeCalDAVServer(latency=args.latency) as server:
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        server.populate(args.events, start, span_days=7)
+        server.populate(args.events // 3, start + timedelta(days=7), span_days=7)
+        configure_env(server.url, CALDAV_RATE_LIMIT=10000, CALDAV_CHAT_RATE_LIMIT=10000, COMMAND_CHAT_RATE_LIMIT=1000,
+                      COMMAND_CHAT_BURST=1000, EVENT_CACHE_TTL=3600, METRICS_PORT=0, REMINDERS_FILE="",
+                      WRITE_QUEUE_FILE="", ACCOUNTS_FILE="")
+        from aiogram import Dispatcher
+        from aiogram.methods import EditMessageText, SendMessage
+        from benchmarks.fake_telegram import FakeTelegramSession, make_bot, make_callback_update, make_message_update
+        from event_pages import MESSAGE_LIMIT, text_length
+        import handlers
+
+        session = FakeTelegramSession()
+        bot = make_bot(session)
+        dp = Dispatcher()
+        dp.include_router(handlers.router)
+        await dp.emit_startup(bot=bot)
+        await (await handlers.calendar_pool.get()).ensure_connected(30)
+
+        async def step(name: str, update_factory) -> None:
+            server.reset_counts()
+            calls = len(session.calls)
+            started = time.perf_counter()
+            await dp.feed_update(bot, update_factory())
+            elapsed = time.perf_counter() - started
+            made = session.calls[calls:]
+            edits = sum(isinstance(call, EditMessageText) for call in made)
+            sends = sum(isinstance(call, SendMessage) for call in made)
+            text = session.sent[-1][1].text
+            header = text.splitlines()[0]
+            assert text_length(text) <= MESSAGE_LIMIT, f"Сообщение длиной {text_length(text)}"
+            print(f"{name:<28} {elapsed * 1000:8.1f} мс  CalDAV {sum(server.request_counts.values()):>2}  "
+                  f"отправлено {sends}  изменено {edits}  длина {text_length(text):>5}  {header}")
+
+        def press(text: str):
+            message = session.sent[-1][1]
+            return lambda: make_callback_update(find_button(message, text), message)
+
+        await step("/events", lambda: make_message_update("/events"))
+        for _ in range(args.pages):
+            await step("страница ›", press("›"))
+        await step("страница ‹", press("‹"))
+        await step("следующая неделя", press("Неделя ▶"))
+        await step("предыдущая неделя (кеш)", press("◀ Неделя"))
+        await step("страница › (кеш)", press("›"))
+
+        await dp.emit_shutdown(bot=bot)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=600, help="Число событий на неделе")
+    parser.add_argument("--pages", type=int, default=3, help="Сколько раз листать страницы вперед")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа заглушки CalDAV, с")
+    args = parser.parse_args()
+    bench_render([20, 100, 600, 3000])
+    asyncio.run(run_e2e(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Проверка занятости и поиска пересечений против локальной заглушки CalDAV
+
+Для трех источников занятости (полная копия календаря через sync-collection,
+free-busy-query, события периода) сравнивает ответы CalendarManager.busy
+с эталоном, построенным прямо по объектам заглушки, и замеряет задержку
+проверки пересечения, а также проверку по событиям списка (/events и перебор).
+
+Запуск: python -m benchmarks.bench_freebusy --events 2000 --checks 500 --weeks 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+# Заглушка хранит время без пояса и отдает free-busy в UTC: сравнение корректно в поясе UTC
+os.environ["TZ"] = "UTC"
+time.tzset()
+
+from benchmarks.common import Timer, configure_env  # noqa: E402
+from benchmarks.fake_caldav import FakeCalDAVServer  # noqa: E402
+
+MODES = (
+    ("полная копия", dict(sync_support=True)),
+    ("free-busy-query", dict(sync_support=False, freebusy_support=True)),
+    ("события периода", dict(sync_support=False, freebusy_support=False)),
+)
+
+
+def make_checks(rng: random.Random, start: datetime, weeks: int, count: int) -> list:
+    """Случайные периоды от 15 минут до 2 часов, выровненные по 5 минутам"""
+    checks = []
+    for _ in range(count):
+        begin = start + timedelta(minutes=5 * rng.randrange(weeks * 7 * 24 * 12))
+        checks.append((begin, begin + timedelta(minutes=15 * rng.randint(1, 8))))
+    return checks
+
+
+async def run_mode(name: str, server_options: dict, args, checks: list, start: datetime, end: datetime) -> bool:
+    from calendar_utils import CalendarManager
+    from freebusy import BusyMap
+
+    with FakeCalDAVServer(latency=args.latency, **server_options) as server:
+        server.populate(args.events, start, span_days=args.weeks * 7, recurring_every=args.recurring_every)
+        reference = BusyMap.from_intervals(
+            period for res in server.calendars["main"].objects.values() for period in res.busy_periods(start, end)
+        )
+        manager = CalendarManager(server.url, "bench", "bench")
+        assert await manager.connect(), "Нет подключения к заглушке CalDAV"
+
+        # Первый запрос строит копию календаря или проверяет поддержку free-busy-query
+        with Timer(f"{name}: первый запрос") as first:
+            busy = await manager.busy(start, end)
+            first.add(time.perf_counter() - first.started)
+        server.reset_counts()
+
+        mismatches = sum(busy.is_busy(begin, finish) != reference.is_busy(begin, finish) for begin, finish in checks)
+        free_ok = busy.free_periods(start, end, timedelta(minutes=30)) == \
+            reference.free_periods(start, end, timedelta(minutes=30))
+
+        with Timer(f"{name}: пересечение") as timer:
+            for begin, finish in checks:
+                started = time.perf_counter()
+                result = await manager.busy(begin, finish)
+                result.is_busy(begin, finish)
+                timer.add(time.perf_counter() - started)
+
+        with Timer(f"{name}: перебор /events") as scan:
+            for begin, finish in checks[:args.scan_checks]:
+                started = time.perf_counter()
+                events = await manager.list_events(begin, finish)
+                any(isinstance(event['start'], datetime) and event['start'] < finish and event['end'] > begin
+                    for event in events)
+                scan.add(time.perf_counter() - started)
+
+        requests = sum(server.request_counts.values())
+        print(first.report())
+        print(timer.report())
+        print(scan.report())
+        print(f"{name}: расхождений с эталоном {mismatches} из {len(checks)}, "
+              f"свободные окна {'совпадают' if free_ok else 'РАСХОДЯТСЯ'}, HTTP запросов {requests}\n")
+        await manager.close()
+        return not mismatches and free_ok
+
+
+async def run(args) -> None:
+    configure_env("http://127.0.0.1:1/dav/", CALDAV_RATE_LIMIT=10000, CALDAV_CHAT_RATE_LIMIT=10000,
+                  EVENT_CACHE_TTL=3600, EVENT_CACHE_MAX_OBJECTS=args.events * 2)
+    from calendar_utils import shutdown_executor
+
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(weeks=args.weeks)
+    checks = make_checks(random.Random(args.seed), start, args.weeks, args.checks)
+    results = [await run_mode(name, options, args, checks, start, end) for name, options in MODES]
+    shutdown_executor()
+    if not all(results):
+        raise SystemExit("Занятость расходится с эталоном")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=2000, help="Число событий в календаре")
+    parser.add_argument("--recurring-every", type=int, default=10, help="Каждое N-е событие еженедельное")
+    parser.add_argument("--weeks", type=int, default=4, help="Длина проверяемого периода в неделях")
+    parser.add_argument("--checks", type=int, default=500, help="Число проверок пересечения")
+    parser.add_argument("--scan-checks", type=int, default=50, help="Число проверок перебором событий")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа заглушки CalDAV, с")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
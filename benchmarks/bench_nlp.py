@@ -0,0 +1,84 @@
+"""
+Стоимость разбора описаний событий обычным текстом
+
+Генерирует типичные сообщения ("встреча с командой завтра в 15:00 на 2 часа")
+и замеряет время parse_event на сообщение: для новых текстов (промах кеша,
+полный проход по правилам грамматики) и для повторяющихся (попадание в LRU кеш).
+Для сравнения приводится прежний разбор /add_event через split и strptime.
+
+Запуск: python -m benchmarks.bench_nlp --messages 20000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from benchmarks.common import percentile
+from event_parser import _analyze, parse_event
+
+SUBJECTS = ("встреча с командой", "созвон", "обед с Анной", "планерка", "врач", "тренировка", "Ревью кода",
+            "звонок клиенту", "стрижка", "день рождения мамы", "йога", "демо для заказчика")
+DATES = ("", "сегодня", "завтра", "послезавтра", "через 2 дня", "через неделю", "в пятницу", "в следующий вторник",
+         "7 марта", "25 декабря 2027", "07.11", "2027-03-07")
+TIMES = ("в 15:00", "в 9 утра", "в 7 вечера", "с 10 до 12", "10:00-11:30", "в полдень", "в 14.30", "к 17:00")
+DURATIONS = ("", "", "на 2 часа", "на полчаса", "на 45 минут", "на час")
+REPEATS = ("", "", "", "каждый понедельник", "по будням", "ежедневно", "по средам и пятницам")
+
+
+def make_message(rng: random.Random) -> str:
+    parts = [rng.choice(SUBJECTS), rng.choice(DATES), rng.choice(TIMES), rng.choice(DURATIONS), rng.choice(REPEATS)]
+    return " ".join(part for part in parts if part)
+
+
+def measure(func, messages: list) -> list:
+    samples = []
+    for text in messages:
+        started = time.perf_counter()
+        func(text)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(name: str, samples: list) -> None:
+    print(f"{name:<34} n={len(samples):<7} p50={percentile(samples, 50) * 1e6:7.1f} мкс  "
+          f"p99={percentile(samples, 99) * 1e6:7.1f} мкс  "
+          f"среднее={sum(samples) / len(samples) * 1e6:7.1f} мкс")
+
+
+def legacy_parse(text: str):
+    """Прежний разбор /add_event: одно слово названия, дата и время в фиксированном формате"""
+    args = text.split()
+    try:
+        return args[0], datetime.strptime(f"{args[1]} {args[2]}", "%Y-%m-%d %H:%M")
+    except (IndexError, ValueError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="Число сообщений")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [make_message(rng) for _ in range(args.messages)]
+    unique = list(dict.fromkeys(messages))
+    now = datetime.now()
+
+    parsed = sum(parse_event(text, now) is not None for text in unique)
+    _analyze.cache_clear()
+    cold = measure(lambda text: parse_event(text, now), unique)
+    # Поток сообщений, в котором тексты повторяются: после первого появления разбор берется из кеша
+    warm = measure(lambda text: parse_event(text, now), [rng.choice(unique[:500]) for _ in range(args.messages)])
+    legacy = measure(legacy_parse, [f"Встреча 2027-03-{rng.randint(1, 28):02d} 15:00" for _ in range(args.messages)])
+
+    print(f"Уникальных сообщений: {len(unique)}, распознано событий: {parsed}")
+    report("parse_event (новый текст)", cold)
+    report("parse_event (из кеша)", warm)
+    report("split + strptime (прежний)", legacy)
+    info = _analyze.cache_info()
+    print(f"Кеш разбора: {info.currsize}/{info.maxsize}, попаданий {info.hits}, промахов {info.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Скорость разбора iCalendar: быстрый разбор текста против полного дерева vobject
+
+Синтетический корпус содержит события в UTC, с TZID и блоком VTIMEZONE,
+на весь день, с DURATION вместо DTEND, с напоминаниями (VALARM), длинными
+свернутыми названиями и небольшой долей повторяющихся событий, которые
+разбираются через vobject в обоих вариантах. Результаты обоих парсеров
+сравниваются, расхождения выводятся.
+
+Запуск: python -m benchmarks.bench_parse --events 10000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import configure_env
+
+VTIMEZONE_MOSCOW = "\r\n".join([
+    "BEGIN:VTIMEZONE",
+    "TZID:Europe/Moscow",
+    "BEGIN:STANDARD",
+    "DTSTART:19700101T000000",
+    "TZOFFSETFROM:+0300",
+    "TZOFFSETTO:+0300",
+    "TZNAME:MSK",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+])
+
+
+def fold(line: str, width: int = 75) -> str:
+    """Свертка длинной строки содержимого (RFC 5545, 3.1)"""
+    parts = [line[:width]]
+    line = line[width:]
+    while line:
+        parts.append(" " + line[:width - 1])
+        line = line[width - 1:]
+    return "\r\n".join(parts)
+
+
+def make_object(number: int, rng: random.Random, recurring_share: float) -> str:
+    """Один объект календаря случайного вида"""
+    start = datetime(2026, 1, 1, 8) + timedelta(hours=rng.randrange(24 * 365))
+    kind = rng.choice(("utc", "tzid", "allday", "duration", "alarm", "long"))
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//bench//parse//RU", "CALSCALE:GREGORIAN"]
+    if kind == "tzid":
+        lines.append(VTIMEZONE_MOSCOW)
+    lines += ["BEGIN:VEVENT", f"UID:bench-{number}@example.com", "DTSTAMP:20260101T000000Z",
+              "CREATED:20260101T000000Z", "SEQUENCE:0", "STATUS:CONFIRMED", "TRANSP:OPAQUE"]
+    summary = f"Событие {number}"
+    if kind == "utc" or kind == "alarm":
+        lines += [f"DTSTART:{start:%Y%m%dT%H%M%S}Z", f"DTEND:{start + timedelta(hours=1):%Y%m%dT%H%M%S}Z"]
+    elif kind == "tzid":
+        lines += [f"DTSTART;TZID=Europe/Moscow:{start:%Y%m%dT%H%M%S}",
+                  f"DTEND;TZID=Europe/Moscow:{start + timedelta(minutes=45):%Y%m%dT%H%M%S}"]
+    elif kind == "allday":
+        lines += [f"DTSTART;VALUE=DATE:{start:%Y%m%d}", f"DTEND;VALUE=DATE:{start + timedelta(days=1):%Y%m%d}"]
+    elif kind == "duration":
+        lines += [f"DTSTART:{start:%Y%m%dT%H%M%S}", "DURATION:PT1H30M"]
+    else:
+        lines += [f"DTSTART:{start:%Y%m%dT%H%M%S}", f"DTEND:{start + timedelta(hours=2):%Y%m%dT%H%M%S}"]
+        summary = f"Очень длинное название встречи {number}\\, с запятыми\\; и точкой с запятой " * 2
+    lines.append(fold(f"SUMMARY:{summary}"))
+    lines.append(fold("DESCRIPTION:" + "Описание события, которое не нужно для отображения. " * 3))
+    lines.append("LOCATION:Переговорная 1")
+    if rng.random() < recurring_share:
+        lines.append("RRULE:FREQ=WEEKLY;COUNT=10")
+    if kind == "alarm":
+        lines += ["BEGIN:VALARM", "ACTION:DISPLAY", "DESCRIPTION:Напоминание", "TRIGGER:-PT15M", "END:VALARM"]
+    lines += ["END:VEVENT", "END:VCALENDAR", ""]
+    return "\r\n".join(lines)
+
+
+def normalize(events) -> list:
+    from event_cache import to_naive
+    return sorted((e.data['summary'], to_naive(e.data['start']), to_naive(e.data['end'])) for e in events)
+
+
+def measure(name: str, func, objects: list, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for obj in objects:
+            func(obj)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<40} {len(objects) / best:>10.0f} объектов/с  {best * 1000:8.1f} мс")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=10000, help="размер корпуса")
+    parser.add_argument("--recurring", type=float, default=0.05, help="доля повторяющихся событий")
+    parser.add_argument("--repeat", type=int, default=3, help="число повторов, берется лучший")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:1/dav/")
+    import caldav
+    import vobject
+    from calendar_utils import _parse_calendar_object_full, parse_calendar_object, parse_ics
+
+    rng = random.Random(args.seed)
+    texts = [make_object(number, rng, args.recurring) for number in range(args.events)]
+    print(f"Корпус: {len(texts)} объектов, {sum(map(len, texts)) / 1024 / 1024:.1f} МБ")
+
+    # vobject кеширует дерево в объекте, поэтому для каждого прохода объекты создаются заново
+    def fresh(text):
+        return caldav.Event(client=None, data=text)
+
+    full = measure("vobject (полное дерево)", lambda text: _parse_calendar_object_full(fresh(text)), texts, args.repeat)
+    fast = measure("быстрый разбор с переходом на vobject", lambda text: parse_calendar_object(fresh(text)),
+                   texts, args.repeat)
+    print(f"Ускорение: {full / fast:.1f}x")
+
+    mismatches = 0
+    for text in texts:
+        if normalize(_parse_calendar_object_full(fresh(text))) != normalize(parse_calendar_object(fresh(text))):
+            mismatches += 1
+    print(f"Расхождений между парсерами: {mismatches}")
+
+    # Импорт .ics файла со всеми событиями корпуса (без повторений)
+    body = [text.split("BEGIN:VEVENT", 1)[1].rsplit("END:VEVENT", 1)[0] for text in texts if "RRULE" not in text]
+    ics = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + VTIMEZONE_MOSCOW + "\r\n" + "".join(
+        f"BEGIN:VEVENT{part}END:VEVENT\r\n" for part in body) + "END:VCALENDAR\r\n"
+    started = time.perf_counter()
+    components = list(vobject.readComponents(ics))
+    full = time.perf_counter() - started
+    started = time.perf_counter()
+    events = parse_ics(ics)
+    fast = time.perf_counter() - started
+    count = sum(len(component.contents.get('vevent', [])) for component in components)
+    print(f"Файл .ics с {len(events)} событиями: vobject {full * 1000:.1f} мс ({count / full:.0f} событий/с), "
+          f"parse_ics {fast * 1000:.1f} мс ({len(events) / fast:.0f} событий/с)")
+
+
+if __name__ == "__main__":
+    main()
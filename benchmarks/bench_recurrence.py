@@ -0,0 +1,153 @@
+"""
+Запросы событий за период по полной копии календаря с повторяющимися сериями
+
+Сравнивается прежний способ (перебор всех событий и развертывание каждой
+серии от ее начала через dateutil при каждом запросе) с интервальным
+индексом EventCache и локальным кешем развернутых экземпляров.
+Результаты обоих способов сверяются.
+
+Запуск: python -m benchmarks.bench_recurrence --series 3000 --single 5000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import configure_env, percentile
+
+RULES = (
+    "FREQ=DAILY",
+    "FREQ=WEEKLY;BYDAY=MO,WE,FR",
+    "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU",
+    "FREQ=MONTHLY;BYMONTHDAY=15;COUNT=36",
+    "FREQ=DAILY;UNTIL=20270101T000000Z",
+    "FREQ=YEARLY",
+)
+
+
+def make_series(number: int, rng: random.Random) -> str:
+    """Объект календаря с повторяющимся событием, иногда с исключениями и часовым поясом"""
+    start = datetime(2023, 1, 2, 9) + timedelta(days=rng.randrange(3 * 365), hours=rng.randrange(9))
+    rule = rng.choice(RULES)
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//bench//recurrence//RU", "BEGIN:VEVENT",
+             f"UID:series-{number}", "DTSTAMP:20260101T000000Z"]
+    if number % 3 == 0:
+        lines += [f"DTSTART;TZID=Europe/Moscow:{start:%Y%m%dT%H%M%S}",
+                  f"DTEND;TZID=Europe/Moscow:{start + timedelta(hours=1):%Y%m%dT%H%M%S}"]
+    else:
+        lines += [f"DTSTART:{start:%Y%m%dT%H%M%S}", f"DTEND:{start + timedelta(minutes=30):%Y%m%dT%H%M%S}"]
+    lines += [f"SUMMARY:Серия {number}", f"RRULE:{rule}"]
+    tzid = ";TZID=Europe/Moscow" if number % 3 == 0 else ""
+    if number % 5 == 0:
+        lines.append(f"EXDATE{tzid}:{start + timedelta(days=7):%Y%m%dT%H%M%S}")
+    if number % 7 == 0:
+        lines.append(f"RDATE{tzid}:{start + timedelta(days=3, hours=2):%Y%m%dT%H%M%S}")
+    lines += ["END:VEVENT", "END:VCALENDAR", ""]
+    return "\r\n".join(lines)
+
+
+def make_single(number: int, rng: random.Random) -> str:
+    start = datetime(2025, 1, 1, 8) + timedelta(hours=rng.randrange(24 * 730))
+    return "\r\n".join([
+        "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//bench//recurrence//RU", "BEGIN:VEVENT",
+        f"UID:single-{number}", "DTSTAMP:20260101T000000Z",
+        f"DTSTART:{start:%Y%m%dT%H%M%S}", f"DTEND:{start + timedelta(hours=1):%Y%m%dT%H%M%S}",
+        f"SUMMARY:Встреча {number}", "END:VEVENT", "END:VCALENDAR", "",
+    ])
+
+
+def linear_query(events: list, start: datetime, end: datetime) -> list:
+    """Прежний способ: перебор всех событий и развертывание серий от начала при каждом запросе"""
+    from event_cache import overlaps, to_naive
+    result = []
+    for event in events:
+        if event.rruleset is None:
+            if overlaps(event.start, event.end, start, end):
+                result.append(event.data)
+            continue
+        duration = event.end - event.start
+        origin = event.data['start']
+        tz = origin.tzinfo if isinstance(origin, datetime) else None
+        lower = start - duration
+        upper = end
+        if tz is not None:
+            lower, upper = lower.astimezone(tz), end.astimezone(tz)
+        for occurrence in event.rruleset.between(lower, upper, inc=True):
+            occurrence_start = to_naive(occurrence)
+            if overlaps(occurrence_start, occurrence_start + duration, start, end):
+                result.append({'summary': event.data['summary'], 'start': occurrence, 'end': occurrence + duration})
+    result.sort(key=lambda e: to_naive(e['start']))
+    return result
+
+
+def make_queries(rng: random.Random, count: int) -> list:
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    named = [
+        ("сегодня", today, today + timedelta(days=1)),
+        ("неделя", today, today + timedelta(days=7)),
+        ("следующий месяц", today + timedelta(days=30), today + timedelta(days=61)),
+    ]
+    queries = []
+    for number in range(count):
+        name, start, end = named[number % len(named)]
+        if number >= len(named) * 4:
+            # Случайные периоды в пределах двух лет
+            days = rng.choice((1, 7, 31))
+            start = today + timedelta(days=rng.randrange(-365, 365))
+            name, end = f"{days} дн.", start + timedelta(days=days)
+        queries.append((name, start, end))
+    return queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--series", type=int, default=3000, help="число повторяющихся серий")
+    parser.add_argument("--single", type=int, default=5000, help="число обычных событий")
+    parser.add_argument("--queries", type=int, default=200, help="число запросов")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:1/dav/")
+    import caldav
+    from calendar_utils import parse_calendar_object
+    from event_cache import EventCache, to_naive
+
+    rng = random.Random(args.seed)
+    texts = [make_series(n, rng) for n in range(args.series)] + [make_single(n, rng) for n in range(args.single)]
+    started = time.perf_counter()
+    objects = {f"/obj/{n}.ics": (f'"{n}"', parse_calendar_object(caldav.Event(client=None, data=text)))
+               for n, text in enumerate(texts)}
+    print(f"Календарь: {args.series} серий и {args.single} событий, разбор {time.perf_counter() - started:.1f} с")
+
+    cache = EventCache(max_objects=len(objects) + 1)
+    cache.apply_sync("token", objects, [], full=True)
+    events = [event for _, parsed in objects.values() for event in parsed]
+
+    queries = make_queries(rng, args.queries)
+    started = time.perf_counter()
+    cache.query(queries[0][1], queries[0][2])
+    print(f"Построение индекса и первое развертывание: {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    linear, indexed = [], []
+    mismatches = 0
+    for name, start, end in queries:
+        t0 = time.perf_counter()
+        expected = linear_query(events, start, end)
+        t1 = time.perf_counter()
+        actual = cache.query(start, end)
+        t2 = time.perf_counter()
+        linear.append(t1 - t0)
+        indexed.append(t2 - t1)
+        key = lambda items: [(e['summary'], to_naive(e['start'])) for e in items]
+        if sorted(key(expected)) != sorted(key(actual)):
+            mismatches += 1
+            print(f"Расхождение для {name} {start:%Y-%m-%d}: {len(expected)} и {len(actual)} экземпляров")
+
+    for title, samples in (("перебор и dateutil", linear), ("интервальный индекс", indexed)):
+        print(f"{title:<22} p50={percentile(samples, 50) * 1000:9.2f} мс  p95={percentile(samples, 95) * 1000:9.2f} мс  "
+              f"p99={percentile(samples, 99) * 1000:9.2f} мс")
+    print(f"Ускорение по медиане: {percentile(linear, 50) / percentile(indexed, 50):.0f}x, расхождений: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Планировщик напоминаний против локальной заглушки CalDAV
+
+1. Стоимость операций кучи при десятках тысяч напоминаний: добавление,
+   отмена, извлечение наступивших; для сравнения - проверка срока
+   перебором всех напоминаний, как при опросе по таймеру.
+2. Сквозной сценарий: пользователи с напоминаниями, события через несколько
+   секунд. Замеряется опоздание отправки относительно срока, число сообщений
+   (напоминания одного чата объединяются) и соблюдение лимита Telegram.
+3. Перезапуск: новый экземпляр загружает расписание из базы и отправляет
+   напоминания без запросов к CalDAV.
+4. Инкрементальное обновление: после изменения календаря расписание
+   приводится к нему за один проход, меняются только затронутые напоминания.
+
+Запуск: python -m benchmarks.bench_reminders --reminders 50000 --users 50 --events 40
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Заглушка хранит время без пояса: сравнение корректно в поясе UTC
+os.environ["TZ"] = "UTC"
+time.tzset()
+
+from benchmarks.common import configure_env, percentile  # noqa: E402
+from benchmarks.fake_caldav import FakeCalDAVServer, make_event_ics  # noqa: E402
+
+
+def bench_heap(count: int) -> None:
+    from reminders import Reminder, ReminderScheduler
+
+    scheduler = ReminderScheduler("", None)
+    rng = random.Random(1)
+    now = time.time()
+    reminders = [Reminder((i, i % 1000, i % 1000, f"Событие {i}", datetime.now(), now + rng.uniform(0, 86400)))
+                 for i in range(count)]
+
+    started = time.perf_counter()
+    for reminder in reminders:
+        scheduler._schedule(reminder)
+    insert = (time.perf_counter() - started) / count
+
+    cancelled = rng.sample(range(count), count // 10)
+    started = time.perf_counter()
+    for reminder_id in cancelled:
+        scheduler._cancel(reminder_id)
+    cancel = (time.perf_counter() - started) / len(cancelled)
+
+    # Проверка срока раз в секунду: куча смотрит на вершину, перебор - на все напоминания
+    started = time.perf_counter()
+    for _ in range(1000):
+        scheduler._heap and scheduler._heap[0][0] <= now
+    peek = (time.perf_counter() - started) / 1000
+    started = time.perf_counter()
+    for _ in range(20):
+        [reminder for reminder in scheduler._scheduled.values() if reminder.fire_at <= now]
+    scan = (time.perf_counter() - started) / 20
+
+    started = time.perf_counter()
+    popped = len(scheduler._pop_due(now + 86400))
+    pop = (time.perf_counter() - started) / max(popped, 1)
+
+    print(f"Куча, {count} напоминаний: добавление {insert * 1e6:.2f} мкс, отмена {cancel * 1e6:.2f} мкс, "
+          f"извлечение {pop * 1e6:.2f} мкс на напоминание")
+    print(f"Проверка срока: вершина кучи {peek * 1e6:.3f} мкс, перебор всех {scan * 1e3:.2f} мс "
+          f"(извлечено {popped}, отменено {len(cancelled)})\n")
+    assert popped == count - len(cancelled)
+
+
+def measure_lateness(scheduler, lateness: list) -> None:
+    """Опоздание сообщения: время отправки минус срок последнего вошедшего в него напоминания"""
+    send_chat = scheduler._send_chat
+
+    async def timed(chat_id, reminders, semaphore):
+        due = max(reminder.fire_at for reminder in reminders)
+        await send_chat(chat_id, reminders, semaphore)
+        lateness.append(time.time() - due)
+
+    scheduler._send_chat = timed
+
+
+class Recorder:
+    """Отправка сообщений с ограничением частоты, как у middleware сессии бота"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.sent = []
+
+    async def __call__(self, chat_id: int, text: str) -> None:
+        await self.limiter.acquire(chat_id)
+        self.sent.append((time.time(), chat_id, text))
+
+
+async def wait_for(predicate, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Условие не выполнилось вовремя")
+        await asyncio.sleep(0.02)
+
+
+async def run(args) -> None:
+    bench_heap(args.reminders)
+
+    with FakeCalDAVServer() as server:
+        configure_env(server.url, CALDAV_RATE_LIMIT=10000, CALDAV_CHAT_RATE_LIMIT=10000)
+        from calendar_utils import CalendarManager, shutdown_executor
+        from ratelimit import RateLimiter
+        from reminders import ReminderScheduler
+
+        manager = CalendarManager()
+        assert await manager.connect(), "Нет подключения к заглушке CalDAV"
+        calendar = server.calendars["main"]
+
+        async def resolve(user_id):
+            return manager
+
+        # События начинаются через минуту и несколько секунд: напоминания за 1 минуту
+        # наступают в ближайшие args.spread секунд
+        base = datetime.now().replace(microsecond=0) + timedelta(minutes=1, seconds=3)
+        rng = random.Random(3)
+        for i in range(args.events):
+            begin = base + timedelta(seconds=rng.randrange(args.spread))
+            uid = f"remind-{i}"
+            calendar.put(f"{calendar.path}{uid}.ics", make_event_ics(uid, f"Событие {i}", begin,
+                                                                     begin + timedelta(minutes=30)))
+
+        path = os.path.join(tempfile.mkdtemp(), "reminders.db")
+        limiter = RateLimiter(30, 1, chat_burst=3, group_rate=0.33, max_wait=float("inf"))
+        recorder = Recorder(limiter)
+        lateness = []
+        scheduler = ReminderScheduler(path, resolve, send=recorder, refresh_interval=3600)
+        measure_lateness(scheduler, lateness)
+        await scheduler.start()
+
+        started = time.perf_counter()
+        for user_id in range(1, args.users + 1):
+            await scheduler.subscribe(user_id, user_id, 1)
+        expected = args.users * args.events
+        await wait_for(lambda: scheduler.scheduled() == expected, 30)
+        print(f"Расписание построено за {time.perf_counter() - started:.2f} с: {scheduler.scheduled()} напоминаний, "
+              f"HTTP запросов {sum(server.request_counts.values())}")
+
+        # Половина напоминаний отправляется первым экземпляром, затем перезапуск
+        fire_times = sorted(reminder.fire_at for reminder in scheduler._scheduled.values())
+        restart_at = fire_times[len(fire_times) // 2]
+        await asyncio.sleep(max(0.0, restart_at - time.time()))
+        await scheduler.stop()
+        before_restart = len(recorder.sent)
+        server.reset_counts()
+
+        scheduler = ReminderScheduler(path, resolve, send=recorder, refresh_interval=3600)
+        measure_lateness(scheduler, lateness)
+        await scheduler.start()
+        loaded = scheduler.scheduled()
+        await wait_for(lambda: not scheduler.scheduled() and not scheduler._delivering, args.spread + 30)
+
+        events_sent = sum(text.count("\n") for _, _, text in recorder.sent)
+        unique = len({(chat_id, line) for _, chat_id, text in recorder.sent for line in text.splitlines()[1:]})
+        by_chat = {}
+        for sent_at, chat_id, _ in recorder.sent:
+            by_chat.setdefault(chat_id, []).append(sent_at)
+        max_rate = max((sum(1 for other in times if 0 <= other - t < 1) for times in by_chat.values() for t in times),
+                       default=0)
+
+        print(f"Отправлено сообщений {len(recorder.sent)} (до перезапуска {before_restart}), "
+              f"напоминаний в них {events_sent} из {expected}, без повторов {unique}")
+        print(f"Опоздание отправки: p50={percentile(lateness, 50) * 1000:.1f} мс "
+              f"p99={percentile(lateness, 99) * 1000:.1f} мс; сообщений в чат за секунду не больше {max_rate}")
+        print(f"Перезапуск: загружено из базы {loaded} напоминаний, HTTP запросов к CalDAV "
+              f"{sum(server.request_counts.values())}")
+
+        # Изменения календаря: часть событий удалена, часть добавлена
+        base = datetime.now().replace(microsecond=0) + timedelta(hours=2)
+        for i in range(args.events):
+            uid = f"later-{i}"
+            calendar.put(f"{calendar.path}{uid}.ics", make_event_ics(uid, f"Позже {i}", base + timedelta(minutes=i),
+                                                                     base + timedelta(minutes=i + 30)))
+        manager.cache.invalidate()
+        for user_id in range(1, args.users + 1):
+            await scheduler.subscribe(user_id, user_id, 1)
+        await wait_for(lambda: scheduler.scheduled() == expected, 30)
+
+        changed = args.events // 4
+        for i in range(changed):
+            calendar.delete(f"{calendar.path}later-{i}.ics")
+        for i in range(changed):
+            uid = f"new-{uuid.uuid4().hex[:8]}"
+            calendar.put(f"{calendar.path}{uid}.ics", make_event_ics(uid, f"Новое {i}", base + timedelta(hours=1, minutes=i),
+                                                                     base + timedelta(hours=1, minutes=i + 30)))
+        manager.cache.invalidate()
+        server.reset_counts()
+        heap_before = len(scheduler._heap)
+        started = time.perf_counter()
+        for user_id in range(1, args.users + 1):
+            await scheduler.subscribe(user_id, user_id, 1)
+        await wait_for(lambda: len(scheduler._heap) - heap_before >= args.users * changed, 30)
+        elapsed = time.perf_counter() - started
+        summaries = {reminder.summary for reminder in scheduler._scheduled.values()}
+        ok = scheduler.scheduled() == expected and "Позже 0" not in summaries and "Новое 0" in summaries
+        print(f"Обновление после изменения {changed} удаленных и {changed} новых событий: {elapsed:.2f} с, "
+              f"новых записей кучи {len(scheduler._heap) - heap_before}, HTTP запросов "
+              f"{sum(server.request_counts.values())}, расписание {'совпадает' if ok else 'РАСХОДИТСЯ'}")
+
+        await scheduler.stop()
+        await manager.close()
+        shutdown_executor()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reminders", type=int, default=50000, help="Число напоминаний в замере кучи")
+    parser.add_argument("--users", type=int, default=50, help="Число пользователей с напоминаниями")
+    parser.add_argument("--events", type=int, default=40, help="Число событий в календаре")
+    parser.add_argument("--spread", type=int, default=8, help="В течение скольких секунд наступают напоминания")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
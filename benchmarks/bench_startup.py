@@ -0,0 +1,80 @@
+"""
+Время холодного старта бота до первого обработанного обновления
+
+Каждый замер выполняется в отдельном процессе, так как модули бота
+подключаются к календарю при импорте и запуске. Сравниваются запуск
+без сохраненных результатов обнаружения календаря и повторный запуск с ними.
+
+Запуск: python -m benchmarks.bench_startup --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.common import configure_env
+from benchmarks.fake_caldav import FakeCalDAVServer
+
+
+async def _child() -> dict:
+    # Библиотеки импортируются заранее: замеряется только запуск кода бота
+    from aiogram import Dispatcher
+    from benchmarks.fake_telegram import FakeTelegramSession, make_bot, make_message_update
+
+    started = time.perf_counter()
+    import handlers
+    imported = time.perf_counter()
+    session = FakeTelegramSession()
+    bot = make_bot(session)
+    dp = Dispatcher()
+    dp.include_router(handlers.router)
+    await dp.emit_startup(bot=bot)
+
+    await dp.feed_update(bot, make_message_update("/help"))
+    first_update = time.perf_counter()
+    await dp.feed_update(bot, make_message_update("/events"))
+    first_events = time.perf_counter()
+    answered = session.sent[-1][1].text if session.sent else ""
+
+    await dp.emit_shutdown(bot=bot)
+    return {
+        "import": imported - started,
+        "first_update": first_update - started,
+        "first_events": first_events - started,
+        "events_ok": "недоступен" not in answered,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка сервера в секундах")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_child())))
+        return
+
+    with FakeCalDAVServer(latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        server.populate(20, datetime.now().replace(hour=0, minute=0, second=0, microsecond=0))
+        discovery_cache = os.path.join(tmp, "discovery.json")
+        configure_env(server.url, CALDAV_DISCOVERY_CACHE=discovery_cache)
+        print(f"Сервер: {server.url}, задержка {args.latency * 1000:.0f} мс")
+        for name in ("холодный старт", "с кешем обнаружения"):
+            server.reset_counts()
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+                                 capture_output=True, text=True, env=os.environ, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{name:<22} импорт {result['import'] * 1000:7.1f} мс  "
+                  f"первое обновление {result['first_update'] * 1000:7.1f} мс  "
+                  f"первый /events {result['first_events'] * 1000:7.1f} мс  "
+                  f"запросов PROPFIND {server.request_counts.get('PROPFIND', 0)}")
+
+
+if __name__ == "__main__":
+    main()
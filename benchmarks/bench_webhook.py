@@ -0,0 +1,191 @@
+"""
+Пропускная способность и задержка обработки обновлений: long polling и вебхук
+
+Бот запускается как обычно (python main.py) в отдельном процессе и работает
+с заглушками Bot API и CalDAV. Записанные или сгенерированные обновления
+воспроизводятся с заданной частотой: в режиме polling они отдаются через
+getUpdates, в режиме webhook отправляются POST запросами на HTTP сервер бота.
+Задержка - время от поступления обновления до ответа бота в этот чат,
+поэтому каждому обновлению присваивается отдельный чат.
+
+Запуск: python -m benchmarks.bench_webhook --updates 2000 --workers 2
+        python -m benchmarks.bench_webhook --replay updates.jsonl --rate 200
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import aiohttp
+
+from benchmarks.common import configure_env, percentile
+from benchmarks.fake_caldav import FakeCalDAVServer
+from benchmarks.fake_telegram import FakeBotAPIServer, make_raw_message_update
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "bench-secret"
+DEFAULT_MIX = ("/help", "/events", "/start", "/events")
+
+
+def load_updates(path: str, count: int) -> list:
+    """Обновления из файла (по одному JSON в строке) или сгенерированный набор команд"""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = [make_raw_message_update(text, chat_id=1)
+                   for text in itertools.islice(itertools.cycle(DEFAULT_MIX), count)]
+    # Каждому обновлению свой чат, чтобы сопоставить ответ с обновлением
+    result = []
+    for number, update in enumerate(updates[:count] if count else updates):
+        update = json.loads(json.dumps(update))
+        message = update.get('message')
+        if not message:
+            continue
+        message['chat']['id'] = 100000 + number
+        message.setdefault('from', {'is_bot': False, 'first_name': "Бенчмарк"})['id'] = 100000 + number
+        result.append(update)
+    return result
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run_mode(mode: str, updates: list, args, caldav_url: str) -> dict:
+    api = await FakeBotAPIServer(latency=args.api_latency).start()
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'RUN_MODE': mode,
+        'TELEGRAM_API_URL': api.url,
+        'WEBHOOK_URL': f"http://127.0.0.1:{port}",
+        'WEBHOOK_HOST': "127.0.0.1",
+        'WEBHOOK_PORT': str(port),
+        'WEBHOOK_SECRET': SECRET,
+        'WEBHOOK_WORKERS': str(args.workers if mode == "webhook" else 1),
+        'METRICS_PORT': "0",
+    })
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env,
+                               stdout=None if args.verbose else subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    try:
+        if mode == "webhook":
+            workers = args.workers
+            await api.wait_calls("getMe", workers)
+            await api.wait_calls("setWebhook")
+            await wait_port(port)
+            # Остальные процессы открывают порт чуть позже
+            await asyncio.sleep(0.5 if workers > 1 else 0)
+        else:
+            await api.wait_calls("getUpdates")
+
+        pushed = {}
+        chat_ids = [update['message']['chat']['id'] for update in updates]
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.connections)) as http:
+            async def deliver(update):
+                chat_id = update['message']['chat']['id']
+                pushed[chat_id] = time.perf_counter()
+                if mode == "webhook":
+                    async with http.post(api.webhook['url'], json=update,
+                                         headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}) as response:
+                        if response.status != 200:
+                            raise RuntimeError(f"вебхук ответил {response.status}")
+                else:
+                    await api.push_update(update)
+
+            started = time.perf_counter()
+            tasks = []
+            for number, update in enumerate(updates):
+                if args.rate:
+                    delay = started + number / args.rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(deliver(update)))
+            await asyncio.gather(*tasks)
+            await api.wait_sent(len(updates), timeout=args.timeout)
+            finished = time.perf_counter()
+
+        replied = {}
+        for sent_at, chat_id, _ in api.sent:
+            replied.setdefault(chat_id, sent_at)
+        latencies = [replied[chat_id] - pushed[chat_id] for chat_id in chat_ids if chat_id in replied]
+    finally:
+        stop_started = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        stopped = time.perf_counter() - stop_started
+        await api.stop()
+
+    return {
+        'updates': len(latencies),
+        'rate': len(latencies) / (finished - started),
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'stop': stopped,
+        'exit': process.returncode,
+    }
+
+
+async def run(args) -> None:
+    with FakeCalDAVServer(latency=args.latency) as caldav:
+        caldav.populate(20, datetime.now().replace(hour=0, minute=0, second=0, microsecond=0))
+        # Ограничения частоты отключены: замеряется сам транспорт обновлений
+        configure_env(caldav.url, ACCOUNTS_FILE="", COMMAND_RATE_LIMIT=1e9, COMMAND_CHAT_RATE_LIMIT=1e9,
+                      TELEGRAM_RATE_LIMIT=1e9, TELEGRAM_CHAT_RATE_LIMIT=1e9, CALDAV_RATE_LIMIT=1e9,
+                      CALDAV_CHAT_RATE_LIMIT=1e9)
+        updates = load_updates(args.replay, args.updates)
+        print(f"Обновлений: {len(updates)}, частота: {args.rate or 'максимальная'}, "
+              f"задержка CalDAV {args.latency * 1000:.0f} мс, Bot API {args.api_latency * 1000:.0f} мс")
+        modes = ["polling", "webhook"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            result = await run_mode(mode, updates, args, caldav.url)
+            name = mode if mode == "polling" else f"webhook x{args.workers}"
+            print(f"{name:<14} n={result['updates']:<6} {result['rate']:8.1f} обн/с  "
+                  f"p50={result['p50'] * 1000:8.2f} мс  p95={result['p95'] * 1000:8.2f} мс  "
+                  f"p99={result['p99'] * 1000:8.2f} мс  остановка {result['stop'] * 1000:6.0f} мс "
+                  f"(код {result['exit']})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=("polling", "webhook", "both"), default="both")
+    parser.add_argument("--updates", type=int, default=1000, help="число обновлений (0 - все из --replay)")
+    parser.add_argument("--replay", default="", help="файл с записанными обновлениями, JSON в каждой строке")
+    parser.add_argument("--rate", type=float, default=0, help="обновлений в секунду (0 - без ограничения)")
+    parser.add_argument("--workers", type=int, default=1, help="число процессов в режиме webhook")
+    parser.add_argument("--connections", type=int, default=100, help="одновременных соединений с вебхуком")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка CalDAV сервера в секундах")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка Bot API в секундах")
+    parser.add_argument("--timeout", type=float, default=120, help="ожидание ответов в секундах")
+    parser.add_argument("--verbose", action="store_true", help="показывать вывод бота")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
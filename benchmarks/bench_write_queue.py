@@ -0,0 +1,122 @@
+"""
+Очередь записи событий против прямой записи в CalDAV
+
+Сравнивает задержку ответа пользователю на /add_event при прямом PUT
+(ответ после ответа сервера) и при постановке в очередь SQLite, затем
+проверяет, что события, принятые во время недоступности сервера
+и перед перезапуском процесса, записываются ровно один раз.
+
+Запуск: python -m benchmarks.bench_write_queue --events 200 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import Timer, configure_env
+from benchmarks.fake_caldav import FakeCalDAVServer
+
+
+async def wait_empty(queue, timeout: float = 60) -> float:
+    started = time.perf_counter()
+    while queue.pending():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Очередь не опустела за {timeout} с: {queue.pending()} событий")
+        await asyncio.sleep(0.02)
+    return time.perf_counter() - started
+
+
+async def run(args) -> None:
+    with FakeCalDAVServer(latency=args.latency) as server:
+        configure_env(server.url, CALDAV_RATE_LIMIT=10000, CALDAV_CHAT_RATE_LIMIT=10000)
+        from calendar_utils import CalendarManager, shutdown_executor
+        from write_queue import WriteQueue
+
+        manager = CalendarManager()
+        assert await manager.connect(), "Нет подключения к заглушке CalDAV"
+        calendar = server.calendars["main"]
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=3)
+        events = [(f"Событие {i}", start + timedelta(minutes=15 * i)) for i in range(args.events)]
+
+        with Timer("прямой PUT") as direct:
+            async def add_direct(summary, start_time):
+                started = time.perf_counter()
+                await manager.add_event(summary, start_time)
+                direct.add(time.perf_counter() - started)
+            await asyncio.gather(*(add_direct(summary, start_time) for summary, start_time in events))
+
+        available = True
+        notifications = []
+
+        async def resolve(user_id):
+            return manager if available else None
+
+        async def notify(chat_id, text):
+            notifications.append(text)
+
+        path = os.path.join(tempfile.mkdtemp(), "write_queue.db")
+        options = dict(resolve=resolve, notify=notify, retry_min_delay=0.05, retry_max_delay=0.5,
+                       batch_size=args.batch)
+
+        queue = WriteQueue(path, **options)
+        queue.start()
+        before = len(calendar.objects)
+        with Timer("очередь SQLite") as queued:
+            async def add_queued(summary, start_time):
+                started = time.perf_counter()
+                await queue.enqueue(1, 1, summary, start_time, start_time + timedelta(hours=1))
+                queued.add(time.perf_counter() - started)
+            await asyncio.gather(*(add_queued(summary, start_time) for summary, start_time in events))
+        flushed = await wait_empty(queue)
+
+        print(direct.report())
+        print(queued.report())
+        print(f"Очередь записала {len(calendar.objects) - before} событий за {flushed:.2f} с после приема")
+
+        # Сервер недоступен: события принимаются и ждут, затем записываются после восстановления
+        available = False
+        before = len(calendar.objects)
+        for summary, start_time in events:
+            await queue.enqueue(1, 1, summary, start_time, start_time + timedelta(hours=1))
+        await asyncio.sleep(1)
+        waiting = queue.pending()
+        available = True
+        flushed = await wait_empty(queue)
+        print(f"Сбой сервера: в очереди {waiting} событий, записано {len(calendar.objects) - before} "
+              f"за {flushed:.2f} с после восстановления, уведомлений {len(notifications)}")
+
+        # Перезапуск: очередь остановлена до отправки, новый экземпляр дописывает события
+        available = False
+        before = len(calendar.objects)
+        for summary, start_time in events:
+            await queue.enqueue(1, 1, summary, start_time, start_time + timedelta(hours=1))
+        await queue.stop()
+        available = True
+        restarted = WriteQueue(path, **options)
+        restarted.start()
+        flushed = await wait_empty(restarted)
+        print(f"Перезапуск: записано {len(calendar.objects) - before} из {len(events)} за {flushed:.2f} с")
+
+        # Потерянный ответ: событие с тем же UID уже на сервере, дубликат не создается
+        uid = (await manager.add_event("Повтор", start)).uid
+        before = len(calendar.objects)
+        result = await manager.add_event("Повтор", start, uid=uid)
+        print(f"Повторная отправка UID: успех={bool(result)}, новых объектов {len(calendar.objects) - before}")
+
+        await restarted.stop()
+        await manager.close()
+        shutdown_executor()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200, help="Число событий в каждом сценарии")
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка ответа заглушки CalDAV, с")
+    parser.add_argument("--batch", type=int, default=20, help="Размер пакета отправки очереди")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Общие утилиты нагрузочных тестов
+
+Модули бота читают конфигурацию при импорте, поэтому переменные
+окружения нужно выставить через configure_env до импорта calendar_utils и handlers.
+"""
+import os
+import statistics
+import time
+
+
+def configure_env(caldav_url: str, username: str = "bench", password: str = "bench", **extra) -> None:
+    """Установка переменных окружения, необходимых config.py"""
+    os.environ.setdefault("BOT_TOKEN", "42:BENCHMARK")
+    os.environ["CALDAV_URL"] = caldav_url
+    os.environ["CALDAV_USERNAME"] = username
+    os.environ["CALDAV_PASSWORD"] = password
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("CALDAV_DISCOVERY_CACHE", "")
+    for key, value in extra.items():
+        os.environ[key] = str(value)
+
+
+def percentile(values, pct: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class Timer:
+    """Сбор длительностей отдельных операций и итоговой пропускной способности"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples = []
+        self.started = None
+        self.finished = None
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.finished = time.perf_counter()
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def report(self) -> str:
+        total = (self.finished or time.perf_counter()) - self.started
+        count = len(self.samples)
+        mean = statistics.fmean(self.samples) if self.samples else 0.0
+        return (
+            f"{self.name:<32} n={count:<6} {count / total if total else 0:>10.1f} оп/с  "
+            f"avg={mean * 1000:8.2f} мс  p50={percentile(self.samples, 50) * 1000:8.2f} мс  "
+            f"p99={percentile(self.samples, 99) * 1000:8.2f} мс"
+        )
@@ -0,0 +1,469 @@
+"""
+Локальный CalDAV сервер-заглушка для нагрузочных тестов
+
+Сервер хранит события в памяти и понимает ровно то подмножество CalDAV,
+которое использует бот: обнаружение principal/календарей (PROPFIND),
+calendar-query с time-range, calendar-multiget, sync-collection,
+free-busy-query, а также PUT/GET/DELETE отдельных объектов.
+Задержка ответа настраивается, чтобы имитировать медленный сервер.
+"""
+import base64
+import re
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from dateutil.rrule import rrulestr
+
+DAV = "{DAV:}"
+CALDAV = "{urn:ietf:params:xml:ns:caldav}"
+
+ROOT_PATH = "/dav/"
+PRINCIPAL_PATH = "/dav/principal/"
+HOME_PATH = "/dav/calendars/"
+
+_DT_RE = re.compile(r"^(DTSTART|DTEND)(;[^:]*)?:(\d{8}(T\d{6}Z?)?)", re.MULTILINE)
+_UID_RE = re.compile(r"^UID:(.+?)\r?$", re.MULTILINE)
+_RRULE_RE = re.compile(r"^RRULE:(.+?)\r?$", re.MULTILINE)
+
+
+def _parse_ical_dt(value: str) -> datetime:
+    """Разбор значения DATE/DATE-TIME в наивный datetime (UTC или плавающее время)"""
+    value = value.rstrip("Z")
+    if "T" in value:
+        return datetime.strptime(value, "%Y%m%dT%H%M%S")
+    return datetime.strptime(value, "%Y%m%d")
+
+
+def make_event_ics(uid: str, summary: str, start: datetime, end: datetime, rrule: str = None) -> str:
+    """Формирование минимального VCALENDAR с одним VEVENT"""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//fake-caldav//bench//RU",
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{datetime.utcnow():%Y%m%dT%H%M%SZ}",
+        f"DTSTART:{start:%Y%m%dT%H%M%S}",
+        f"DTEND:{end:%Y%m%dT%H%M%S}",
+        f"SUMMARY:{summary}",
+    ]
+    if rrule:
+        lines.append(f"RRULE:{rrule}")
+    lines += ["END:VEVENT", "END:VCALENDAR", ""]
+    return "\r\n".join(lines)
+
+
+class _Resource:
+    __slots__ = ("data", "etag", "revision", "start", "end", "recurring", "all_day")
+
+    def __init__(self, data: str, revision: int):
+        self.data = data
+        self.etag = f'"{uuid.uuid4().hex}"'
+        self.revision = revision
+        # DTSTART встречается и в описании пояса VTIMEZONE, поэтому время берется только из VEVENT
+        vevent = data[data.find("BEGIN:VEVENT"):data.find("END:VEVENT")]
+        matches = {m.group(1): m for m in _DT_RE.finditer(vevent)}
+        dates = {name: _parse_ical_dt(m.group(3)) for name, m in matches.items()}
+        self.start = dates.get("DTSTART")
+        self.end = dates.get("DTEND") or (self.start + timedelta(hours=1) if self.start else None)
+        self.recurring = "\nRRULE:" in data
+        self.all_day = "DTSTART" in matches and matches["DTSTART"].group(4) is None
+
+    def busy_periods(self, start: datetime, end: datetime):
+        """Периоды занятости экземпляров события, пересекающиеся с [start, end)"""
+        if self.start is None or self.all_day:
+            return
+        duration = self.end - self.start
+        starts = [self.start]
+        if self.recurring:
+            rule = rrulestr(_RRULE_RE.search(self.data).group(1), dtstart=self.start)
+            starts = rule.between(start - duration, end, inc=True)
+        for begin in starts:
+            if begin < end and begin + duration > start:
+                yield begin, begin + duration
+
+
+class FakeCalendar:
+    """Одна коллекция календаря: объекты, журнал изменений для sync-token и ctag"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path = f"{HOME_PATH}{name}/"
+        self.objects = {}
+        self.tombstones = {}
+        self.revision = 0
+        self.lock = threading.Lock()
+
+    @property
+    def sync_token(self) -> str:
+        return f"http://fake-caldav/sync/{self.revision}"
+
+    def put(self, href: str, data: str, if_none_match: bool = False):
+        with self.lock:
+            if if_none_match and href in self.objects:
+                return None
+            self.revision += 1
+            resource = _Resource(data, self.revision)
+            created = href not in self.objects
+            self.objects[href] = resource
+            self.tombstones.pop(href, None)
+            return resource, created
+
+    def delete(self, href: str) -> bool:
+        with self.lock:
+            if href not in self.objects:
+                return False
+            del self.objects[href]
+            self.revision += 1
+            self.tombstones[href] = self.revision
+            return True
+
+    def in_range(self, start: datetime, end: datetime):
+        with self.lock:
+            items = list(self.objects.items())
+        for href, res in items:
+            if res.start is None:
+                continue
+            if res.recurring:
+                if end is None or res.start < end:
+                    yield href, res
+            elif (end is None or res.start < end) and (start is None or res.end > start):
+                yield href, res
+
+    def changes_since(self, revision: int):
+        with self.lock:
+            changed = [(h, r) for h, r in self.objects.items() if r.revision > revision]
+            deleted = [h for h, rev in self.tombstones.items() if rev > revision]
+        return changed, deleted
+
+
+class FakeCalDAVServer:
+    """
+    CalDAV сервер в отдельном потоке
+
+    :param latency: Искусственная задержка каждого ответа в секундах
+    :param calendars: Имена календарей, создаваемых при запуске
+    :param sync_support: Поддерживать ли sync-collection (RFC 6578)
+    :param freebusy_support: Поддерживать ли free-busy-query
+    """
+
+    def __init__(self, latency: float = 0.0, calendars=("main",), username: str = "bench",
+                 password: str = "bench", sync_support: bool = True, freebusy_support: bool = True,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.username = username
+        self.password = password
+        self.sync_support = sync_support
+        self.freebusy_support = freebusy_support
+        self.calendars = {name: FakeCalendar(name) for name in calendars}
+        self.request_counts = {}
+        self._counts_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{ROOT_PATH}"
+
+    def start(self) -> "FakeCalDAVServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeCalDAVServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def count(self, method: str) -> None:
+        with self._counts_lock:
+            self.request_counts[method] = self.request_counts.get(method, 0) + 1
+
+    def reset_counts(self) -> None:
+        with self._counts_lock:
+            self.request_counts.clear()
+
+    def populate(self, count: int, start: datetime, span_days: int = 7, calendar: str = "main",
+                 recurring_every: int = 0) -> None:
+        """
+        Заполнение календаря синтетическими событиями
+
+        :param count: Количество событий
+        :param start: Начало периода, по которому распределяются события
+        :param span_days: Длина периода в днях
+        :param recurring_every: Каждое N-е событие делать еженедельно повторяющимся (0 - не делать)
+        """
+        cal = self.calendars[calendar]
+        step = timedelta(days=span_days) / max(count, 1)
+        for i in range(count):
+            uid = f"bench-{i}-{uuid.uuid4().hex[:8]}"
+            begin = (start + step * i).replace(second=0, microsecond=0)
+            rrule = "FREQ=WEEKLY;COUNT=52" if recurring_every and i % recurring_every == 0 else None
+            cal.put(f"{cal.path}{uid}.ics", make_event_ics(uid, f"Событие {i}", begin,
+                                                           begin + timedelta(minutes=30), rrule))
+
+    def calendar_for(self, path: str):
+        for cal in self.calendars.values():
+            if path.startswith(cal.path):
+                return cal
+        return None
+
+
+def _response(href: str, props: str, status: str = "HTTP/1.1 200 OK") -> str:
+    return (
+        f"<D:response><D:href>{escape(href)}</D:href>"
+        f"<D:propstat><D:prop>{props}</D:prop><D:status>{status}</D:status></D:propstat>"
+        f"</D:response>"
+    )
+
+
+def _multistatus(body: str, extra: str = "") -> bytes:
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<D:multistatus xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav" '
+        'xmlns:CS="http://calendarserver.org/ns/">'
+        f"{body}{extra}</D:multistatus>"
+    ).encode("utf-8")
+
+
+def _object_props(res: _Resource, with_data: bool = True) -> str:
+    props = f"<D:getetag>{escape(res.etag)}</D:getetag>"
+    if with_data:
+        props += f"<C:calendar-data>{escape(res.data)}</C:calendar-data>"
+    return props
+
+
+def _make_handler(server: FakeCalDAVServer):
+    expected_auth = "Basic " + base64.b64encode(
+        f"{server.username}:{server.password}".encode()
+    ).decode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Без TCP_NODELAY заголовки и тело ответа ждут задержанного ACK клиента
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: bytes = b"", headers: dict = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            if body:
+                self.send_header("Content-Type", "application/xml; charset=utf-8")
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def _prepare(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            server.count(self.command)
+            if server.latency:
+                time.sleep(server.latency)
+            if self.headers.get("Authorization") != expected_auth:
+                self._reply(401, headers={"WWW-Authenticate": 'Basic realm="fake"'})
+                return None, None
+            return unquote(urlparse(self.path).path), body
+
+        def do_PROPFIND(self):
+            path, body = self._prepare()
+            if path is None:
+                return
+            depth = self.headers.get("Depth", "0")
+            if path == ROOT_PATH:
+                props = f"<D:current-user-principal><D:href>{PRINCIPAL_PATH}</D:href></D:current-user-principal>"
+                self._reply(207, _multistatus(_response(path, props)))
+            elif path == PRINCIPAL_PATH:
+                props = f"<C:calendar-home-set><D:href>{HOME_PATH}</D:href></C:calendar-home-set>"
+                self._reply(207, _multistatus(_response(path, props)))
+            elif path == HOME_PATH:
+                out = _response(path, "<D:resourcetype><D:collection/></D:resourcetype><D:displayname>home</D:displayname>")
+                if depth != "0":
+                    for cal in server.calendars.values():
+                        out += _response(cal.path, self._calendar_props(cal))
+                self._reply(207, _multistatus(out))
+            else:
+                cal = server.calendar_for(path)
+                if cal is None:
+                    self._reply(404)
+                    return
+                if path == cal.path:
+                    out = _response(cal.path, self._calendar_props(cal))
+                    if depth != "0":
+                        for href, res in list(cal.objects.items()):
+                            out += _response(href, _object_props(res, with_data=False))
+                    self._reply(207, _multistatus(out))
+                elif path in cal.objects:
+                    self._reply(207, _multistatus(_response(path, _object_props(cal.objects[path], False))))
+                else:
+                    self._reply(404)
+
+        def _calendar_props(self, cal: FakeCalendar) -> str:
+            props = (
+                "<D:resourcetype><D:collection/><C:calendar/></D:resourcetype>"
+                f"<D:displayname>{escape(cal.name)}</D:displayname>"
+                f"<CS:getctag>{cal.revision}</CS:getctag>"
+            )
+            if server.sync_support:
+                props += f"<D:sync-token>{cal.sync_token}</D:sync-token>"
+            return props
+
+        def do_REPORT(self):
+            path, body = self._prepare()
+            if path is None:
+                return
+            cal = server.calendar_for(path)
+            if cal is None:
+                self._reply(404)
+                return
+            try:
+                root = ElementTree.fromstring(body)
+            except ElementTree.ParseError:
+                self._reply(400)
+                return
+            if root.tag == f"{CALDAV}calendar-query":
+                self._calendar_query(cal, root)
+            elif root.tag == f"{CALDAV}calendar-multiget":
+                out = ""
+                for href_el in root.iter(f"{DAV}href"):
+                    href = unquote(urlparse(href_el.text.strip()).path)
+                    res = cal.objects.get(href)
+                    if res is None:
+                        out += f"<D:response><D:href>{escape(href)}</D:href><D:status>HTTP/1.1 404 Not Found</D:status></D:response>"
+                    else:
+                        out += _response(href, _object_props(res))
+                self._reply(207, _multistatus(out))
+            elif root.tag == f"{DAV}sync-collection" and server.sync_support:
+                self._sync_collection(cal, root)
+            elif root.tag == f"{CALDAV}free-busy-query" and server.freebusy_support:
+                self._free_busy(cal, root)
+            else:
+                self._reply(403)
+
+        def _time_range(self, root):
+            tr = next(root.iter(f"{CALDAV}time-range"), None)
+            if tr is None:
+                return None, None
+            start = tr.get("start")
+            end = tr.get("end")
+            return (_parse_ical_dt(start) if start else None,
+                    _parse_ical_dt(end) if end else None)
+
+        def _calendar_query(self, cal: FakeCalendar, root) -> None:
+            start, end = self._time_range(root)
+            with_data = next(root.iter(f"{CALDAV}calendar-data"), None) is not None
+            out = "".join(_response(href, _object_props(res, with_data))
+                          for href, res in cal.in_range(start, end))
+            self._reply(207, _multistatus(out))
+
+        def _sync_collection(self, cal: FakeCalendar, root) -> None:
+            token_el = next(root.iter(f"{DAV}sync-token"), None)
+            token = (token_el.text or "").strip() if token_el is not None else ""
+            revision = 0
+            if token:
+                try:
+                    revision = int(token.rsplit("/", 1)[-1])
+                except ValueError:
+                    self._reply(403)
+                    return
+            changed, deleted = cal.changes_since(revision)
+            out = "".join(_response(href, _object_props(res, with_data=False)) for href, res in changed)
+            if revision:
+                out += "".join(
+                    f"<D:response><D:href>{escape(href)}</D:href><D:status>HTTP/1.1 404 Not Found</D:status></D:response>"
+                    for href in deleted
+                )
+            self._reply(207, _multistatus(out, f"<D:sync-token>{cal.sync_token}</D:sync-token>"))
+
+        def _free_busy(self, cal: FakeCalendar, root) -> None:
+            start, end = self._time_range(root)
+            lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//fake-caldav//bench//RU", "BEGIN:VFREEBUSY"]
+            for _, res in cal.in_range(start, end):
+                for begin, finish in res.busy_periods(start, end):
+                    lines.append(f"FREEBUSY;FBTYPE=BUSY:{begin:%Y%m%dT%H%M%SZ}/{finish:%Y%m%dT%H%M%SZ}")
+            lines += ["END:VFREEBUSY", "END:VCALENDAR", ""]
+            body = "\r\n".join(lines).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/calendar; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_PUT(self):
+            path, body = self._prepare()
+            if path is None:
+                return
+            cal = server.calendar_for(path)
+            if cal is None or path == cal.path:
+                self._reply(409)
+                return
+            data = body.decode("utf-8")
+            if not _UID_RE.search(data):
+                self._reply(400)
+                return
+            result = cal.put(path, data, if_none_match=self.headers.get("If-None-Match") == "*")
+            if result is None:
+                self._reply(412)
+                return
+            resource, created = result
+            self._reply(201 if created else 204, headers={"ETag": resource.etag})
+
+        def do_GET(self):
+            path, _ = self._prepare()
+            if path is None:
+                return
+            cal = server.calendar_for(path)
+            res = cal.objects.get(path) if cal else None
+            if res is None:
+                self._reply(404)
+                return
+            if self.headers.get("If-None-Match") == res.etag:
+                self._reply(304, headers={"ETag": res.etag})
+                return
+            body = res.data.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/calendar; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", res.etag)
+            self.send_header("Last-Modified", formatdate(usegmt=True))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_DELETE(self):
+            path, _ = self._prepare()
+            if path is None:
+                return
+            cal = server.calendar_for(path)
+            if cal is None or not cal.delete(path):
+                self._reply(404)
+                return
+            self._reply(204)
+
+        def do_OPTIONS(self):
+            path, _ = self._prepare()
+            if path is None:
+                return
+            self._reply(200, headers={"DAV": "1, 2, 3, calendar-access", "Allow": "OPTIONS, GET, PUT, DELETE, PROPFIND, REPORT"})
+
+    return Handler
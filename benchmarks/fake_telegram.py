@@ -0,0 +1,252 @@
+"""
+Заглушка Telegram Bot API для нагрузочных тестов
+
+FakeTelegramSession подменяет HTTP сессию aiogram: вызовы методов API
+не уходят в сеть, а записываются и получают правдоподобный ответ.
+FakeBotAPIServer - то же самое в виде HTTP сервера для бота, запущенного
+в отдельном процессе (TELEGRAM_API_URL), включая getUpdates для long polling.
+Вспомогательные функции строят входящие обновления для Dispatcher.feed_update.
+"""
+import asyncio
+import itertools
+import time
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from aiohttp import web
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.methods import (
+    AnswerCallbackQuery, DeleteWebhook, EditMessageText, GetMe, SendMessage, SetWebhook, TelegramMethod
+)
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+BOT_USER = User(id=42, is_bot=True, first_name="Бенчмарк", username="bench_bot")
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Сессия aiogram, отвечающая на запросы без обращения к Telegram
+
+    :param latency: Искусственная задержка каждого вызова API в секундах
+    """
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls = []
+        self.sent = []
+        self._message_ids = itertools.count(1)
+        self._waiters = []
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append(method)
+
+        if isinstance(method, GetMe):
+            return BOT_USER
+        if isinstance(method, (SendMessage, EditMessageText)):
+            message = Message(
+                message_id=method.message_id if isinstance(method, EditMessageText) and method.message_id
+                else next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                from_user=BOT_USER,
+                text=method.text,
+                reply_markup=method.reply_markup,
+            )
+            self.sent.append((time.perf_counter(), message))
+            self._wake()
+            return message
+        if isinstance(method, (AnswerCallbackQuery, DeleteWebhook, SetWebhook)):
+            return True
+        return True
+
+    def _wake(self) -> None:
+        for count, future in list(self._waiters):
+            if len(self.sent) >= count and not future.done():
+                future.set_result(None)
+                self._waiters.remove((count, future))
+
+    async def wait_sent(self, count: int, timeout: float = 30) -> None:
+        """Ожидание, пока бот отправит не меньше count сообщений"""
+        if len(self.sent) >= count:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((count, future))
+        await asyncio.wait_for(future, timeout)
+
+
+class FakeBotAPIServer:
+    """
+    HTTP сервер, отвечающий на запросы Bot API
+
+    Обновления, добавленные через push_update, отдаются боту через getUpdates
+    (long polling). Отправленные ботом сообщения записываются в sent
+    как (время, chat_id, текст), установленный вебхук - в webhook.
+
+    :param latency: Искусственная задержка каждого вызова API в секундах
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1"):
+        self.latency = latency
+        self.host = host
+        self.port = None
+        self.calls = {}
+        self.sent = []
+        self.webhook = None
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._changed = None
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> "FakeBotAPIServer":
+        self._changed = asyncio.Condition()
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def push_update(self, update: dict) -> int:
+        """Добавление обновления в очередь getUpdates; возвращает присвоенный update_id"""
+        update = dict(update, update_id=next(self._update_ids))
+        async with self._changed:
+            self._updates.append(update)
+            self._changed.notify_all()
+        return update['update_id']
+
+    async def wait_sent(self, count: int, timeout: float = 60) -> None:
+        """Ожидание, пока бот отправит не меньше count сообщений"""
+        async with self._changed:
+            await asyncio.wait_for(self._changed.wait_for(lambda: len(self.sent) >= count), timeout)
+
+    async def wait_calls(self, method: str, count: int = 1, timeout: float = 60) -> None:
+        """Ожидание, пока бот вызовет метод API не меньше count раз"""
+        method = method.lower()
+        async with self._changed:
+            await asyncio.wait_for(self._changed.wait_for(lambda: self.calls.get(method, 0) >= count), timeout)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result = await self._call(method, params)
+        async with self._changed:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self._changed.notify_all()
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _call(self, method: str, params: dict):
+        if method == "getme":
+            return BOT_USER.model_dump(exclude_none=True)
+        if method == "getupdates":
+            offset = int(params.get('offset') or 0)
+            timeout = float(params.get('timeout') or 0)
+            async with self._changed:
+                # Подтвержденные ботом обновления больше не хранятся
+                self._updates = [u for u in self._updates if u['update_id'] >= offset]
+                if not self._updates and timeout:
+                    try:
+                        await asyncio.wait_for(self._changed.wait_for(lambda: self._updates), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                return list(self._updates[:int(params.get('limit') or 100)])
+        if method in ("sendmessage", "editmessagetext"):
+            chat_id = int(params['chat_id'])
+            async with self._changed:
+                self.sent.append((time.perf_counter(), chat_id, params.get('text', "")))
+                self._changed.notify_all()
+            return {
+                'message_id': int(params.get('message_id') or next(self._message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': "private"},
+                'from': BOT_USER.model_dump(exclude_none=True),
+                'text': params.get('text', ""),
+            }
+        if method == "setwebhook":
+            self.webhook = {'url': params.get('url'), 'secret_token': params.get('secret_token')}
+        elif method == "deletewebhook":
+            self.webhook = None
+        return True
+
+
+_update_ids = itertools.count(1)
+
+
+def make_message_update(text: str, chat_id: int = 1000, user_id: int = None) -> Update:
+    """Входящее текстовое сообщение от пользователя в личном чате"""
+    user_id = user_id or chat_id
+    return Update(
+        update_id=next(_update_ids),
+        message=Message(
+            message_id=next(_update_ids),
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="private" if chat_id > 0 else "group"),
+            from_user=User(id=user_id, is_bot=False, first_name=f"Пользователь {user_id}"),
+            text=text,
+        ),
+    )
+
+
+def make_raw_message_update(text: str, chat_id: int, user_id: int = None) -> dict:
+    """Входящее текстовое сообщение в виде JSON, как его присылает Telegram"""
+    user_id = user_id or chat_id
+    return {
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_update_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': "private" if chat_id > 0 else "group"},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"Пользователь {user_id}"},
+            'text': text,
+        },
+    }
+
+
+def make_callback_update(data: str, message: Message, user_id: int = None) -> Update:
+    """Нажатие кнопки встроенной клавиатуры под сообщением бота"""
+    user_id = user_id or message.chat.id
+    return Update(
+        update_id=next(_update_ids),
+        callback_query=CallbackQuery(
+            id=str(next(_update_ids)),
+            from_user=User(id=user_id, is_bot=False, first_name=f"Пользователь {user_id}"),
+            chat_instance=str(message.chat.id),
+            message=message,
+            data=data,
+        ),
+    )
+
+
+def make_bot(session: FakeTelegramSession) -> Bot:
+    """Бот aiogram, работающий через заглушку API"""
+    return Bot(token="42:BENCHMARK", session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
@@ -1,152 +1,1153 @@
+import asyncio
 import caldav
+import contextvars
+import icalendar
+import functools
+import ipaddress
+import json
 import logging
+import os
+import random
+import requests
+import socket
+import threading
+import time
 import urllib3
+import uuid
+import vobject
 import warnings
-from datetime import datetime, timedelta
-from config import CALDAV_URL, CALDAV_USERNAME, CALDAV_PASSWORD
+from caldav.elements import dav
+from caldav.elements.base import ValuedBaseElement
+from caldav.lib import error as caldav_error
+from caldav.lib import vcal
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, time as dt_time, timedelta, timezone
+from dateutil.rrule import rrulestr
+from icalendar import vRecur
+from requests.adapters import HTTPAdapter
+from typing import Iterable
+from urllib.parse import quote, urlsplit
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPSConnectionPool
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from config import (
+    CALDAV_URL, CALDAV_USERNAME, CALDAV_PASSWORD, CALDAV_MAX_WORKERS, CALDAV_TIMEOUT,
+    CALDAV_DISCOVERY_CACHE, CALDAV_RECONNECT_MIN_DELAY, CALDAV_RECONNECT_MAX_DELAY,
+    CALDAV_ACCOUNT_CONCURRENCY, CALDAV_POOL_SIZE, CALDAV_POOL_IDLE_TTL, CALDAV_RATE_LIMIT, CALDAV_CHAT_RATE_LIMIT,
+    CALDAV_VERIFY_WRITES, CALDAV_VERIFY_SSL, CALDAV_ALLOWED_HOSTS, CALDAV_BATCH_CONCURRENCY,
+    EVENT_CACHE_TTL, EVENT_CACHE_MAX_WINDOWS, EVENT_CACHE_MAX_OBJECTS
+)
+from event_cache import CachedEvent, EventCache, to_naive
+from freebusy import BusyMap
+from ical_parser import NeedsFullParser, parse_freebusy, parse_vevents
+from metrics import Counter, Histogram
+from ratelimit import RateLimiter, SingleFlight, current_chat_id
 
-# Отключение предупреждений о SSL верификации
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Предупреждения о запросах без проверки сертификата отключаются, только если проверка выключена в настройках
+if not CALDAV_VERIFY_SSL:
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Отключение предупреждений от библиотеки caldav
 logging.getLogger("caldav").setLevel(logging.ERROR)
 
+# Общий пул потоков для блокирующих вызовов caldav
+_executor = None
+
+# Общий HTTP адаптер с пулами keep-alive соединений
+_http_adapter = None
+
+# Ограничение частоты HTTP запросов к CalDAV серверам: общее и для каждого чата.
+# Запросы не отклоняются, а ждут токен (ожидание ограничено таймаутом вызова)
+caldav_limiter = RateLimiter(CALDAV_RATE_LIMIT, CALDAV_CHAT_RATE_LIMIT, chat_burst=CALDAV_CHAT_RATE_LIMIT,
+                             max_wait=float("inf"))
+
+# Объединение одновременных одинаковых запросов событий
+event_queries = SingleFlight()
+
+# Операция менеджера календаря, в рамках которой выполняются HTTP запросы
+_operation = ContextVar("caldav_operation", default="other")
+
+# Названия операций для метрик по синхронным методам менеджера
+_OPERATIONS = {
+    '_discover': "discovery",
+    '_list_calendars': "discovery",
+    '_put_event': "save",
+    '_fetch_events_cached': "search",
+    '_busy_map': "freebusy",
+}
+
+CALDAV_REQUEST_SECONDS = Histogram(
+    "caldav_request_seconds", "Длительность HTTP запросов к CalDAV серверу", labels=("operation", "method")
+)
+CALDAV_OPERATION_SECONDS = Histogram(
+    "caldav_operation_seconds", "Длительность операций календаря, включая ожидание пула и кеш",
+    labels=("operation",)
+)
+CALDAV_ERRORS = Counter("caldav_errors_total", "Ошибки и таймауты операций календаря", labels=("operation",))
+ICAL_PARSE_SECONDS = Histogram(
+    "ical_parse_seconds", "Длительность разбора iCalendar данных", labels=("source",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+ICAL_FULL_PARSES = Counter(
+    "ical_full_parse_total", "Объекты, разобранные полным парсером vobject вместо быстрого", labels=("source",)
+)
+EVENT_CACHE_REQUESTS = Counter(
+    "event_cache_requests_total", "Запросы событий к кешу по результату (hit, miss)", labels=("result",)
+)
+
+# Блокировка файла с результатами обнаружения календарей
+_discovery_lock = threading.Lock()
+
+def local_zone():
+    """
+    Часовой пояс бота, в котором записываются повторяющиеся события
+
+    Имя пояса берется из переменной TZ или ссылки /etc/localtime. Если определить
+    его не удалось, используется пояс Etc/GMT с текущим смещением (без перехода на летнее время).
+    """
+    name = os.environ.get("TZ")
+    if name is None:
+        name = os.path.realpath("/etc/localtime")
+    try:
+        return ZoneInfo(name.lstrip(":").split("/zoneinfo/")[-1])
+    except (ZoneInfoNotFoundError, ValueError, OSError):
+        pass
+    offset = datetime.now().astimezone().utcoffset()
+    if offset % timedelta(hours=1):
+        return timezone.utc
+    return ZoneInfo(f"Etc/GMT{-(offset // timedelta(hours=1)):+d}")
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Получение общего пула потоков для операций CalDAV
+
+    Размер пула ограничен CALDAV_MAX_WORKERS, поэтому одновременно
+    выполняется не больше этого числа запросов к серверу,
+    остальные ждут своей очереди, не блокируя цикл событий.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CALDAV_MAX_WORKERS, thread_name_prefix="caldav")
+    return _executor
+
+
+class GetCTag(ValuedBaseElement):
+    """Свойство getctag (расширение calendarserver.org), меняется при любом изменении календаря"""
+    tag = "{http://calendarserver.org/ns/}getctag"
+
+
+@dataclass
+class AddEventResult:
+    """
+    Результат добавления события
+
+    :param success: Сервер принял событие
+    :param uid: UID события
+    :param href: URL созданного объекта
+    :param etag: ETag созданного объекта, если сервер его сообщил
+    :param confirmed: Запись подтверждена ETag или повторным чтением объекта
+    :param error: Описание ошибки
+    :param status: HTTP статус ответа сервера (None - ответ не получен)
+    """
+    success: bool
+    uid: str = None
+    href: str = None
+    etag: str = None
+    confirmed: bool = False
+    error: str = None
+    status: int = None
+
+    def __bool__(self) -> bool:
+        return self.success
+
+
+# Максимальное число объектов в одном запросе calendar-multiget
+MULTIGET_BATCH_SIZE = 200
+
+
+@ICAL_PARSE_SECONDS.time("caldav")
+def parse_calendar_object(obj) -> list:
+    """
+    Разбор VEVENT компонентов объекта календаря
+
+    Обычные события извлекаются быстрым разбором текста объекта (ical_parser),
+    повторяющиеся и нестандартные - полным разбором через vobject.
+
+    :param obj: Объект календаря caldav с загруженными данными
+    :return: Список CachedEvent; у повторяющихся событий сохраняется набор правил повторения
+    """
+    data = obj.data
+    if data:
+        try:
+            records = parse_vevents(data)
+        except ValueError:
+            pass
+        else:
+            return [CachedEvent({
+                'summary': record.summary,
+                'start': record.start,
+                'end': record.end or (record.start + record.duration if record.duration else record.start)
+            }) for record in records if record.summary is not None]
+
+    ICAL_FULL_PARSES.inc("caldav")
+    return _parse_calendar_object_full(obj)
+
+
+def _known_zone(value):
+    if not isinstance(value, datetime) or value.tzinfo is None or isinstance(value.tzinfo, (ZoneInfo, timezone)):
+        return value
+    try:
+        return value.replace(tzinfo=ZoneInfo(vobject.icalendar.TimezoneComponent.pickTzid(value.tzinfo)))
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return value
+
+
+def _use_known_zones(vevent):
+    """
+    Замена поясов из VTIMEZONE на пояса zoneinfo с тем же TZID
+
+    dateutil неверно разбирает VTIMEZONE со списками RDATE (так их формирует icalendar),
+    из-за чего экземпляры серии после перехода на летнее время сдвигаются на час.
+    """
+    for name in ('dtstart', 'dtend', 'recurrence-id', 'rdate', 'exdate'):
+        for prop in vevent.contents.get(name, []):
+            if isinstance(prop.value, list):
+                prop.value = [_known_zone(value) for value in prop.value]
+            else:
+                prop.value = _known_zone(prop.value)
+
+
+def _parse_calendar_object_full(obj) -> list:
+    """Разбор объекта календаря через дерево компонентов vobject, включая правила повторения"""
+    vevents = obj.vobject_instance.contents.get('vevent', [])
+    # Измененные экземпляры повторяющегося события исключаются из основной серии
+    overridden = [vevent.recurrence_id.value for vevent in vevents if hasattr(vevent, 'recurrence_id')]
+
+    result = []
+    for vevent in vevents:
+        if not hasattr(vevent, 'summary'):
+            continue
+        _use_known_zones(vevent)
+        start = vevent.dtstart.value
+        if hasattr(vevent, 'dtend'):
+            end = vevent.dtend.value
+        elif hasattr(vevent, 'duration'):
+            end = start + vevent.duration.value
+        else:
+            end = start
+
+        rruleset = None
+        if not hasattr(vevent, 'recurrence_id') and (hasattr(vevent, 'rrule') or hasattr(vevent, 'rdate')):
+            rruleset = vevent.getrruleset(addRDate=True)
+            for value in overridden:
+                rruleset.exdate(value)
+
+        result.append(CachedEvent({
+            'summary': vevent.summary.value,
+            'start': start,
+            'end': end
+        }, rruleset))
+    return result
+
+
+@ICAL_PARSE_SECONDS.time("ics")
+def parse_ics(data: str) -> list:
+    """
+    Извлечение событий из iCalendar файла для массового добавления
+
+    События на весь день (DTSTART;VALUE=DATE) сохраняют даты без времени, у повторяющихся событий
+    сохраняются RRULE и EXDATE. Измененные экземпляры серии (RECURRENCE-ID) добавляются
+    отдельными событиями и исключаются из серии.
+
+    :param data: Содержимое .ics файла
+    :return: Кортежи для add_events: (название, начало, окончание) или
+             (название, начало, окончание, None, RRULE, EXDATE); окончание может быть None
+    """
+    try:
+        records = parse_vevents(data)
+    except ValueError:
+        ICAL_FULL_PARSES.inc("ics")
+    else:
+        result = []
+        for record in records:
+            if record.summary is None:
+                continue
+            end = record.end
+            if end is None and record.duration is not None:
+                end = record.start + record.duration
+            result.append((record.summary, record.start, end))
+        return result
+
+    result = []
+    for component in vobject.readComponents(data):
+        vevents = [vevent for vevent in component.contents.get('vevent', [])
+                   if hasattr(vevent, 'summary') and hasattr(vevent, 'dtstart')]
+        overridden = {}
+        for vevent in vevents:
+            _use_known_zones(vevent)
+            if hasattr(vevent, 'recurrence_id') and hasattr(vevent, 'uid'):
+                overridden.setdefault(vevent.uid.value, []).append(vevent.recurrence_id.value)
+
+        for vevent in vevents:
+            start = vevent.dtstart.value
+            end = None
+            if hasattr(vevent, 'dtend'):
+                end = vevent.dtend.value
+            elif hasattr(vevent, 'duration'):
+                end = start + vevent.duration.value
+            if not hasattr(vevent, 'rrule') or hasattr(vevent, 'recurrence_id'):
+                result.append((vevent.summary.value, start, end))
+                continue
+            exdates = [value for prop in vevent.contents.get('exdate', []) for value in prop.value]
+            exdates += overridden.get(vevent.uid.value if hasattr(vevent, 'uid') else None, [])
+            result.append((vevent.summary.value, start, end, None, vevent.rrule.value, exdates))
+    return result
+
+
+def shutdown_executor() -> None:
+    """Остановка пула потоков CalDAV с отменой ожидающих запросов и закрытие HTTP соединений"""
+    global _executor, _http_adapter
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _http_adapter is not None:
+        _http_adapter.close()
+        _http_adapter = None
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTP адаптер, ограничивающий частоту запросов через caldav_limiter и замеряющий их длительность"""
+
+    def send(self, request, *args, **kwargs):
+        caldav_limiter.acquire_sync(current_chat_id.get())
+        with CALDAV_REQUEST_SECONDS.time(_operation.get(), request.method):
+            return super().send(request, *args, **kwargs)
+
+
+def _is_public_address(address: str) -> bool:
+    """Адрес доступен из интернета (не частный, не локальный, не служебный и не групповой)"""
+    address = ipaddress.ip_address(address.split("%")[0])
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+class ForbiddenRequestError(requests.exceptions.ConnectionError):
+    """Запрос к серверу пользователя нарушает ограничения RestrictedAdapter"""
+
+
+class _PublicHTTPSConnection(HTTPSConnection):
+    """HTTPS соединение, которое закрывается, если сервер оказался не на публичном адресе"""
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        address = sock.getpeername()[0]
+        if not _is_public_address(address):
+            sock.close()
+            raise urllib3.exceptions.NewConnectionError(self, f"Адрес {address} не публичный, подключение запрещено")
+        return sock
+
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class RestrictedAdapter(RateLimitedAdapter):
+    """
+    HTTP адаптер учетной записи, подключенной пользователем командой /connect
+
+    Разрешены только HTTPS запросы к хосту, проверенному check_server_url: адреса
+    из ответов PROPFIND, указывающие на другие хосты, и перенаправления отклоняются.
+    Без списка CALDAV_ALLOWED_HOSTS каждое новое соединение проверяется по фактическому
+    адресу сервера, поэтому смена DNS записи после проверки не открывает доступ к локальной сети.
+    """
+
+    def __init__(self, host: str, check_address: bool = True):
+        """
+        :param host: Единственный разрешенный хост
+        :param check_address: Проверять, что сервер находится на публичном адресе
+        """
+        self.host = host.lower()
+        self.check_address = check_address
+        super().__init__(pool_connections=1, pool_maxsize=CALDAV_ACCOUNT_CONCURRENCY)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        if self.check_address:
+            self.poolmanager.pool_classes_by_scheme = {
+                **self.poolmanager.pool_classes_by_scheme, "https": _PublicHTTPSConnectionPool
+            }
+
+    def send(self, request, *args, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.scheme != "https" or (parts.hostname or "").lower() != self.host:
+            raise ForbiddenRequestError(f"Запрос к {parts.scheme}://{parts.hostname} запрещен", request=request)
+        response = super().send(request, *args, **kwargs)
+        if response.is_redirect:
+            response.close()
+            raise ForbiddenRequestError(f"Перенаправление на {response.headers.get('Location')} запрещено",
+                                        request=request)
+        return response
+
+
+def get_http_adapter() -> HTTPAdapter:
+    """
+    Получение общего HTTP адаптера для всех CalDAV клиентов
+
+    Адаптер хранит пулы keep-alive соединений по хостам, поэтому соединения
+    переиспользуются между запросами и клиентами. Размер пула на хост совпадает
+    с размером пула потоков, чтобы параллельные запросы не открывали лишних соединений.
+    Каждый запрос проходит через ограничитель частоты caldav_limiter.
+    """
+    global _http_adapter
+    if _http_adapter is None:
+        _http_adapter = RateLimitedAdapter(pool_connections=16, pool_maxsize=CALDAV_MAX_WORKERS)
+    return _http_adapter
+
+
+async def check_server_url(url: str, allowed_hosts: list = CALDAV_ALLOWED_HOSTS) -> None:
+    """
+    Проверка адреса CalDAV сервера, который пользователь подключает командой /connect
+
+    Допускаются только HTTPS адреса. Если задан список разрешенных серверов, хост должен быть в нем,
+    иначе все адреса, в которые разрешается имя хоста, должны быть публичными: бот не должен
+    обращаться по запросу пользователя к локальным, частным и служебным адресам своей сети.
+
+    :param url: Адрес сервера
+    :param allowed_hosts: Разрешенные хосты (по умолчанию CALDAV_ALLOWED_HOSTS из config.py)
+    :raises ValueError: Адрес не допускается; текст исключения предназначен для пользователя
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port or 443
+    except ValueError:
+        raise ValueError("Некорректный адрес сервера.")
+    if parts.scheme.lower() != "https" or not parts.hostname:
+        raise ValueError("Адрес сервера должен начинаться с https://")
+
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise ValueError("Этот сервер нельзя подключить. Обратитесь к администратору бота.")
+        return
+
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError("Не удалось найти сервер по указанному адресу.")
+    for *_, sockaddr in addresses:
+        if not _is_public_address(sockaddr[0]):
+            raise ValueError("Сервер находится в локальной или служебной сети, его нельзя подключить.")
+
+
+def load_discovery(key: str):
+    """
+    Получение сохраненных результатов обнаружения календаря
+
+    :param key: Ключ учетной записи (пользователь@URL)
+    :return: Словарь с URL principal и календаря или None
+    """
+    if not CALDAV_DISCOVERY_CACHE:
+        return None
+    with _discovery_lock:
+        try:
+            with open(CALDAV_DISCOVERY_CACHE, encoding="utf-8") as f:
+                return json.load(f).get(key)
+        except (OSError, ValueError):
+            return None
+
+
+def _update_discovery(key: str, value) -> None:
+    if not CALDAV_DISCOVERY_CACHE:
+        return
+    with _discovery_lock:
+        try:
+            with open(CALDAV_DISCOVERY_CACHE, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if value is None:
+            data.pop(key, None)
+        else:
+            data[key] = value
+        # Запись через временный файл, чтобы не повредить кеш при сбое
+        tmp_path = f"{CALDAV_DISCOVERY_CACHE}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, CALDAV_DISCOVERY_CACHE)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить кеш обнаружения CalDAV: {e}")
+
+
+def save_discovery(key: str, value: dict) -> None:
+    """Сохранение результатов обнаружения календаря на диск"""
+    _update_discovery(key, value)
+
+
+def forget_discovery(key: str) -> None:
+    """Удаление устаревших результатов обнаружения календаря"""
+    _update_discovery(key, None)
+
+
+@dataclass
+class _SyncCall:
+    """
+    Идущая синхронизация кеша, результат которой ждут другие потоки
+
+    :param done: Событие завершения синхронизации
+    :param result: Результат синхронизации
+    :param error: Исключение, с которым завершилась синхронизация
+    """
+    done: threading.Event = field(default_factory=threading.Event)
+    result: bool = None
+    error: BaseException = None
+
 class CalendarManager:
-    def __init__(self):
-        """Инициализация подключения к CalDAV серверу"""
+    def __init__(self, url: str = CALDAV_URL, username: str = CALDAV_USERNAME,
+                 password: str = CALDAV_PASSWORD, calendar_url: str = None,
+                 timeout: float = CALDAV_TIMEOUT, restricted: bool = False):
+        """
+        Создание менеджера календаря
+
+        Сетевых запросов здесь не выполняется: обнаружение календаря
+        происходит асинхронно в connect (или в фоне после start).
+
+        :param url: URL CalDAV сервера
+        :param username: Имя пользователя
+        :param password: Пароль
+        :param calendar_url: URL выбранного календаря (по умолчанию первый календарь пользователя)
+        :param timeout: Таймаут одного запроса к серверу в секундах
+        :param restricted: Сервер указан пользователем: запросы идут через RestrictedAdapter
+        """
+        self.url = url
+        self.username = username
+        self.password = password
+        self.calendar_url = calendar_url
+        self.restricted = restricted
+        self._adapter = None
         self.client = None
         self.principal = None
         self.calendar = None
         self.connected = False
+        self.timeout = timeout
+        self.cache = EventCache(
+            ttl=EVENT_CACHE_TTL,
+            max_windows=EVENT_CACHE_MAX_WINDOWS,
+            max_objects=EVENT_CACHE_MAX_OBJECTS
+        )
+        # Поддержка free-busy-query: None - не проверялась, True - работает, False - недоступна
+        self.freebusy_supported = None
+        self._sync_lock = threading.Lock()
+        self._sync_call = None
+        self._connect_task = None
+        # Ограничение одновременных запросов одной учетной записи, чтобы медленный
+        # сервер одного пользователя не занимал весь пул потоков: не больше четверти пула
+        self._slots = asyncio.Semaphore(max(1, min(CALDAV_ACCOUNT_CONCURRENCY, CALDAV_MAX_WORKERS // 4)))
 
         try:
-            # Заголовки для CalDAV серверов
+            self.client = self._build_client()
+        except Exception as e:
+            logging.error(f"Ошибка при создании CalDAV клиента: {e}")
+
+    def _build_client(self) -> caldav.DAVClient:
+        """Создание CalDAV клиента с учетом типа сервера"""
+        # Заголовки для CalDAV серверов
+        headers = {
+            "User-Agent": "CalendarBot/1.0",
+            "Content-Type": "application/xml; charset=utf-8",
+            "Accept": "application/xml",
+            "Depth": "1"
+        }
+
+        logging.info(f"Подключение к CalDAV серверу: {self.url}")
+
+        # Определяем тип сервера и корректируем URL
+        caldav_url = self.url
+        if "googleapis.com" in caldav_url:
+            # Для Google Calendar
+            if not caldav_url.endswith("/events"):
+                if caldav_url.endswith("/user"):
+                    caldav_url = caldav_url.replace("/user", "/events")
+                elif not caldav_url.endswith("/events"):
+                    caldav_url = caldav_url + "/events"
+        elif "calendar.yandex.ru" in caldav_url:
+            # Для Yandex Calendar
+            # Yandex использует специфический формат URL для CalDAV
+            caldav_url = f"https://caldav.yandex.ru/calendars/{self.username}/"
+            logging.info(f"Переопределен URL для Yandex Calendar: {caldav_url}")
             headers = {
-                "User-Agent": "CalendarBot/1.0",
                 "Content-Type": "application/xml; charset=utf-8",
                 "Accept": "application/xml",
-                "Depth": "1"
+                "Depth": "1",
+                "User-Agent": "Mozilla/5.0 CalendarBot/1.0"
             }
 
-            logging.info(f"Подключение к CalDAV серверу: {CALDAV_URL}")
-
-            # Определяем тип сервера и корректируем URL
-            caldav_url = CALDAV_URL
-            if "googleapis.com" in caldav_url:
-                # Для Google Calendar
-                if not caldav_url.endswith("/events"):
-                    if caldav_url.endswith("/user"):
-                        caldav_url = caldav_url.replace("/user", "/events")
-                    elif not caldav_url.endswith("/events"):
-                        caldav_url = caldav_url + "/events"
-            elif "calendar.yandex.ru" in caldav_url:
-                # Для Yandex Calendar
-                # Yandex использует специфический формат URL для CalDAV
-                caldav_url = f"https://caldav.yandex.ru/calendars/{CALDAV_USERNAME}/"
-                logging.info(f"Переопределен URL для Yandex Calendar: {caldav_url}")
-                headers = {
-                    "Content-Type": "application/xml; charset=utf-8",
-                    "Accept": "application/xml",
-                    "Depth": "1",
-                    "User-Agent": "Mozilla/5.0 CalendarBot/1.0"
-                }
-
-            logging.info(f"Используемый URL CalDAV: {caldav_url}")
-
-            # Создаем клиент с учетом типа сервера
-            if "calendar.yandex.ru" in caldav_url:
-                # Для Yandex Calendar
-                self.client = caldav.DAVClient(
-                    url=caldav_url,
-                    username=CALDAV_USERNAME,
-                    password=CALDAV_PASSWORD,
-                    ssl_verify_cert=False,
-                    headers=headers
-                )
-            else:
-                # Для других серверов
-                self.client = caldav.DAVClient(
-                    url=caldav_url,
-                    username=CALDAV_USERNAME,
-                    password=CALDAV_PASSWORD,
-                    ssl_verify_cert=False,  # В продакшене этот параметр следует установить в True
-                    headers=headers
-                )
-
-            # Пробуем получить информацию о пользователе
-            self.principal = self.client.principal()
-            logging.info(f"Получен principal: {self.principal}")
-
-            # Получаем доступные календари
-            calendars = self.principal.calendars()
-            logging.info(f"Найдено календарей: {len(calendars)}")
-
-            if calendars:
-                # Получаем первый доступный календарь пользователя
-                self.calendar = calendars[0]
+        logging.info(f"Используемый URL CalDAV: {caldav_url}")
+
+        client = caldav.DAVClient(
+            url=caldav_url,
+            username=self.username,
+            password=self.password,
+            ssl_verify_cert=CALDAV_VERIFY_SSL,
+            headers=headers,
+            timeout=self.timeout
+        )
+
+        if self.restricted:
+            # Сервер пользователя: отдельный адаптер, ограниченный проверенным хостом
+            if not isinstance(client.session, requests.Session):
+                raise RuntimeError("Ограничение запросов к серверам пользователей требует caldav 1.x (requests)")
+            self._adapter = RestrictedAdapter(urlsplit(caldav_url).hostname or "",
+                                              check_address=not CALDAV_ALLOWED_HOSTS)
+            client.session.mount("http://", self._adapter)
+            client.session.mount("https://", self._adapter)
+        # Общий пул keep-alive соединений для всех клиентов. Адаптер написан для requests:
+        # caldav 2.x и новее используют сессии niquests, с ними адаптер не подключается
+        elif isinstance(client.session, requests.Session):
+            adapter = get_http_adapter()
+            client.session.mount("http://", adapter)
+            client.session.mount("https://", adapter)
+        return client
+
+    @property
+    def _discovery_key(self) -> str:
+        return f"{self.username}@{self.url}"
+
+    def _discover(self) -> None:
+        """
+        Синхронное обнаружение календаря
+
+        Если URL календаря выбран пользователем или сохранен в кеше обнаружения,
+        он проверяется одним PROPFIND вместо полного поиска principal и списка календарей.
+        """
+        if self.calendar_url:
+            self.calendar = self.client.calendar(url=self.calendar_url)
+            self.calendar.get_property(dav.DisplayName())
+            self.connected = True
+            logging.info(f"Используется выбранный календарь: {self.calendar}")
+            return
+
+        cached = load_discovery(self._discovery_key)
+        if cached:
+            calendar = self.client.calendar(url=cached['calendar'])
+            try:
+                calendar.get_property(dav.DisplayName())
+                self.calendar = calendar
                 self.connected = True
-                logging.info(f"Выбран календарь: {self.calendar}")
-                logging.info("Подключение к CalDAV успешно установлено")
-            else:
-                logging.error("Нет доступных календарей")
+                logging.info(f"Календарь взят из кеша обнаружения: {self.calendar}")
+                return
+            except caldav_error.DAVError as e:
+                logging.warning(f"Сохраненный URL календаря недействителен, повторное обнаружение: {e}")
+                forget_discovery(self._discovery_key)
+
+        # Пробуем получить информацию о пользователе
+        self.principal = self.client.principal()
+        logging.info(f"Получен principal: {self.principal}")
+
+        # Получаем доступные календари
+        calendars = self.principal.calendars()
+        logging.info(f"Найдено календарей: {len(calendars)}")
+
+        if not calendars:
+            raise caldav_error.NotFoundError("Нет доступных календарей")
+
+        # Получаем первый доступный календарь пользователя
+        self.calendar = calendars[0]
+        self.connected = True
+        save_discovery(self._discovery_key, {
+            'principal': str(self.principal.url),
+            'calendar': str(self.calendar.url)
+        })
+        logging.info(f"Выбран календарь: {self.calendar}")
+
+    async def connect(self) -> bool:
+        """
+        Подключение к CalDAV серверу
+
+        :return: True если календарь доступен
+        """
+        if self.connected:
+            return True
+        if not self.client:
+            return False
+        try:
+            await self._run(self._discover)
+            logging.info("Подключение к CalDAV успешно установлено")
         except Exception as e:
             logging.error(f"Ошибка при подключении к CalDAV серверу: {e}")
-            # Не вызываем raise, чтобы бот продолжал работать
+        return self.connected
+
+    def start(self) -> None:
+        """Запуск фонового подключения к серверу, если оно еще не установлено и не идет"""
+        if self.connected or (self._connect_task and not self._connect_task.done()):
+            return
+        self._connect_task = asyncio.create_task(self._connect_loop())
+
+    async def _connect_loop(self) -> None:
+        """Повторные попытки подключения с экспоненциально растущей паузой"""
+        delay = CALDAV_RECONNECT_MIN_DELAY
+        while not await self.connect():
+            # Небольшой случайный разброс, чтобы клиенты не переподключались одновременно
+            pause = delay * random.uniform(0.9, 1.1)
+            logging.warning(f"Повторное подключение к CalDAV через {pause:.1f} с")
+            await asyncio.sleep(pause)
+            delay = min(delay * 2, CALDAV_RECONNECT_MAX_DELAY)
+
+    async def ensure_connected(self, timeout: float = None) -> bool:
+        """
+        Ожидание подключения к серверу
 
-    async def add_event(self, summary: str, start_time: datetime, end_time: datetime = None) -> bool:
+        :param timeout: Сколько секунд ждать, если подключение еще идет
+        :return: True если календарь доступен
+        """
+        if self.connected:
+            return True
+        self.start()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._connect_task), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.connected
+
+    def _connection_lost(self, error: Exception) -> None:
+        """Пометка соединения как потерянного и запуск фонового переподключения"""
+        if not self.connected:
+            return
+        logging.error(f"Потеряно соединение с CalDAV сервером: {error}")
+        self.connected = False
+        self.start()
+
+    def _list_calendars(self) -> list:
+        """Синхронное получение списка календарей учетной записи"""
+        if self.principal is None:
+            cached = load_discovery(self._discovery_key)
+            if cached and cached.get('principal'):
+                self.principal = self.client.principal(url=cached['principal'])
+            else:
+                self.principal = self.client.principal()
+        return [(str(calendar.name or calendar.url), str(calendar.url)) for calendar in self.principal.calendars()]
+
+    async def list_calendars(self) -> list:
+        """
+        Получение списка календарей учетной записи
+
+        :return: Список кортежей (название, URL)
+        """
+        try:
+            return await self._run(self._list_calendars)
+        except Exception as e:
+            logging.error(f"Ошибка при получении списка календарей: {e}")
+            return []
+
+    async def close(self) -> None:
+        """Остановка фонового подключения и закрытие собственных соединений учетной записи"""
+        if self._connect_task and not self._connect_task.done():
+            self._connect_task.cancel()
+            try:
+                await self._connect_task
+            except asyncio.CancelledError:
+                pass
+        if self._adapter is not None:
+            self._adapter.close()
+
+    async def _run(self, func, *args, timeout: float = None, **kwargs):
+        """
+        Выполнение блокирующего вызова в пуле потоков CalDAV
+
+        При превышении таймаута или отмене задачи ожидание прекращается,
+        а еще не начатый вызов снимается с очереди пула.
+        Вызов выполняется в копии текущего контекста, чтобы ограничитель
+        частоты запросов знал, для какого чата он выполняется.
+
+        :param func: Синхронная функция
+        :param timeout: Таймаут в секундах (по умолчанию таймаут менеджера)
+        :return: Результат функции
+        """
+        loop = asyncio.get_running_loop()
+        operation = _OPERATIONS.get(func.__name__, func.__name__.lstrip("_"))
+        context = contextvars.copy_context()
+        context.run(_operation.set, operation)
+        call = functools.partial(context.run, func, *args, **kwargs)
+
+        def release(_):
+            try:
+                loop.call_soon_threadsafe(self._slots.release)
+            except RuntimeError:
+                # Цикл событий уже закрыт
+                pass
+
+        async def call_with_slot():
+            # Слот освобождается, когда поток действительно завершил вызов, а не по таймауту ожидания:
+            # иначе зависший сервер одной учетной записи постепенно занял бы весь пул потоков
+            await self._slots.acquire()
+            try:
+                future = get_executor().submit(call)
+            except BaseException:
+                self._slots.release()
+                raise
+            future.add_done_callback(release)
+            return await asyncio.wrap_future(future)
+
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(call_with_slot(), timeout=timeout or self.timeout)
+        except requests.exceptions.ConnectionError as e:
+            CALDAV_ERRORS.inc(operation)
+            self._connection_lost(e)
+            raise
+        except Exception:
+            CALDAV_ERRORS.inc(operation)
+            raise
+        finally:
+            CALDAV_OPERATION_SECONDS.observe(time.perf_counter() - started, operation)
+
+    def _put_event(self, summary: str, start_time: datetime, end_time: datetime,
+                   uid: str = None, rrule: str = None, exdates: Iterable = ()) -> AddEventResult:
+        """
+        Синхронное создание события одним PUT запросом
+
+        Успешный статус и ETag в ответе считаются подтверждением записи.
+        Если сервер не вернул ETag (например, изменил данные при сохранении),
+        выполняется один GET созданного объекта, если это разрешено CALDAV_VERIFY_WRITES.
+
+        Объект создается по URL из UID с If-None-Match: *, поэтому повторная отправка
+        события с тем же UID (например, если ответ на первую попытку потерялся)
+        получает 412 и не создает дубликат; такой ответ считается успешным.
+        """
+        retry = uid is not None
+        uid = uid or str(uuid.uuid4())
+        exdates = list(exdates) if rrule else []
+        if not isinstance(start_time, datetime):
+            # Событие на весь день записывается датами без времени (VALUE=DATE)
+            pass
+        elif rrule:
+            # Повторяющееся событие записывается по местному времени с TZID и описанием пояса:
+            # в UTC его экземпляры сдвигались бы на час после перехода на летнее время.
+            # Время с поясом zoneinfo (например, из .ics файла) остается в своем поясе
+            zone = start_time.tzinfo if isinstance(start_time.tzinfo, (ZoneInfo, timezone)) else local_zone()
+            start_time, end_time = start_time.astimezone(zone), end_time.astimezone(zone)
+            exdates = [value.astimezone(zone) for value in exdates if isinstance(value, datetime)]
+        else:
+            start_time, end_time = start_time.astimezone(timezone.utc), end_time.astimezone(timezone.utc)
+        ical = vcal.create_ical(objtype="VEVENT", uid=uid, dtstart=start_time, dtend=end_time, summary=summary,
+                                rrule=vRecur.from_ical(rrule) if rrule else None, exdate=exdates or None)
+        if rrule:
+            calendar = icalendar.Calendar.from_ical(ical)
+            calendar.add_missing_timezones()
+            ical = calendar.to_ical().decode("utf-8")
+        url = self.calendar.url.join(quote(uid.replace("/", "%2F")) + ".ics")
+
+        response = self.client.put(url, ical, {
+            "Content-Type": 'text/calendar; charset="utf-8"',
+            "If-None-Match": "*"
+        })
+        if response.status == 412 and retry:
+            etag = None
+            confirmed = True
+        elif response.status not in (201, 204):
+            return AddEventResult(False, uid=uid, error=f"{response.status} {response.reason}",
+                                  status=response.status)
+        else:
+            etag = response.headers.get("ETag")
+            confirmed = etag is not None or CALDAV_VERIFY_WRITES
+
+        if etag is None and CALDAV_VERIFY_WRITES:
+            check = self.client.request(str(url), "GET")
+            if check.status != 200:
+                return AddEventResult(False, uid=uid, href=str(url),
+                                      error=f"Событие не найдено после сохранения: {check.status}",
+                                      status=check.status)
+            etag = check.headers.get("ETag")
+
+        # Добавляем событие в кеш, чтобы не перечитывать календарь
+        rruleset = None
+        if rrule:
+            rruleset = rrulestr(rrule, dtstart=start_time, forceset=True)
+            for value in exdates:
+                rruleset.exdate(value if isinstance(value, datetime) else datetime.combine(value, dt_time()))
+        self.cache.add_object(str(url.canonical()), etag, [CachedEvent({
+            'summary': summary,
+            'start': start_time,
+            'end': end_time
+        }, rruleset)])
+        return AddEventResult(True, uid=uid, href=str(url), etag=etag, confirmed=confirmed,
+                              status=response.status)
+
+    def _fetch_events(self, start_date: datetime, end_date: datetime) -> list:
+        """Синхронный запрос событий за период (REPORT calendar-query) и разбор ответа"""
+        events = self.calendar.date_search(start=start_date, end=end_date)
+
+        result = []
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        start, end = to_naive(start_date), to_naive(end_date)
+        for event in events:
+            for cached in parse_calendar_object(event):
+                # Сервер может вернуть основное событие серии без развертывания экземпляров
+                occurrences = cached.occurrences(start, end)
+                result.extend(occurrences)
+                if debug:
+                    for occurrence in occurrences:
+                        logging.debug("Найдено событие: %s на %s", occurrence['summary'], occurrence['start'])
+
+        result.sort(key=lambda e: to_naive(e['start']))
+        return result
+
+    def _sync_cache(self) -> bool:
+        """
+        Синхронизация полной копии календаря через sync-collection (RFC 6578)
+
+        Загружаются только объекты, у которых изменился ETag.
+
+        :return: True если календарь не изменился с прошлой синхронизации
+        """
+        token = self.cache.sync_token
+        try:
+            collection = self.calendar.objects_by_sync_token(sync_token=token, load_objects=False)
+        except caldav_error.DAVError:
+            if token is None:
+                raise
+            # Сервер не принял устаревший токен - выполняем полную синхронизацию
+            logging.info("Токен синхронизации устарел, выполняется полная синхронизация")
+            token = None
+            collection = self.calendar.objects_by_sync_token(load_objects=False)
+
+        known = self.cache.etags() if token else {}
+        etags = {}
+        deleted = []
+        for obj in collection:
+            href = str(obj.url.canonical())
+            etag = obj.props.get(dav.GetEtag.tag)
+            if etag is None:
+                deleted.append(href)
+            elif known.get(href) != etag:
+                etags[href] = (obj.url, etag)
+
+        if token and not etags and not deleted:
+            self.cache.touch()
+            return True
+
+        updated = {}
+        urls = [url for url, _ in etags.values()]
+        for i in range(0, len(urls), MULTIGET_BATCH_SIZE):
+            for obj in self.calendar.calendar_multiget(urls[i:i + MULTIGET_BATCH_SIZE]):
+                href = str(obj.url.canonical())
+                if obj.data is None:
+                    deleted.append(href)
+                    continue
+                updated[href] = (etags[href][1], parse_calendar_object(obj))
+
+        if not self.cache.apply_sync(collection.sync_token, updated, deleted, full=token is None):
+            logging.warning("Календарь слишком велик для полной копии в памяти, кешируются только периоды")
+        return False
+
+    def _sync_once(self) -> bool:
+        """
+        Синхронизация кеша, объединяющая одновременные вызовы из разных потоков
+
+        Если синхронизация уже идет, поток дожидается ее завершения
+        и использует полученный результат (или исключение) вместо повторного запроса.
+        Если она не завершилась за таймаут менеджера, возвращается False.
+        """
+        with self._sync_lock:
+            call = self._sync_call
+            leader = call is None
+            if leader:
+                call = self._sync_call = _SyncCall()
+        if not leader:
+            if not call.done.wait(self.timeout):
+                return False
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._sync_cache()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._sync_lock:
+                self._sync_call = None
+            call.done.set()
+
+    def _get_ctag(self):
+        """Получение ctag календаря (None, если сервер его не поддерживает)"""
+        try:
+            return self.calendar.get_property(GetCTag())
+        except caldav_error.DAVError:
+            return None
+
+    def _use_full_copy(self) -> bool:
+        """
+        Актуализация полной копии календаря, если сервер поддерживает sync-collection
+
+        :return: True если запросы можно отвечать из полной копии
+        """
+        cache = self.cache
+        if cache.sync_supported is False:
+            return False
+        try:
+            unchanged = cache.is_fresh() or self._sync_once()
+        except caldav_error.DAVError as e:
+            if cache.sync_supported:
+                raise
+            logging.info(f"Сервер не поддерживает sync-collection, используется REPORT по периодам: {e}")
+            cache.disable_sync()
+            return False
+        if not cache.sync_supported:
+            return False
+        cache.record(hit=unchanged)
+        EVENT_CACHE_REQUESTS.inc("hit" if unchanged else "miss")
+        return True
+
+    def _free_busy(self, start_date: datetime, end_date: datetime) -> list:
+        """Синхронный запрос занятых периодов (REPORT free-busy-query)"""
+        response = self.calendar.freebusy_request(start_date, end_date)
+        return [(to_naive(start), to_naive(end)) for start, end in parse_freebusy(response.data or "")]
+
+    def _busy_map(self, start_date: datetime, end_date: datetime) -> BusyMap:
+        """
+        Карта занятости периода
+
+        Источники по порядку: полная копия календаря (без запросов к серверу, кроме
+        синхронизации по истечении TTL), free-busy-query, события периода из кеша периодов.
+        """
+        if self._use_full_copy():
+            return self.cache.busy(start_date, end_date)
+
+        if self.freebusy_supported is not False:
+            try:
+                periods = self._free_busy(start_date, end_date)
+                self.freebusy_supported = True
+                return BusyMap.from_intervals(periods)
+            except (caldav_error.DAVError, NeedsFullParser) as e:
+                if self.freebusy_supported:
+                    raise
+                logging.info(f"Сервер не поддерживает free-busy-query, занятость считается по событиям: {e}")
+                self.freebusy_supported = False
+
+        busy = BusyMap()
+        for event in self._fetch_events_cached(start_date, end_date):
+            # События на весь день занятостью не считаются
+            if isinstance(event['start'], datetime):
+                busy.add(to_naive(event['start']), to_naive(event['end']))
+        return busy
+
+    def _fetch_events_cached(self, start_date: datetime, end_date: datetime) -> list:
+        """
+        Получение событий периода через локальный кеш
+
+        Если сервер поддерживает sync-collection, запросы отвечаются из полной копии
+        календаря, которая после истечения TTL дополняется изменениями.
+        Иначе кешируются отдельные периоды, а их актуальность проверяется по ctag;
+        при отсутствии данных выполняется обычный REPORT.
+        """
+        cache = self.cache
+        if self._use_full_copy():
+            return cache.query(start_date, end_date)
+
+        events = cache.get_window(start_date, end_date)
+        ctag = cache.ctag
+        if events is None:
+            ctag = self._get_ctag()
+            if cache.revalidate(ctag):
+                events = cache.get_window(start_date, end_date, ignore_ttl=True)
+
+        cache.record(hit=events is not None)
+        EVENT_CACHE_REQUESTS.inc("hit" if events is not None else "miss")
+        if events is None:
+            events = self._fetch_events(start_date, end_date)
+            cache.put_window(start_date, end_date, events, ctag)
+        return events
+
+    async def add_event(self, summary: str, start_time: datetime, end_time: datetime = None,
+                        uid: str = None, rrule: str = None, exdates: Iterable = ()) -> AddEventResult:
         """
         Добавление события в календарь
 
         :param summary: Название события
-        :param start_time: Время начала события
-        :param end_time: Время окончания события (по умолчанию +1 час от начала)
-        :return: True если событие успешно добавлено
+        :param start_time: Время начала события или дата (date) для события на весь день
+        :param end_time: Время окончания события (по умолчанию +1 час от начала, для события на весь день +1 день)
+        :param uid: UID события; при повторной отправке того же UID дубликат не создается
+        :param rrule: Правило повторения (RRULE) по местному времени, например FREQ=WEEKLY;BYDAY=MO
+        :param exdates: Исключенные из повторения экземпляры (EXDATE)
+        :return: Результат добавления (истинен, если событие успешно добавлено)
         """
         if not self.calendar:
             logging.error("Календарь не инициализирован")
-            return False
+            return AddEventResult(False, error="Календарь не инициализирован")
 
         try:
             if not end_time:
-                end_time = start_time + timedelta(hours=1)
+                end_time = start_time + (timedelta(hours=1) if isinstance(start_time, datetime) else timedelta(days=1))
 
-            logging.info(f"Попытка создания события: {summary} (начало: {start_time}, конец: {end_time})")
+            logging.debug("Попытка создания события: %s (начало: %s, конец: %s)", summary, start_time, end_time)
 
-            event = self.calendar.save_event(
-                dtstart=start_time,
-                dtend=end_time,
-                summary=summary
-            )
+            result = await self._run(self._put_event, summary, start_time, end_time, uid, rrule, exdates)
+            if result:
+                logging.debug("Событие успешно создано: %s (UID %s, ETag %s)", summary, result.uid, result.etag)
+            else:
+                logging.error(f"Сервер не сохранил событие {summary}: {result.error}")
+            return result
 
-            # Проверяем, что событие действительно создалось
-            events = self.calendar.date_search(
-                start=start_time,
-                end=end_time + timedelta(minutes=1)
-            )
+        except asyncio.TimeoutError:
+            logging.error(f"Превышено время ожидания CalDAV при создании события {summary}")
+            return AddEventResult(False, error="Превышено время ожидания")
+        except Exception as e:
+            logging.error(f"Ошибка при создании события {summary}: {str(e)}")
+            return AddEventResult(False, error=str(e))
 
-            for ev in events:
-                if (hasattr(ev.vobject_instance.vevent, 'summary') and 
-                    ev.vobject_instance.vevent.summary.value == summary):
-                    logging.info(f"Событие успешно создано и найдено: {summary}")
-                    return True
+    async def add_events(self, events: Iterable, concurrency: int = CALDAV_BATCH_CONCURRENCY) -> list:
+        """
+        Массовое добавление событий
 
-            logging.error(f"Событие создано, но не найдено при проверке: {summary}")
-            return False
+        Запросы PUT выполняются параллельно через общий HTTP сеанс клиента,
+        но не более concurrency одновременно, чтобы пакет не занимал
+        весь пул потоков CalDAV и не мешал запросам других пользователей.
 
-        except Exception as e:
-            logging.error(f"Ошибка при создании события {summary}: {str(e)}")
-            return False
+        :param events: Кортежи (название, начало[, окончание[, UID[, RRULE[, EXDATE]]]])
+        :param concurrency: Максимальное число одновременных запросов
+        :return: Список AddEventResult в порядке входных событий
+        """
+        items = list(events)
+        results = [None] * len(items)
+        if not self.calendar:
+            logging.error("Календарь не инициализирован")
+            return [AddEventResult(False, error="Календарь не инициализирован") for _ in items]
 
-    async def list_events(self, start_date: datetime = None, end_date: datetime = None) -> list:
+        queue = iter(enumerate(items))
+
+        async def worker():
+            for index, item in queue:
+                summary, start_time, *rest = item
+                results[index] = await self.add_event(summary, start_time, *rest)
+
+        logging.info("Массовое добавление %d событий, параллельно до %d", len(items), concurrency)
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(items))))))
+        return results
+
+    async def list_events(self, start_date: datetime = None, end_date: datetime = None,
+                          raise_errors: bool = False) -> list:
         """
         Получение списка событий за указанный период
 
+        Одновременные запросы одного и того же периода к одному календарю
+        объединяются в один запрос к серверу, результат получают все.
+
         :param start_date: Начальная дата (по умолчанию сегодня)
         :param end_date: Конечная дата (по умолчанию +7 дней)
+        :param raise_errors: Передавать ошибки вызывающему, а не возвращать пустой список
         :return: Список событий
         """
         if not self.calendar:
             logging.error("Календарь не инициализирован")
+            if raise_errors:
+                raise RuntimeError("Календарь не инициализирован")
             return []
 
         try:
@@ -155,21 +1156,134 @@ class CalendarManager:
             if not end_date:
                 end_date = start_date + timedelta(days=7)
 
-            logging.info(f"Запрос событий с {start_date} по {end_date}")
-            events = self.calendar.date_search(start=start_date, end=end_date)
+            logging.debug("Запрос событий с %s по %s", start_date, end_date)
+            return await event_queries.run((self, start_date, end_date),
+                                           lambda: self._run(self._fetch_events_cached, start_date, end_date))
+        except asyncio.TimeoutError:
+            logging.error(f"Превышено время ожидания CalDAV при получении событий с {start_date} по {end_date}")
+            if raise_errors:
+                raise
+            return []
+        except Exception as e:
+            logging.error(f"Ошибка при получении списка событий: {e}")
+            if raise_errors:
+                raise
+            return []
 
-            result = []
-            for event in events:
-                if hasattr(event.vobject_instance.vevent, 'summary'):
-                    event_data = {
-                        'summary': event.vobject_instance.vevent.summary.value,
-                        'start': event.vobject_instance.vevent.dtstart.value,
-                        'end': event.vobject_instance.vevent.dtend.value
-                    }
-                    result.append(event_data)
-                    logging.info(f"Найдено событие: {event_data['summary']} на {event_data['start']}")
+    async def busy(self, start_date: datetime, end_date: datetime):
+        """
+        Занятость календаря за период
 
-            return result
+        :param start_date: Начало периода
+        :param end_date: Окончание периода
+        :return: BusyMap или None, если занятость получить не удалось
+        """
+        if not self.calendar:
+            logging.error("Календарь не инициализирован")
+            return None
+
+        try:
+            return await self._run(self._busy_map, start_date, end_date)
+        except asyncio.TimeoutError:
+            logging.error(f"Превышено время ожидания CalDAV при запросе занятости с {start_date} по {end_date}")
+            return None
         except Exception as e:
-            logging.error(f"Ошибка при получении списка событий: {e}")
-            return []
\ No newline at end of file
+            logging.error(f"Ошибка при запросе занятости: {e}")
+            return None
+
+    def cache_stats(self) -> dict:
+        """Счетчики кеша событий (попадания, промахи, синхронизации)"""
+        return self.cache.stats()
+
+
+class CalendarPool:
+    """
+    Пул менеджеров календаря для учетных записей пользователей
+
+    Менеджеры хранятся по ключу (сервер, пользователь, календарь), поэтому
+    пользователи с одной учетной записью и календарем используют общий менеджер
+    и его кеш событий. Число менеджеров ограничено: давно не используемые
+    вытесняются (LRU), как и простаивающие дольше idle_ttl, так что память
+    не растет с числом зарегистрированных пользователей. Соединения с одним
+    хостом переиспользуются через общий HTTP адаптер.
+    """
+
+    def __init__(self, max_size: int = CALDAV_POOL_SIZE, idle_ttl: float = CALDAV_POOL_IDLE_TTL):
+        """
+        :param max_size: Максимальное число менеджеров в пуле
+        :param idle_ttl: Через сколько секунд простоя менеджер вытесняется
+        """
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._managers = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+
+    async def get(self, url: str = CALDAV_URL, username: str = CALDAV_USERNAME,
+                  password: str = CALDAV_PASSWORD, calendar_url: str = None,
+                  restricted: bool = False) -> CalendarManager:
+        """
+        Получение менеджера для учетной записи и календаря (создается при первом обращении)
+
+        :param url: URL CalDAV сервера (по умолчанию из config.py)
+        :param username: Имя пользователя
+        :param password: Пароль
+        :param calendar_url: URL календаря (по умолчанию первый календарь учетной записи)
+        :param restricted: Сервер указан пользователем (см. CalendarManager)
+        :return: Менеджер календаря; подключение к серверу не выполняется
+        """
+        entry = self._managers.get((url, username, calendar_url))
+        # При смене пароля старый клиент больше не нужен и заменяется новым
+        if entry is not None and entry[0].password == password:
+            manager = entry[0]
+        else:
+            manager = CalendarManager(url, username, password, calendar_url=calendar_url, restricted=restricted)
+        return await self.put(manager)
+
+    async def put(self, manager: CalendarManager) -> CalendarManager:
+        """
+        Добавление менеджера в пул
+
+        Используется для менеджеров, созданных и проверенных вне пула (например, в /connect),
+        чтобы неудачные попытки подключения не занимали место в пуле и не вытесняли других.
+        Менеджер с тем же сервером, пользователем и календарем заменяется и закрывается.
+
+        :param manager: Менеджер календаря
+        :return: Тот же менеджер
+        """
+        key = (manager.url, manager.username, manager.calendar_url)
+        now = time.monotonic()
+        evicted = []
+
+        entry = self._managers.get(key)
+        if entry is None or entry[0] is not manager:
+            if entry is not None:
+                evicted.append(entry[0])
+            entry = [manager, now]
+            self._managers[key] = entry
+            self.created += 1
+        entry[1] = now
+        self._managers.move_to_end(key)
+
+        while len(self._managers) > self.max_size:
+            evicted.append(self._managers.popitem(last=False)[1][0])
+        for old_key, (old_manager, last_used) in list(self._managers.items()):
+            if now - last_used < self.idle_ttl:
+                break
+            evicted.append(self._managers.pop(old_key)[0])
+
+        self.evicted += len(evicted)
+        for old_manager in evicted:
+            await old_manager.close()
+        return manager
+
+    async def close(self) -> None:
+        """Закрытие всех менеджеров пула"""
+        managers = [manager for manager, _ in self._managers.values()]
+        self._managers.clear()
+        for manager in managers:
+            await manager.close()
+
+    def stats(self) -> dict:
+        """Размер пула и счетчики созданных и вытесненных менеджеров"""
+        return {'size': len(self._managers), 'created': self.created, 'evicted': self.evicted}
@@ -1,4 +1,5 @@
 import os
+from datetime import datetime
 from dotenv import load_dotenv
 
 # Загрузка переменных окружения из файла .env
@@ -20,4 +21,118 @@ if not all([CALDAV_URL, CALDAV_USERNAME, CALDAV_PASSWORD]):
     raise ValueError("Не установлены необходимые переменные окружения для CalDAV")
 
 # Настройка уровня логирования (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Максимальное число одновременных запросов к CalDAV серверу (размер пула потоков)
+CALDAV_MAX_WORKERS = int(os.getenv("CALDAV_MAX_WORKERS", "16"))
+
+# Таймаут одного запроса к CalDAV серверу в секундах
+CALDAV_TIMEOUT = float(os.getenv("CALDAV_TIMEOUT", "30"))
+
+# Кеш событий: время свежести в секундах, число периодов и объектов в памяти
+EVENT_CACHE_TTL = float(os.getenv("EVENT_CACHE_TTL", "60"))
+EVENT_CACHE_MAX_WINDOWS = int(os.getenv("EVENT_CACHE_MAX_WINDOWS", "64"))
+EVENT_CACHE_MAX_OBJECTS = int(os.getenv("EVENT_CACHE_MAX_OBJECTS", "5000"))
+
+# Проверять запись GET запросом, если сервер не вернул ETag в ответ на PUT
+CALDAV_VERIFY_WRITES = os.getenv("CALDAV_VERIFY_WRITES", "true").lower() in ("1", "true", "yes")
+
+# Максимальное число одновременных запросов при массовом добавлении событий
+CALDAV_BATCH_CONCURRENCY = int(os.getenv("CALDAV_BATCH_CONCURRENCY", "8"))
+
+# Файл для сохранения найденных URL principal и календаря (пустая строка - не сохранять)
+CALDAV_DISCOVERY_CACHE = os.getenv("CALDAV_DISCOVERY_CACHE", ".caldav_discovery.json")
+
+# Паузы между попытками переподключения к CalDAV серверу в секундах (растут от минимальной к максимальной)
+CALDAV_RECONNECT_MIN_DELAY = float(os.getenv("CALDAV_RECONNECT_MIN_DELAY", "1"))
+CALDAV_RECONNECT_MAX_DELAY = float(os.getenv("CALDAV_RECONNECT_MAX_DELAY", "300"))
+
+# Проверять SSL сертификаты CalDAV серверов (отключать только для отладки с самоподписанными сертификатами)
+CALDAV_VERIFY_SSL = os.getenv("CALDAV_VERIFY_SSL", "true").lower() in ("1", "true", "yes")
+
+# Серверы, которые пользователи могут подключить командой /connect (через запятую).
+# Пустой список - любой HTTPS сервер с публичным IP адресом
+CALDAV_ALLOWED_HOSTS = [host.strip().lower() for host in os.getenv("CALDAV_ALLOWED_HOSTS", "").split(",")
+                        if host.strip()]
+
+# Файл с учетными записями и выбранными календарями пользователей Telegram.
+# Пароли хранятся в нем открытым текстом, защищены только правами доступа к файлу
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE", "accounts.json")
+
+# Пул менеджеров календаря: максимальный размер, время простоя до вытеснения (сек)
+# и число одновременных запросов одной учетной записи (не больше четверти CALDAV_MAX_WORKERS,
+# чтобы несколько медленных серверов не заняли весь пул потоков)
+CALDAV_POOL_SIZE = int(os.getenv("CALDAV_POOL_SIZE", "256"))
+CALDAV_POOL_IDLE_TTL = float(os.getenv("CALDAV_POOL_IDLE_TTL", "1800"))
+CALDAV_ACCOUNT_CONCURRENCY = int(os.getenv("CALDAV_ACCOUNT_CONCURRENCY", "4"))
+
+# Ограничение частоты HTTP запросов к CalDAV серверам (запросов в секунду): всего и от одного чата
+CALDAV_RATE_LIMIT = float(os.getenv("CALDAV_RATE_LIMIT", "200"))
+CALDAV_CHAT_RATE_LIMIT = float(os.getenv("CALDAV_CHAT_RATE_LIMIT", "50"))
+
+# Ограничение частоты команд работы с календарем (команд в секунду): всего, от одного чата,
+# допустимый всплеск в чате и максимальное ожидание в секундах, после которого команда отклоняется
+COMMAND_RATE_LIMIT = float(os.getenv("COMMAND_RATE_LIMIT", "30"))
+COMMAND_CHAT_RATE_LIMIT = float(os.getenv("COMMAND_CHAT_RATE_LIMIT", "1"))
+COMMAND_CHAT_BURST = float(os.getenv("COMMAND_CHAT_BURST", "5"))
+COMMAND_MAX_WAIT = float(os.getenv("COMMAND_MAX_WAIT", "3"))
+
+# Ограничение частоты отправки сообщений в Telegram (сообщений в секунду):
+# всего, в один личный чат, допустимый всплеск в чате и в одну группу (Telegram допускает около 20 сообщений в минуту)
+TELEGRAM_RATE_LIMIT = float(os.getenv("TELEGRAM_RATE_LIMIT", "30"))
+TELEGRAM_CHAT_RATE_LIMIT = float(os.getenv("TELEGRAM_CHAT_RATE_LIMIT", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_GROUP_RATE_LIMIT = float(os.getenv("TELEGRAM_GROUP_RATE_LIMIT", "0.33"))
+
+# Режим получения обновлений: polling (long polling) или webhook (HTTP сервер)
+RUN_MODE = os.getenv("RUN_MODE", "polling").lower()
+if RUN_MODE not in ("polling", "webhook"):
+    raise ValueError(f"Неизвестный режим запуска RUN_MODE={RUN_MODE}, ожидается polling или webhook")
+
+# Адрес Bot API (пустая строка - api.telegram.org), например локального сервера telegram-bot-api
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Настройка вебхука: публичный URL, путь, адрес и порт HTTP сервера
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Секретный токен, который Telegram передает в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+# Число процессов, принимающих обновления на одном порту (SO_REUSEPORT)
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+
+# Сколько секунд при остановке ждать завершения уже принятых обновлений
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+
+# Проверка наличия необходимых переменных окружения для вебхука
+if RUN_MODE == "webhook" and not all([WEBHOOK_URL, WEBHOOK_SECRET]):
+    raise ValueError("Для режима webhook необходимо установить WEBHOOK_URL и WEBHOOK_SECRET")
+
+# Локальный HTTP сервер метрик Prometheus (/metrics): адрес и порт (0 - не запускать).
+# При нескольких процессах вебхука процесс N слушает порт METRICS_PORT + N
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Очередь записи событий (SQLite): файл базы (пустая строка - хранить только в памяти),
+# размер пакета отправки, паузы между повторными попытками в секундах (растут от минимальной
+# к максимальной) и сколько секунд пытаться записать событие, прежде чем сообщить об ошибке
+WRITE_QUEUE_FILE = os.getenv("WRITE_QUEUE_FILE", "write_queue.db")
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "20"))
+WRITE_QUEUE_RETRY_MIN_DELAY = float(os.getenv("WRITE_QUEUE_RETRY_MIN_DELAY", "5"))
+WRITE_QUEUE_RETRY_MAX_DELAY = float(os.getenv("WRITE_QUEUE_RETRY_MAX_DELAY", "600"))
+WRITE_QUEUE_MAX_AGE = float(os.getenv("WRITE_QUEUE_MAX_AGE", "86400"))
+
+# Рабочее время, в котором команда /free ищет свободные окна (ЧЧ:ММ)
+WORKDAY_START = datetime.strptime(os.getenv("WORKDAY_START", "09:00"), "%H:%M").time()
+WORKDAY_END = datetime.strptime(os.getenv("WORKDAY_END", "21:00"), "%H:%M").time()
+
+# Напоминания о событиях (SQLite): файл базы (пустая строка - хранить только в памяти), за сколько минут
+# до начала напоминать по умолчанию, на сколько дней вперед планировать и раз во сколько секунд
+# перечитывать события пользователя
+REMINDERS_FILE = os.getenv("REMINDERS_FILE", "reminders.db")
+REMINDER_DEFAULT_MINUTES = int(os.getenv("REMINDER_DEFAULT_MINUTES", "15"))
+REMINDER_HORIZON_DAYS = int(os.getenv("REMINDER_HORIZON_DAYS", "7"))
+REMINDER_REFRESH_INTERVAL = float(os.getenv("REMINDER_REFRESH_INTERVAL", "300"))
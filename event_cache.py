@@ -0,0 +1,471 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from dateutil.rrule import DAILY, WEEKLY, rruleset as RRuleSet
+
+from freebusy import BusyMap
+
+# Повторяющиеся события разворачиваются интервалами по EXPANSION_CHUNK, отсчитываемыми от EXPANSION_EPOCH;
+# для каждого события запоминается не больше MAX_EXPANSION_CHUNKS интервалов
+EXPANSION_EPOCH = datetime(2000, 1, 1)
+EXPANSION_CHUNK = timedelta(days=32)
+MAX_EXPANSION_CHUNKS = 12
+
+# Сколько дней битовых карт занятости хранить для полной копии календаря
+MAX_BUSY_DAYS = 730
+
+# Блокировка изменения кеша развернутых экземпляров (запросы идут из нескольких потоков)
+_expansion_lock = threading.Lock()
+
+
+def to_naive(value) -> datetime:
+    """
+    Приведение DATE/DATE-TIME значения к наивному datetime для сравнения
+
+    Даты без времени считаются началом дня, время с часовым поясом
+    переводится в локальное время сервера бота.
+    """
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def overlaps(event_start: datetime, event_end: datetime, start: datetime, end: datetime) -> bool:
+    """Пересечение события с периодом [start, end); события без длительности попадают, если начинаются в периоде"""
+    return event_start < end and (event_end > start or event_start >= start)
+
+
+class CachedEvent:
+    """
+    Событие в кеше: данные для отображения и, для повторяющихся событий, набор правил
+
+    Экземпляры повторяющегося события разворачиваются локально (RRULE, RDATE, EXDATE)
+    и запоминаются по интервалам дат, поэтому повторные запросы тех же дат
+    отвечаются двоичным поиском по уже развернутым экземплярам.
+    """
+
+    __slots__ = ("data", "start", "end", "rruleset", "_series_end", "_expansion")
+
+    def __init__(self, data: dict, rruleset=None):
+        self.data = data
+        self.start = to_naive(data['start'])
+        self.end = to_naive(data['end'])
+        self.rruleset = rruleset
+        self._series_end = None
+        self._expansion = None
+
+    def series_end(self) -> datetime:
+        """Окончание последнего экземпляра события (datetime.max для бесконечных повторений)"""
+        if self.rruleset is None:
+            return self.end
+        if self._series_end is None:
+            rules = self.rruleset._rrule
+            if any(rule._count is None and rule._until is None for rule in rules):
+                self._series_end = datetime.max
+            else:
+                try:
+                    last = to_naive(self.rruleset[-1])
+                    self._series_end = max(last, self.start) + (self.end - self.start)
+                except IndexError:
+                    # Все экземпляры исключены
+                    self._series_end = self.end
+                except (TypeError, ValueError):
+                    # Несовместимые даты в правилах: событие проверяется при каждом запросе
+                    self._series_end = datetime.max
+        return self._series_end
+
+    def _rules_near(self, lower: datetime):
+        """
+        Набор правил, начинающийся незадолго до lower
+
+        dateutil перебирает экземпляры от DTSTART, поэтому для давно начавшихся серий
+        поиск медленный. Ежедневные и еженедельные правила без COUNT повторяются
+        с периодом INTERVAL дней или недель, и сдвиг их начала на целое число
+        периодов не меняет экземпляры. Остальные правила используются как есть.
+        """
+        rules = self.rruleset._rrule
+        if not rules or self.rruleset._exrule:
+            return self.rruleset
+        rebased = RRuleSet()
+        for rule in rules:
+            if rule._count is not None or rule._freq not in (DAILY, WEEKLY):
+                return self.rruleset
+            period = timedelta(days=rule._interval) if rule._freq == DAILY else timedelta(weeks=rule._interval)
+            dtstart = rule._dtstart
+            # Один период в запас на случай перехода на летнее время
+            periods = (lower - dtstart) // period - 1
+            if periods > 0:
+                rule = rule.replace(dtstart=dtstart + period * periods)
+            rebased.rrule(rule)
+        for value in self.rruleset._rdate:
+            rebased.rdate(value)
+        for value in self.rruleset._exdate:
+            rebased.exdate(value)
+        return rebased
+
+    def _expand(self, first_chunk: int, last_chunk: int) -> list:
+        """
+        Развернутые экземпляры повторяющегося события по интервалам EXPANSION_CHUNK
+
+        Недостающие интервалы разворачиваются одним вызовом dateutil и запоминаются,
+        давно не использованные вытесняются (не больше MAX_EXPANSION_CHUNKS на событие).
+
+        :return: Список (наивные начала экземпляров, экземпляры) для интервалов first_chunk..last_chunk
+        """
+        chunks = self._expansion
+        if chunks is None:
+            chunks = self._expansion = OrderedDict()
+        missing = [index for index in range(first_chunk, last_chunk + 1) if index not in chunks]
+        if missing:
+            lower = EXPANSION_EPOCH + EXPANSION_CHUNK * missing[0]
+            upper = EXPANSION_EPOCH + EXPANSION_CHUNK * (missing[-1] + 1)
+            origin = self.data['start']
+            tz = origin.tzinfo if isinstance(origin, datetime) else None
+            # Границы поиска в поясе события, иначе dateutil не сможет сравнить даты
+            if tz is not None:
+                lower, upper = lower.astimezone(tz), upper.astimezone(tz)
+            occurrences = self._rules_near(lower).between(lower, upper, inc=True)
+            expanded = {index: ([], []) for index in missing}
+            for occurrence in occurrences:
+                occurrence_start = to_naive(occurrence)
+                entry = expanded.get((occurrence_start - EXPANSION_EPOCH) // EXPANSION_CHUNK)
+                if entry is not None:
+                    entry[0].append(occurrence_start)
+                    entry[1].append(occurrence)
+            with _expansion_lock:
+                chunks.update(expanded)
+        with _expansion_lock:
+            result = []
+            for index in range(first_chunk, last_chunk + 1):
+                chunks.move_to_end(index)
+                result.append(chunks[index])
+            while len(chunks) > max(MAX_EXPANSION_CHUNKS, last_chunk - first_chunk + 1):
+                chunks.popitem(last=False)
+        return result
+
+    def occurrences(self, start: datetime, end: datetime) -> list:
+        """Экземпляры события, пересекающиеся с периодом [start, end)"""
+        if self.rruleset is None:
+            if overlaps(self.start, self.end, start, end):
+                return [self.data]
+            return []
+
+        duration = self.end - self.start
+        origin = self.data['start']
+        lower = max(start - duration, self.start)
+        if lower > end:
+            return []
+        first_chunk = (lower - EXPANSION_EPOCH) // EXPANSION_CHUNK
+        last_chunk = (end - EXPANSION_EPOCH) // EXPANSION_CHUNK
+
+        result = []
+        for starts, occurrences in self._expand(first_chunk, last_chunk):
+            for index in range(bisect.bisect_left(starts, lower), bisect.bisect_right(starts, end)):
+                occurrence_start = starts[index]
+                if not overlaps(occurrence_start, occurrence_start + duration, start, end):
+                    continue
+                occurrence = occurrences[index]
+                result.append({
+                    'summary': self.data['summary'],
+                    'start': occurrence if isinstance(origin, datetime) else occurrence.date(),
+                    'end': (occurrence + duration) if isinstance(origin, datetime) else (occurrence + duration).date()
+                })
+        return result
+
+
+class IntervalIndex:
+    """
+    Статическое интервальное дерево для поиска событий по периоду
+
+    Интервалы отсортированы по началу и образуют неявное сбалансированное
+    дерево поиска: узел - середина диапазона массива, в нем хранится
+    наибольшее окончание интервалов поддерева. Поиск пропускает поддеревья,
+    которые целиком закончились до начала периода, и отвечает за O(log n + k).
+    """
+
+    __slots__ = ("starts", "ends", "values", "max_ends")
+
+    def __init__(self, items: list):
+        """
+        :param items: Список (начало, окончание, значение)
+        """
+        items = sorted(items, key=lambda item: item[0])
+        self.starts = [item[0] for item in items]
+        self.ends = [item[1] for item in items]
+        self.values = [item[2] for item in items]
+        self.max_ends = list(self.ends)
+        self._build(0, len(items))
+
+    def _build(self, lo: int, hi: int) -> datetime:
+        if lo >= hi:
+            return datetime.min
+        mid = (lo + hi) // 2
+        left = self._build(lo, mid)
+        right = self._build(mid + 1, hi)
+        self.max_ends[mid] = max(self.ends[mid], left, right)
+        return self.max_ends[mid]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def query(self, start: datetime, end: datetime) -> list:
+        """Значения интервалов, начинающихся до end и заканчивающихся не раньше start"""
+        starts, ends, values, max_ends = self.starts, self.ends, self.values, self.max_ends
+        result = []
+        stack = [(0, len(starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if max_ends[mid] < start:
+                continue
+            stack.append((lo, mid))
+            if starts[mid] < end:
+                if ends[mid] >= start:
+                    result.append(values[mid])
+                stack.append((mid + 1, hi))
+        return result
+
+
+class EventCache:
+    """
+    Локальный кеш событий календаря
+
+    Работает в одном из двух режимов:
+    - полная копия календаря (объекты по href с ETag), обновляемая через
+      sync-collection: запросы за любой период отвечаются из памяти;
+    - кеш отдельных периодов с TTL и LRU-вытеснением, проверяемый по ctag,
+      если сервер не поддерживает синхронизацию или календарь слишком велик.
+
+    Все методы потокобезопасны, так как вызываются из пула потоков CalDAV.
+    """
+
+    def __init__(self, ttl: float = 60, max_windows: int = 64, max_objects: int = 5000):
+        """
+        :param ttl: Время в секундах, в течение которого данные считаются свежими без обращения к серверу
+        :param max_windows: Максимальное число закешированных периодов
+        :param max_objects: Максимальное число объектов в полной копии календаря
+        """
+        self.ttl = ttl
+        self.max_windows = max_windows
+        self.max_objects = max_objects
+        self.lock = threading.RLock()
+
+        # Режим синхронизации: None - не проверялся, True - работает, False - недоступен
+        self.sync_supported = None
+        self.sync_token = None
+        self.objects = {}
+        self.synced_at = 0.0
+        # Интервальный индекс по событиям полной копии, перестраивается после изменений,
+        # и построенные по нему битовые карты занятости дней
+        self._index = None
+        self._busy_index = None
+        self._busy_days = OrderedDict()
+
+        self.ctag = None
+        self.windows = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.full_reports = 0
+        self.incremental_syncs = 0
+        self.evictions = 0
+
+    def is_fresh(self) -> bool:
+        """Проверка, что полная копия календаря обновлялась не позже TTL назад"""
+        return self.sync_token is not None and time.monotonic() - self.synced_at < self.ttl
+
+    def etags(self) -> dict:
+        """ETag закешированных объектов по href"""
+        with self.lock:
+            return {href: etag for href, (etag, _) in self.objects.items()}
+
+    def apply_sync(self, sync_token: str, updated: dict, deleted, full: bool = False) -> bool:
+        """
+        Применение результата sync-collection
+
+        :param sync_token: Новый токен синхронизации
+        :param updated: Измененные объекты {href: (etag, [CachedEvent, ...])}
+        :param deleted: href удаленных объектов
+        :param full: Полная синхронизация - заменяет весь кеш
+        :return: False если календарь не помещается в кеш (режим синхронизации отключается)
+        """
+        with self.lock:
+            objects = {} if full else self.objects
+            objects.update(updated)
+            for href in deleted:
+                objects.pop(href, None)
+            if len(objects) > self.max_objects:
+                self.disable_sync()
+                return False
+            self.objects = objects
+            if full or updated or deleted:
+                self._index = None
+            self.sync_token = sync_token
+            self.sync_supported = True
+            self.synced_at = time.monotonic()
+            if full:
+                self.full_reports += 1
+            else:
+                self.incremental_syncs += 1
+            return True
+
+    def disable_sync(self) -> None:
+        """Переход в режим кеширования отдельных периодов"""
+        with self.lock:
+            self.sync_supported = False
+            self.sync_token = None
+            self.objects = {}
+            self._index = None
+
+    def add_object(self, href: str, etag: str, events: list) -> None:
+        """
+        Добавление только что записанного объекта без обращения к серверу
+
+        В режиме полной копии объект сохраняется с его ETag: следующая синхронизация
+        увидит тот же ETag и не станет загружать его повторно.
+        Закешированные периоды при этом сбрасываются.
+        """
+        with self.lock:
+            if self.sync_token is not None:
+                self.objects[href] = (etag, events)
+                self._index = None
+            self.windows.clear()
+
+    def touch(self) -> None:
+        """Продление свежести кеша, когда сервер сообщил об отсутствии изменений"""
+        with self.lock:
+            self.synced_at = time.monotonic()
+            expires = time.monotonic() + self.ttl
+            for key, (_, ctag, events) in list(self.windows.items()):
+                self.windows[key] = (expires, ctag, events)
+
+    def _get_index(self) -> IntervalIndex:
+        with self.lock:
+            index = self._index
+            if index is None:
+                events = [event for _, events in self.objects.values() for event in events]
+                index = self._index = IntervalIndex([(event.start, event.series_end(), event) for event in events])
+            return index
+
+    def query(self, start: datetime, end: datetime) -> list:
+        """Выборка событий периода из полной копии календаря по интервальному индексу"""
+        start = to_naive(start)
+        end = to_naive(end)
+        result = []
+        for event in self._get_index().query(start, end):
+            result.extend(event.occurrences(start, end))
+        result.sort(key=lambda e: to_naive(e['start']))
+        return result
+
+    def busy(self, start: datetime, end: datetime) -> BusyMap:
+        """
+        Карта занятости периода по полной копии календаря
+
+        Битовая карта дня строится по интервальному индексу один раз и используется
+        до следующего изменения календаря. События на весь день занятостью не считаются.
+        """
+        start = to_naive(start)
+        end = to_naive(end)
+        index = self._get_index()
+        first = start.date()
+        last = max(start, end - timedelta(microseconds=1)).date()
+        days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+        with self.lock:
+            known = {}
+            if self._busy_index is index:
+                for day in days:
+                    if day in self._busy_days:
+                        self._busy_days.move_to_end(day)
+                        known[day] = self._busy_days[day]
+        missing = [day for day in days if day not in known]
+        if missing:
+            lower = datetime.combine(missing[0], datetime.min.time())
+            upper = datetime.combine(missing[-1], datetime.min.time()) + timedelta(days=1)
+            computed = BusyMap()
+            for event in index.query(lower, upper):
+                for occurrence in event.occurrences(lower, upper):
+                    if isinstance(occurrence['start'], datetime):
+                        computed.add(to_naive(occurrence['start']), to_naive(occurrence['end']))
+            with self.lock:
+                if self._busy_index is not index:
+                    self._busy_index = index
+                    self._busy_days = OrderedDict()
+                for day in missing:
+                    known[day] = self._busy_days[day] = computed.days.get(day, 0)
+                while len(self._busy_days) > MAX_BUSY_DAYS:
+                    self._busy_days.popitem(last=False)
+        return BusyMap({day: mask for day, mask in known.items() if mask})
+
+    def get_window(self, start: datetime, end: datetime, ignore_ttl: bool = False):
+        """
+        Список событий закешированного периода или None, если его нет или он устарел
+
+        :param ignore_ttl: Не проверять срок свежести (период только что подтвержден по ctag)
+        """
+        key = (start, end)
+        with self.lock:
+            entry = self.windows.get(key)
+            if entry is None or (not ignore_ttl and entry[0] < time.monotonic()):
+                return None
+            self.windows.move_to_end(key)
+            return entry[2]
+
+    def put_window(self, start: datetime, end: datetime, events: list, ctag: str = None) -> None:
+        """Сохранение событий периода с вытеснением давно не используемых периодов"""
+        with self.lock:
+            if ctag != self.ctag:
+                self.windows.clear()
+                self.ctag = ctag
+            self.windows[(start, end)] = (time.monotonic() + self.ttl, ctag, events)
+            self.windows.move_to_end((start, end))
+            while len(self.windows) > self.max_windows:
+                self.windows.popitem(last=False)
+                self.evictions += 1
+
+    def revalidate(self, ctag: str) -> bool:
+        """
+        Проверка закешированных периодов по ctag календаря
+
+        :return: True если календарь не изменился и кеш продлен
+        """
+        with self.lock:
+            if ctag is not None and ctag == self.ctag and self.windows:
+                self.touch()
+                return True
+            self.windows.clear()
+            self.ctag = ctag
+            return False
+
+    def invalidate(self) -> None:
+        """Сброс свежести кеша, например после записи в календарь"""
+        with self.lock:
+            self.synced_at = 0.0
+            self.windows.clear()
+
+    def record(self, hit: bool) -> None:
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов кеша"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'full_reports': self.full_reports,
+                'incremental_syncs': self.incremental_syncs,
+                'evictions': self.evictions,
+                'objects': len(self.objects),
+                'windows': len(self.windows),
+                'sync_supported': self.sync_supported,
+            }
@@ -0,0 +1,131 @@
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from html import escape
+
+from event_cache import to_naive
+
+# Максимальная длина текста сообщения Telegram (в UTF-16 символах)
+MESSAGE_LIMIT = 4096
+
+# Запас под заголовок страницы с номером
+HEADER_RESERVE = 128
+
+# Максимальная длина названия события в списке
+MAX_SUMMARY_LENGTH = 500
+
+
+def text_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram: в кодовых единицах UTF-16 (эмодзи - две)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def format_event_line(event: dict) -> str:
+    """Строка события для списка /events: 📅 Встреча - 07.03.2024 15:00"""
+    start = event['start']
+    if isinstance(start, datetime):
+        when = f"{to_naive(start):%d.%m.%Y %H:%M}"
+    elif isinstance(start, date):
+        when = f"{start:%d.%m.%Y} (весь день)"
+    else:
+        when = str(start)
+    summary = str(event['summary'])
+    if len(summary) > MAX_SUMMARY_LENGTH:
+        summary = summary[:MAX_SUMMARY_LENGTH] + "…"
+    # Сообщения отправляются с разметкой HTML, поэтому название экранируется
+    return f"📅 {escape(summary)} - {when}"
+
+
+def paginate(lines, limit: int = MESSAGE_LIMIT - HEADER_RESERVE) -> list:
+    """
+    Разбиение строк на страницы, каждая из которых помещается в одно сообщение
+
+    Строки не разрываются между страницами; слишком длинная строка обрезается.
+    Текст страницы собирается одним join, а не повторной конкатенацией.
+
+    :param lines: Итерируемая последовательность строк (может быть генератором)
+    :param limit: Максимальная длина текста страницы
+    :return: Список текстов страниц (пустой, если строк нет)
+    """
+    pages = []
+    current = []
+    size = 0
+    for line in lines:
+        length = text_length(line)
+        if length > limit:
+            line = line.encode("utf-16-le")[:(limit - 1) * 2].decode("utf-16-le", "ignore") + "…"
+            length = text_length(line)
+        # +1 - перевод строки перед строкой
+        if current and size + 1 + length > limit:
+            pages.append("\n".join(current))
+            current = []
+            size = 0
+        size += length + (1 if current else 0)
+        current.append(line)
+    if current:
+        pages.append("\n".join(current))
+    return pages
+
+
+class EventPages:
+    """Отрисованный список событий периода, разбитый на страницы"""
+
+    __slots__ = ("start", "end", "pages", "created")
+
+    def __init__(self, start: datetime, end: datetime, events: list):
+        self.start = start
+        self.end = end
+        self.pages = paginate(format_event_line(event) for event in events)
+        self.created = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def render(self, page: int, title: str) -> str:
+        """
+        Текст страницы с заголовком
+
+        :param page: Номер страницы с нуля (приводится к допустимому диапазону)
+        :param title: Заголовок списка
+        """
+        if not self.pages:
+            return title
+        page = min(max(page, 0), len(self.pages) - 1)
+        if len(self.pages) > 1:
+            title = f"{title} (стр. {page + 1} из {len(self.pages)})"
+        return f"{title}\n\n{self.pages[page]}"
+
+
+class EventPagesCache:
+    """
+    Кеш отрисованных списков событий по пользователю и началу периода
+
+    Листание страниц одного списка отвечается из кеша без запросов к календарю
+    и повторной отрисовки. Записи живут ttl секунд; давно не используемые
+    вытесняются, когда записей больше max_size.
+    """
+
+    def __init__(self, ttl: float = 300, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def get(self, user_id: int, start: datetime):
+        """:return: EventPages или None, если списка нет в кеше или он устарел"""
+        key = (user_id, start)
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if time.monotonic() - item.created > self.ttl:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return item
+
+    def put(self, user_id: int, item: EventPages) -> None:
+        key = (user_id, item.start)
+        self._items[key] = item
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
@@ -0,0 +1,330 @@
+import re
+from collections import namedtuple
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+# Сколько последних разобранных текстов помнить (разбор не зависит от текущего времени)
+PARSE_CACHE_SIZE = 1024
+
+# Длительность события, если в тексте не указаны окончание или длительность
+DEFAULT_DURATION = timedelta(hours=1)
+
+_MONTHS = {
+    'янв': 1, 'фев': 2, 'мар': 3, 'апр': 4, 'мая': 5, 'май': 5, 'июн': 6,
+    'июл': 7, 'авг': 8, 'сен': 9, 'окт': 10, 'ноя': 11, 'дек': 12,
+}
+
+# Основы названий дней недели: в любом падеже, во множественном числе (по понедельникам)
+_WEEKDAYS = (
+    ("понедельник", "MO"), ("вторник", "TU"), ("сред", "WE"), ("четверг", "TH"),
+    ("пятниц", "FR"), ("суббот", "SA"), ("воскресень", "SU"),
+)
+_WEEKDAY_CODES = [code for _, code in _WEEKDAYS]
+_WEEKDAY_STEMS = "|".join(stem for stem, _ in _WEEKDAYS)
+_WEEKDAY_STEM_RE = re.compile(_WEEKDAY_STEMS)
+# Перечисление дней недели через запятую или "и": "среду и пятницу", "вторникам, четвергам"
+_WEEKDAY_LIST = (r"(?:" + _WEEKDAY_STEMS + r")[а-я]*(?:(?:\s*,\s*|\s+и\s+)(?:" + _WEEKDAY_STEMS + r")[а-я]*)*")
+
+_NUMBERS = {
+    'один': 1, 'одну': 1, 'одна': 1, 'два': 2, 'две': 2, 'три': 3, 'четыре': 4, 'пять': 5,
+    'шесть': 6, 'семь': 7, 'восемь': 8, 'девять': 9, 'десять': 10,
+}
+_NUMBER = r"(\d+|" + "|".join(_NUMBERS) + r")"
+
+_FREQUENCIES = {'д': "DAILY", 'н': "WEEKLY", 'м': "MONTHLY", 'г': "YEARLY"}
+
+# Правила грамматики: разбираются по порядку, совпавший фрагмент вырезается из текста
+_RECURRENCE_RE = re.compile(
+    r"\b(?:"
+    r"(?P<every>кажд(?:ый|ую|ое|ые))\s+(?:(?P<interval>\d+|два|две|три|четыре|пять)\s+)?"
+    r"(?:(?P<unit>день|дня|дней|недел[юиь]|месяц(?:а|ев)?|год(?:а)?|лет)|(?P<weekday>" + _WEEKDAY_LIST + r"))"
+    r"|(?P<adverb>ежедневно|еженедельно|ежемесячно|ежегодно)"
+    r"|по\s+(?P<plural>" + _WEEKDAY_LIST + r")"
+    r"|по\s+(?P<workdays>будням|рабочим\s+дням)"
+    r"|по\s+(?P<weekends>выходным)"
+    r")\b"
+)
+_TIME_RANGE_RE = re.compile(
+    r"(?:\b[сc]\s*)?\b(?P<h1>[01]?\d|2[0-3])(?:[:.](?P<m1>[0-5]\d))?\s*(?:до|-|–|—)\s*"
+    r"(?P<h2>[01]?\d|2[0-3])(?:[:.](?P<m2>[0-5]\d))?(?:\s*(?P<part>утра|дня|вечера|ночи))?\b"
+)
+_TIME_RE = re.compile(
+    r"(?:\b(?:в|во|к)\s+(?P<h1>[01]?\d|2[0-3])(?:[:.](?P<m1>[0-5]\d))?"
+    r"(?!\s*(?:час|мин|дн(?!я\b)|недел|раз|%))"
+    r"|\b(?P<h2>[01]?\d|2[0-3]):(?P<m2>[0-5]\d))"
+    r"(?:\s*(?P<part>утра|дня|вечера|ночи))?\b"
+    r"|\b(?:в|во|к)\s+(?P<noon>полдень|полночь)\b"
+)
+_DURATION_RE = re.compile(
+    r"\bна\s+(?:(?P<value>\d+(?:[.,]\d+)?|" + "|".join(_NUMBERS) + r")\s*"
+    r"(?P<unit>час(?:а|ов)?|ч|минут[уы]?|мин|д(?:ень|ня|ней))\b"
+    r"|(?P<word>полчаса|час|полтора\s+часа|сутки|день(?!\s+рожд))\b)"
+)
+_DATE_RE = re.compile(
+    r"\b(?:"
+    r"(?P<iso>\d{4}-\d{2}-\d{2})"
+    r"|(?P<day>\d{1,2})\.(?P<month>\d{1,2})(?:\.(?P<year>\d{4}|\d{2}))?"
+    r"|(?P<text_day>\d{1,2})(?:-?го)?\s+(?P<text_month>янв|фев|мар|апр|ма[йя]|июн|июл|авг|сен|окт|ноя|дек)[а-я]*\.?"
+    r"(?:\s+(?P<text_year>\d{4})(?:\s*г(?:ода|\.)?)?)?"
+    r"|(?P<relative>сегодня|послезавтра|завтра)"
+    r"|через\s+(?:(?P<count>" + _NUMBER[1:-1] + r")\s+)?(?P<count_unit>день|дня|дней|недел[юиь]|месяц(?:а|ев)?)"
+    r"|(?:в|во)\s+(?P<next>следующ[а-я]+\s+)?(?P<weekday>" + _WEEKDAY_STEMS + r")[а-я]*"
+    r")(?![\d.])"
+)
+# Предлоги и знаки, оставшиеся на краях названия после вырезания даты и времени
+_EDGE_RE = re.compile(r"^(?:(?:в|во|на|с|до|к|по|и)\s+|[\s,.;:!-]+)+|(?:\s+(?:в|во|на|с|до|к|по|и)|[\s,.;:!-]+)+$")
+_SPACES_RE = re.compile(r"\s{2,}")
+
+# Результат разбора текста без привязки к текущему времени
+_Analysis = namedtuple("_Analysis", "summary date_spec start_time end_time duration rrule")
+
+
+@dataclass
+class ParsedEvent:
+    """
+    Событие, описанное обычным текстом
+
+    :param summary: Название
+    :param start: Начало
+    :param end: Окончание
+    :param rrule: Правило повторения (RRULE) или None
+    """
+    summary: str
+    start: datetime
+    end: datetime
+    rrule: str = None
+
+
+def _number(value: str) -> int:
+    return int(value) if value.isdigit() else _NUMBERS[value]
+
+
+def _hour(hour: str, minute: str, part: str) -> time:
+    hour = int(hour)
+    if part in ("дня", "вечера") and hour < 12:
+        hour += 12
+    elif part in ("ночи", "утра") and hour == 12:
+        hour = 0
+    return time(hour, int(minute or 0))
+
+
+def _cut(text: str, match) -> str:
+    """Замена совпавшего фрагмента пробелами (позиции остальных фрагментов не меняются)"""
+    return text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+
+
+def _recurrence(match) -> str:
+    if match['adverb']:
+        return "FREQ=" + _FREQUENCIES[match['adverb'][3]]
+    if match['workdays']:
+        return "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"
+    if match['weekends']:
+        return "FREQ=WEEKLY;BYDAY=SA,SU"
+    weekdays = match['weekday'] or match['plural']
+    if weekdays:
+        stems = _WEEKDAY_STEMS.split("|")
+        codes = sorted({stems.index(stem) for stem in _WEEKDAY_STEM_RE.findall(weekdays)})
+        return "FREQ=WEEKLY;BYDAY=" + ",".join(_WEEKDAY_CODES[code] for code in codes)
+    unit = match['unit']
+    rule = "FREQ=" + _FREQUENCIES['г' if unit.startswith("л") else unit[0]]
+    if match['interval'] and _number(match['interval']) > 1:
+        rule += f";INTERVAL={_number(match['interval'])}"
+    return rule
+
+
+def _date_spec(match) -> tuple:
+    """Описание даты: ('date', год или None, месяц, день), ('days', n), ('months', n) или ('weekday', день, следующий)"""
+    if match['iso']:
+        year, month, day = map(int, match['iso'].split("-"))
+        return ("date", year, month, day)
+    if match['day']:
+        year = match['year']
+        if year and len(year) == 2:
+            year = "20" + year
+        return ("date", int(year) if year else None, int(match['month']), int(match['day']))
+    if match['text_day']:
+        month = _MONTHS[match['text_month'][:3]]
+        return ("date", int(match['text_year']) if match['text_year'] else None, month, int(match['text_day']))
+    if match['relative']:
+        return ("days", {'сегодня': 0, 'завтра': 1, 'послезавтра': 2}[match['relative']])
+    if match['count_unit']:
+        count = _number(match['count']) if match['count'] else 1
+        unit = match['count_unit']
+        if unit.startswith("м"):
+            return ("months", count)
+        return ("days", count * 7 if unit.startswith("недел") else count)
+    return ("weekday", _WEEKDAY_STEMS.split("|").index(match['weekday']), bool(match['next']))
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _analyze(text: str):
+    """
+    Разбор текста по правилам грамматики
+
+    :return: _Analysis или None, если в тексте не найдено время события
+    """
+    # Совпавшие фрагменты вырезаются и из текста для разбора, и из исходного текста:
+    # то, что останется от исходного, станет названием
+    rest = _SPACES_RE.sub(" ", text.strip())
+    work = rest.lower().replace("ё", "е")
+
+    rrule = None
+    match = _RECURRENCE_RE.search(work)
+    if match:
+        rrule = _recurrence(match)
+        work, rest = _cut(work, match), _cut(rest, match)
+
+    start_time = end_time = None
+    # Диапазон без минут (10-12) принимается только с предлогом: "с 10 до 12"
+    match = next((match for match in _TIME_RANGE_RE.finditer(work)
+                  if match['m1'] or match['m2'] or match.group(0)[:1] in "сc"), None)
+    if match:
+        part = match['part']
+        start_time = _hour(match['h1'], match['m1'], part if int(match['h1']) <= int(match['h2']) else None)
+        end_time = _hour(match['h2'], match['m2'], part)
+        work, rest = _cut(work, match), _cut(rest, match)
+    else:
+        match = _TIME_RE.search(work)
+        if match:
+            if match['noon']:
+                start_time = time(12) if match['noon'] == "полдень" else time(0)
+            elif match['h1']:
+                start_time = _hour(match['h1'], match['m1'], match['part'])
+            else:
+                start_time = _hour(match['h2'], match['m2'], match['part'])
+            work, rest = _cut(work, match), _cut(rest, match)
+    if start_time is None:
+        return None
+
+    duration = None
+    match = _DURATION_RE.search(work)
+    if match:
+        if match['word']:
+            duration = {'полчаса': timedelta(minutes=30), 'час': timedelta(hours=1),
+                        'сутки': timedelta(days=1), 'день': timedelta(days=1)}.get(match['word'], timedelta(minutes=90))
+        else:
+            value = match['value'].replace(",", ".")
+            value = float(value) if value[0].isdigit() else _NUMBERS[value]
+            unit = match['unit']
+            if unit.startswith("ч"):
+                duration = timedelta(hours=value)
+            elif unit.startswith("д"):
+                duration = timedelta(days=value)
+            else:
+                duration = timedelta(minutes=value)
+        work, rest = _cut(work, match), _cut(rest, match)
+
+    date_spec = None
+    match = _DATE_RE.search(work)
+    if match:
+        date_spec = _date_spec(match)
+        work, rest = _cut(work, match), _cut(rest, match)
+
+    summary = _EDGE_RE.sub("", _SPACES_RE.sub(" ", rest).strip())
+    return _Analysis(summary, date_spec, start_time, end_time, duration, rrule)
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    for last_day in (day.day, 30, 29, 28):
+        try:
+            return day.replace(year=year, month=month, day=min(day.day, last_day))
+        except ValueError:
+            continue
+    raise ValueError("Некорректная дата")
+
+
+def _resolve_date(analysis: _Analysis, now: datetime) -> date:
+    today = now.date()
+    spec = analysis.date_spec
+    weekdays = None
+    if analysis.rrule and "BYDAY=" in analysis.rrule:
+        weekdays = [_WEEKDAY_CODES.index(code) for code in analysis.rrule.split("BYDAY=")[1].split(",")]
+
+    if spec is None:
+        # Без даты - ближайший подходящий день, начало которого еще не прошло
+        for offset in range(8):
+            day = today + timedelta(days=offset)
+            if weekdays is not None and day.weekday() not in weekdays:
+                continue
+            if datetime.combine(day, analysis.start_time) > now:
+                return day
+        return today
+
+    kind = spec[0]
+    if kind == "days":
+        day = today + timedelta(days=spec[1])
+    elif kind == "months":
+        day = _add_months(today, spec[1])
+    elif kind == "weekday":
+        _, weekday, following = spec
+        offset = (weekday - today.weekday()) % 7
+        day = today + timedelta(days=offset or (7 if following else 0))
+    else:
+        _, year, month, number = spec
+        day = date(year or today.year, month, number)
+        # Дата без года, которая в этом году уже прошла, относится к следующему году
+        if year is None and day < today:
+            day = date(today.year + 1, month, number)
+    # Повторения по дням недели начинаются с первого подходящего дня не раньше указанной даты
+    while weekdays is not None and day.weekday() not in weekdays:
+        day += timedelta(days=1)
+    return day
+
+
+def parse_event(text: str, now: datetime = None):
+    """
+    Разбор описания события на русском языке
+
+    Понимает даты (сегодня, завтра, через 2 дня, в пятницу, 7 марта, 07.03.2025,
+    2025-03-07), время (в 15:00, в 3 дня, с 10 до 12, 10:00-11:30, в полдень),
+    длительность (на 2 часа, на полчаса, на 45 минут, на 2 дня) и повторения (каждый день,
+    еженедельно, каждую среду и пятницу, по понедельникам, по будням). Остальной текст становится названием.
+    Разбор текста кешируется, а относительные даты вычисляются от now при каждом вызове.
+
+    Пример: "встреча с командой завтра в 15:00 на 2 часа"
+
+    :param text: Текст сообщения
+    :param now: Текущее время (по умолчанию datetime.now())
+    :return: ParsedEvent или None, если в тексте нет времени события, дата некорректна
+             или выходит за пределы datetime (например, "через 99999999 дней")
+    """
+    now = now or datetime.now()
+    try:
+        analysis = _analyze(text)
+        if analysis is None:
+            return None
+        day = _resolve_date(analysis, now)
+        start = datetime.combine(day, analysis.start_time)
+        if analysis.end_time is not None:
+            end = datetime.combine(day, analysis.end_time)
+            if end <= start:
+                end += timedelta(days=1)
+        else:
+            end = start + (analysis.duration or DEFAULT_DURATION)
+    except (ValueError, OverflowError):
+        return None
+    return ParsedEvent(analysis.summary or "Событие", start, end, analysis.rrule)
+
+
+def describe_rrule(rrule: str) -> str:
+    """Описание правила повторения для ответа пользователю (например, 'по понедельникам')"""
+    parts = dict(part.split("=", 1) for part in rrule.split(";"))
+    names = {'MO': "понедельникам", 'TU': "вторникам", 'WE': "средам", 'TH': "четвергам",
+             'FR': "пятницам", 'SA': "субботам", 'SU': "воскресеньям"}
+    if 'BYDAY' in parts:
+        days = parts['BYDAY'].split(",")
+        if days == ["MO", "TU", "WE", "TH", "FR"]:
+            return "по будням"
+        if days == ["SA", "SU"]:
+            return "по выходным"
+        return "по " + ", ".join(names[day] for day in days)
+    interval = int(parts.get('INTERVAL', 1))
+    units = {'DAILY': ("день", "дня"), 'WEEKLY': ("неделю", "недели"),
+             'MONTHLY': ("месяц", "месяца"), 'YEARLY': ("год", "года")}[parts['FREQ']]
+    if interval == 1:
+        return f"каждый {units[0]}" if parts['FREQ'] != "WEEKLY" else "каждую неделю"
+    return f"каждые {interval} {units[1]}"
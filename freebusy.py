@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+# Длительность одного интервала битовой карты занятости в минутах
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOT = timedelta(minutes=SLOT_MINUTES)
+
+
+def _slot(value: datetime, round_up: bool = False) -> int:
+    """Номер пятиминутного интервала дня, в который попадает время (с округлением вверх - следующий)"""
+    minutes = value.hour * 60 + value.minute
+    slot = minutes // SLOT_MINUTES
+    if round_up and (minutes % SLOT_MINUTES or value.second or value.microsecond):
+        slot += 1
+    return slot
+
+
+def _day_masks(start: datetime, end: datetime):
+    """
+    Маски интервалов дней, которые покрывает период [start, end)
+
+    Начало округляется вниз, окончание вверх до границы интервала,
+    поэтому период 10:03-10:07 занимает интервалы 10:00-10:10.
+
+    :return: Пары (дата, битовая маска)
+    """
+    if end <= start:
+        return
+    day = start.date()
+    last_day = end.date()
+    lo = _slot(start)
+    while day <= last_day:
+        hi = _slot(end, round_up=True) if day == last_day else SLOTS_PER_DAY
+        if hi > lo:
+            yield day, ((1 << (hi - lo)) - 1) << lo
+        day += timedelta(days=1)
+        lo = 0
+
+
+class BusyMap:
+    """
+    Занятость календаря по дням в виде битовых карт
+
+    Каждый день - целое число из SLOTS_PER_DAY бит, бит i установлен, если
+    пятиминутный интервал i занят хотя бы одним событием. Проверка пересечения
+    и поиск свободных окон выполняются битовыми операциями над целыми днями,
+    поэтому их стоимость зависит от числа интервалов, а не от числа событий.
+    Время наивное, в локальном поясе бота (как в кеше событий).
+    """
+
+    __slots__ = ("days",)
+
+    def __init__(self, days: dict = None):
+        """
+        :param days: Битовые карты {дата: маска}
+        """
+        self.days = days if days is not None else {}
+
+    @classmethod
+    def from_intervals(cls, intervals) -> "BusyMap":
+        """Карта занятости из пар (начало, окончание)"""
+        busy = cls()
+        for start, end in intervals:
+            busy.add(start, end)
+        return busy
+
+    def add(self, start: datetime, end: datetime) -> None:
+        """Отметка периода [start, end) как занятого"""
+        days = self.days
+        for day, mask in _day_masks(start, end):
+            days[day] = days.get(day, 0) | mask
+
+    def update(self, other: "BusyMap") -> None:
+        """Объединение с другой картой занятости"""
+        for day, mask in other.days.items():
+            self.days[day] = self.days.get(day, 0) | mask
+
+    def is_busy(self, start: datetime, end: datetime) -> bool:
+        """Пересекается ли период [start, end) с занятым временем"""
+        days = self.days
+        return any(days.get(day, 0) & mask for day, mask in _day_masks(start, end))
+
+    def free_periods(self, start: datetime, end: datetime, min_duration: timedelta = SLOT) -> list:
+        """
+        Свободные окна внутри периода [start, end)
+
+        Границы окон выровнены по интервалам карты; окно, переходящее
+        через полночь, возвращается одним периодом.
+
+        :param min_duration: Минимальная длительность окна
+        :return: Список пар (начало, окончание)
+        """
+        periods = []
+        for day, window in _day_masks(start, end):
+            free = window & ~self.days.get(day, 0)
+            midnight = datetime.combine(day, datetime.min.time())
+            while free:
+                lo = (free & -free).bit_length() - 1
+                run = free >> lo
+                # Число младших единичных битов - длина свободного окна
+                length = (~run & (run + 1)).bit_length() - 1
+                free &= ~(((1 << length) - 1) << lo)
+                period_start = max(start, midnight + SLOT * lo)
+                period_end = min(end, midnight + SLOT * (lo + length))
+                if periods and periods[-1][1] == period_start:
+                    periods[-1] = (periods[-1][0], period_end)
+                else:
+                    periods.append((period_start, period_end))
+        return [(period_start, period_end) for period_start, period_end in periods
+                if period_end - period_start >= min_duration]
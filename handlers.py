@@ -1,19 +1,282 @@
-from aiogram import Router, F
+from aiogram import Bot, Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.utils.markdown import hbold
 from datetime import datetime, timedelta
+from io import BytesIO
+from accounts import AccountStore
+from config import (
+    ACCOUNTS_FILE, WORKDAY_START, WORKDAY_END, WRITE_QUEUE_FILE, WRITE_QUEUE_BATCH_SIZE, WRITE_QUEUE_RETRY_MIN_DELAY,
+    WRITE_QUEUE_RETRY_MAX_DELAY, WRITE_QUEUE_MAX_AGE, REMINDERS_FILE, REMINDER_DEFAULT_MINUTES, REMINDER_HORIZON_DAYS,
+    REMINDER_REFRESH_INTERVAL
+)
+from event_pages import EventPages, EventPagesCache
+from event_parser import ParsedEvent, describe_rrule, parse_event
+from metrics import CallbackMetric
+from reminders import ReminderScheduler
+from write_queue import WriteQueue
+import asyncio
 import calendar_utils
 import logging
+import middlewares
 
 # Инициализация роутера для обработки сообщений
 router = Router()
-calendar_manager = None
 
-try:
-    calendar_manager = calendar_utils.CalendarManager()
-except Exception as e:
-    logging.error(f"Ошибка при инициализации календаря: {e}")
+# Замер длительности обработчиков, ограничение частоты команд календаря
+# (обработчики с флагом calendar) и привязка запросов к чату
+router.message.middleware(middlewares.MetricsMiddleware())
+router.callback_query.middleware(middlewares.MetricsMiddleware())
+router.message.middleware(middlewares.CalendarThrottlingMiddleware())
+router.callback_query.middleware(middlewares.CalendarThrottlingMiddleware())
+
+# Учетные записи пользователей и пул клиентов CalDAV
+accounts = AccountStore(ACCOUNTS_FILE)
+calendar_pool = calendar_utils.CalendarPool()
+CallbackMetric("caldav_pool_managers", "Менеджеры календаря в пуле: текущее число, созданные и вытесненные",
+               lambda: {(key,): value for key, value in calendar_pool.stats().items()}, labels=("state",))
+
+# Сколько секунд обработчик ждет подключения к календарю, если оно еще идет
+CALENDAR_WAIT_TIMEOUT = 5
+
+# Сколько секунд /add_event ждет проверки пересечения с другими событиями
+CONFLICT_CHECK_TIMEOUT = 3
+
+# Минимальная длительность свободного окна /free по умолчанию (минут)
+DEFAULT_FREE_MINUTES = 30
+
+# Сколько секунд листание страниц /events показывает однажды полученный список событий
+EVENT_PAGES_TTL = 300
+
+# Максимальное время напоминания до начала события (минут)
+MAX_REMINDER_MINUTES = 24 * 60
+
+# Ограничения массового добавления событий
+MAX_BULK_EVENTS = 1000
+MAX_ICS_FILE_SIZE = 2 * 1024 * 1024
+
+@router.startup()
+async def on_startup(bot: Bot) -> None:
+    """Фоновое подключение к общему календарю, запуск очереди записи событий и напоминаний"""
+    (await calendar_pool.get()).start()
+    write_queue.notify = bot.send_message
+    write_queue.start()
+    reminders.send = bot.send_message
+    await reminders.start()
+
+@router.shutdown()
+async def on_shutdown() -> None:
+    """Остановка напоминаний, очереди записи, клиентов CalDAV и пула потоков"""
+    logging.info("Статистика ограничения запросов: %s", middlewares.stats())
+    await reminders.stop()
+    await write_queue.stop()
+    await calendar_pool.close()
+    calendar_utils.shutdown_executor()
+
+async def get_calendar_manager(user_id: int):
+    """
+    Менеджер календаря пользователя
+
+    Используется личная учетная запись пользователя, если она подключена,
+    иначе общая из настроек бота; учитывается выбранный календарь.
+    Если подключение еще идет, недолго ждет его завершения.
+
+    :return: Подключенный менеджер или None, если календарь недоступен
+    """
+    settings = accounts.get(user_id)
+    if 'url' in settings:
+        manager = await calendar_pool.get(settings['url'], settings['username'], settings['password'],
+                                          calendar_url=settings.get('calendar'), restricted=True)
+    else:
+        manager = await calendar_pool.get(calendar_url=settings.get('calendar'))
+    if await manager.ensure_connected(CALENDAR_WAIT_TIMEOUT):
+        return manager
+    return None
+
+# Очередь записи событий /add_event: событие сохраняется локально и отправляется на сервер в фоне
+write_queue = WriteQueue(
+    WRITE_QUEUE_FILE, get_calendar_manager,
+    batch_size=WRITE_QUEUE_BATCH_SIZE,
+    retry_min_delay=WRITE_QUEUE_RETRY_MIN_DELAY,
+    retry_max_delay=WRITE_QUEUE_RETRY_MAX_DELAY,
+    max_age=WRITE_QUEUE_MAX_AGE
+)
+CallbackMetric("write_queue_pending", "События, ожидающие записи в календарь",
+               lambda: {(): write_queue.pending()})
+
+# Напоминания о предстоящих событиях пользователей, включивших их командой /remind
+reminders = ReminderScheduler(
+    REMINDERS_FILE, get_calendar_manager,
+    default_minutes=REMINDER_DEFAULT_MINUTES,
+    horizon_days=REMINDER_HORIZON_DAYS,
+    refresh_interval=REMINDER_REFRESH_INTERVAL,
+    pending_writes=write_queue.pending_uids
+)
+CallbackMetric("reminders_scheduled", "Напоминания, ожидающие отправки",
+               lambda: {(): reminders.scheduled()})
+
+# Отрисованные списки событий /events для листания страниц без запросов к календарю
+event_pages = EventPagesCache(ttl=EVENT_PAGES_TTL)
+
+
+class EventsPage(CallbackData, prefix="events"):
+    """Кнопка навигации по списку событий: владелец списка, первый день недели (ГГГГММДД), страница"""
+    user: int
+    week: str
+    page: int
+
+
+async def get_event_pages(user_id: int, start: datetime, refresh: bool = False):
+    """
+    Список событий недели, начинающейся с start, разбитый на страницы
+
+    Сохраненный список используется, пока не истек EVENT_PAGES_TTL; иначе события
+    запрашиваются у менеджера календаря (который сам отвечает из своего кеша, если может).
+
+    :param refresh: Не использовать сохраненный список
+    :return: EventPages или None, если календарь недоступен
+    """
+    pages = None if refresh else event_pages.get(user_id, start)
+    if pages is not None:
+        return pages
+    calendar_manager = await get_calendar_manager(user_id)
+    if not calendar_manager:
+        return None
+    end = start + timedelta(days=7)
+    pages = EventPages(start, end, await calendar_manager.list_events(start, end, raise_errors=True))
+    event_pages.put(user_id, pages)
+    return pages
+
+
+def events_text(pages: EventPages, page: int) -> str:
+    """Текст страницы списка событий с заголовком периода"""
+    if pages.start == datetime.now().replace(hour=0, minute=0, second=0, microsecond=0):
+        period = "на ближайшую неделю"
+    else:
+        period = f"с {pages.start:%d.%m.%Y} по {pages.end - timedelta(days=1):%d.%m.%Y}"
+    if not len(pages):
+        return f"Событий {period} не запланировано."
+    return pages.render(page, f"События {period}:")
+
+
+def events_keyboard(user_id: int, pages: EventPages, page: int) -> InlineKeyboardMarkup:
+    """Кнопки листания страниц и соседних недель"""
+    builder = InlineKeyboardBuilder()
+    week = f"{pages.start:%Y%m%d}"
+    if len(pages) > 1:
+        builder.button(text="‹", callback_data=EventsPage(user=user_id, week=week, page=max(page - 1, 0)))
+        builder.button(text=f"{page + 1}/{len(pages)}", callback_data=EventsPage(user=user_id, week=week, page=page))
+        builder.button(text="›", callback_data=EventsPage(user=user_id, week=week,
+                                                           page=min(page + 1, len(pages) - 1)))
+    for text, days in (("◀ Неделя", -7), ("Неделя ▶", 7)):
+        builder.button(text=text, callback_data=EventsPage(
+            user=user_id, week=f"{pages.start + timedelta(days=days):%Y%m%d}", page=0))
+    if len(pages) > 1:
+        builder.adjust(3, 2)
+    else:
+        builder.adjust(2)
+    return builder.as_markup()
+
+
+async def has_conflict(user_id: int, start_time: datetime, end_time: datetime) -> bool:
+    """
+    Проверка, занято ли время в календаре пользователя
+
+    :return: True если период пересекается с другими событиями; False также
+        при недоступном календаре (проверка не мешает добавлению события)
+    """
+    calendar_manager = await get_calendar_manager(user_id)
+    if not calendar_manager:
+        return False
+    busy = await calendar_manager.busy(start_time, end_time)
+    return busy is not None and busy.is_busy(start_time, end_time)
+
+def format_period(start: datetime, end: datetime) -> str:
+    """Период события для ответа пользователю: 07.03.2024 15:00-16:00"""
+    if start.date() == end.date():
+        return f"{start:%d.%m.%Y %H:%M}-{end:%H:%M}"
+    return f"{start:%d.%m.%Y %H:%M} - {end:%d.%m.%Y %H:%M}"
+
+async def queue_event(message: Message, event: ParsedEvent) -> None:
+    """
+    Постановка события в очередь записи в календарь и ответ пользователю
+
+    Пользователь получает ответ сразу после сохранения события в локальной очереди,
+    запись на сервер выполняется в фоне с повторными попытками. Перед постановкой в очередь
+    проверяется, не занято ли это время другими событиями.
+    """
+    # Проверка завершается до постановки в очередь: фоновая запись могла бы успеть добавить
+    # событие в календарь, и оно пересекалось бы само с собой
+    try:
+        conflict = await asyncio.wait_for(has_conflict(message.from_user.id, event.start, event.end),
+                                          CONFLICT_CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        conflict = False
+    uid = await write_queue.enqueue(message.from_user.id, message.chat.id, event.summary,
+                                    event.start, event.end, event.rrule)
+
+    response = f"Событие '{event.summary}' ({format_period(event.start, event.end)}) принято и будет добавлено в календарь."
+    if event.rrule:
+        response += f"\nПовторяется {describe_rrule(event.rrule)}."
+    if conflict:
+        response += (f"\nВнимание: в это время в календаре уже есть другие события. "
+                     f"Свободное время: /free {event.start:%Y-%m-%d}")
+    await message.answer(response)
+
+    # Напоминание о новом событии планируется сразу, не дожидаясь обновления расписания
+    try:
+        await reminders.add(message.from_user.id, event.summary, event.start, uid)
+    except Exception as e:
+        logging.warning(f"Не удалось запланировать напоминание о событии {event.summary}: {e}")
+
+def parse_event_lines(text: str) -> tuple:
+    """
+    Разбор списка событий, по одному в строке: [название] [дата] [время]
+
+    Название может состоять из нескольких слов, дата и время - последние два слова строки.
+
+    :return: Кортеж (список событий (название, начало), список номеров строк с ошибками)
+    """
+    events = []
+    errors = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) < 3:
+            errors.append(number)
+            continue
+        try:
+            start_time = datetime.strptime(f"{parts[-2]} {parts[-1]}", "%Y-%m-%d %H:%M")
+        except ValueError:
+            errors.append(number)
+            continue
+        events.append((" ".join(parts[:-2]), start_time))
+    return events, errors
+
+
+async def add_events_and_report(message: Message, calendar_manager, events: list, errors: list) -> None:
+    """Массовое добавление событий и отправка итогового отчета пользователю"""
+    if len(events) > MAX_BULK_EVENTS:
+        await message.answer(f"Слишком много событий: {len(events)}. За один раз можно добавить не больше {MAX_BULK_EVENTS}.")
+        return
+
+    await message.answer(f"Добавляю событий: {len(events)}...")
+    results = await calendar_manager.add_events(events)
+
+    added = sum(1 for result in results if result)
+    response = f"Добавлено событий: {added} из {len(events)}."
+    failed = [event[0] for event, result in zip(events, results) if not result]
+    if failed:
+        response += "\nНе удалось добавить: " + ", ".join(failed[:20])
+        if len(failed) > 20:
+            response += f" и еще {len(failed) - 20}"
+    if errors:
+        response += "\nПропущены строки с неверным форматом: " + ", ".join(map(str, errors[:20]))
+    await message.answer(response)
 
 @router.message(Command("start"))
 async def command_start_handler(message: Message) -> None:
@@ -27,6 +290,11 @@ async def command_start_handler(message: Message) -> None:
             f"Я бот для работы с календарем. Вот что я умею:\n"
             f"- /events - Показать события на неделю\n"
             f"- /add_event [название] [дата] [время] - Добавить событие\n"
+            f"- /add_events - Добавить несколько событий сразу\n"
+            f"- /free - Показать свободное время\n"
+            f"- /remind - Напоминать о событиях\n"
+            f"- /calendars - Выбрать календарь\n"
+            f"- /connect - Подключить личный календарь\n"
             f"- /help - Показать справку\n"
         )
     except Exception as e:
@@ -46,104 +314,402 @@ async def command_help_handler(message: Message) -> None:
             "/help - Показать это сообщение помощи\n"
             "/events - Показать события на неделю\n"
             "/add_event [название] [дата] [время] - Добавить событие\n"
+            "/add_events - Добавить несколько событий, по одному в строке, или из .ics файла\n"
+            "/free [дата] [минут] - Показать свободные окна рабочего дня\n"
+            "/remind [минут] - Напоминать о событиях за указанное время, /remind off - отключить\n"
+            "/calendars - Показать доступные календари\n"
+            "/use_calendar [номер] - Выбрать календарь\n"
+            "/connect [сервер] [пользователь] [пароль] - Подключить личный календарь\n"
+            "/disconnect - Вернуться к общему календарю\n"
             "\nПример добавления события:\n"
-            "/add_event Встреча 2024-03-07 15:00"
+            "/add_event Встреча 2024-03-07 15:00\n"
+            "\nСобытие можно описать и обычным сообщением:\n"
+            "встреча с командой завтра в 15:00 на 2 часа\n"
+            "планерка по понедельникам в 10:00\n"
+            "\nПример добавления нескольких событий:\n"
+            "/add_events\n"
+            "Открытие конференции 2024-03-07 10:00\n"
+            "Доклад 2024-03-07 11:30"
         )
         await message.answer(help_text)
     except Exception as e:
         await message.answer("Извините, произошла ошибка при показе справки.")
         logging.error(f"Ошибка в обработчике help: {e}")
 
-@router.message(Command("events"))
+@router.message(Command("events"), flags={"calendar": True})
 async def command_events_handler(message: Message) -> None:
     """
     Обработчик команды /events
     Показывает список событий на ближайшую неделю
-    """
-    if not calendar_manager or not calendar_manager.connected:
-        await message.answer("Извините, календарь в данный момент недоступен. Пожалуйста, проверьте настройки CalDAV или попробуйте позже.")
-        return
 
+    Длинный список разбивается на страницы по размеру сообщения Telegram;
+    кнопки под сообщением листают страницы и недели.
+    """
     try:
-        events = await calendar_manager.list_events()
-        if not events:
-            await message.answer("На ближайшую неделю событий не запланировано.")
+        user_id = message.from_user.id
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        pages = await get_event_pages(user_id, start, refresh=True)
+        if pages is None:
+            await message.answer("Извините, календарь в данный момент недоступен. Пожалуйста, проверьте настройки CalDAV или попробуйте позже.")
             return
 
-        response = "События на ближайшую неделю:\n\n"
-        for event in events:
-            start_time = event['start'].strftime("%d.%m.%Y %H:%M")
-            response += f"📅 {event['summary']} - {start_time}\n"
-
-        await message.answer(response)
+        await message.answer(events_text(pages, 0), reply_markup=events_keyboard(user_id, pages, 0))
     except Exception as e:
         await message.answer("Извините, произошла ошибка при получении списка событий.")
         logging.error(f"Ошибка в обработчике events: {e}")
 
-@router.message(Command("add_event"))
-async def command_add_event_handler(message: Message) -> None:
+@router.callback_query(EventsPage.filter(), flags={"calendar": True})
+async def events_page_handler(callback: CallbackQuery, callback_data: EventsPage) -> None:
     """
-    Обработчик команды /add_event
-    Добавляет новое событие в календарь
+    Обработчик кнопок списка событий
+    Показывает другую страницу или неделю, редактируя то же сообщение
+
+    Страницы уже полученного списка берутся из кеша без запросов к календарю.
     """
-    if not calendar_manager or not calendar_manager.connected:
-        await message.answer("Извините, календарь в данный момент недоступен. Пожалуйста, проверьте настройки CalDAV или попробуйте позже.")
+    if callback_data.user != callback.from_user.id:
+        await callback.answer("Это список событий другого пользователя. Ваш список: /events")
         return
+    if not isinstance(callback.message, Message):
+        await callback.answer("Сообщение устарело. Откройте список заново: /events")
+        return
+
+    try:
+        start = datetime.strptime(callback_data.week, "%Y%m%d")
+        pages = await get_event_pages(callback_data.user, start)
+        if pages is None:
+            await callback.answer("Календарь в данный момент недоступен. Попробуйте позже.")
+            return
+
+        page = min(callback_data.page, max(len(pages) - 1, 0))
+        try:
+            await callback.message.edit_text(events_text(pages, page),
+                                             reply_markup=events_keyboard(callback_data.user, pages, page))
+        except TelegramBadRequest as e:
+            # Нажата кнопка текущей страницы - содержимое сообщения не изменилось
+            if "message is not modified" not in str(e):
+                raise
+        await callback.answer()
+    except Exception as e:
+        logging.error(f"Ошибка в обработчике страниц событий: {e}")
+        await callback.answer("Извините, произошла ошибка при получении списка событий.")
+
+@router.message(Command("add_event"), flags={"calendar": True})
+async def command_add_event_handler(message: Message) -> None:
+    """
+    Обработчик команды /add_event
+    Ставит новое событие в очередь записи в календарь
 
+    Событие описывается в формате [название] [дата] [время] или обычным текстом.
+    Если запись на сервер удалась не с первой попытки или не удалась совсем,
+    бот сообщает об этом отдельно.
+    """
     try:
-        # Парсинг аргументов команды
-        args = message.text.split()[1:]  # Пропускаем саму команду
-        if len(args) < 3:
+        # Описание события после команды: строгий формат или обычный текст
+        text = message.text.partition(" ")[2].strip()
+        event = parse_event(text) if text else None
+        if event is None:
             await message.answer(
                 "Пожалуйста, укажите название события, дату и время.\n"
-                "Пример: /add_event Встреча 2024-03-07 15:00"
+                "Примеры:\n"
+                "/add_event Встреча 2024-03-07 15:00\n"
+                "/add_event встреча с командой завтра в 15:00 на 2 часа"
             )
             return
 
-        summary = args[0]
+        await queue_event(message, event)
+
+    except Exception as e:
+        logging.error(f"Ошибка в обработчике add_event: {e}")
+        await message.answer("Извините, произошла ошибка при добавлении события. Пожалуйста, убедитесь, что формат команды верный и попробуйте снова.")
+
+@router.message(Command("free"), flags={"calendar": True})
+async def command_free_handler(message: Message) -> None:
+    """
+    Обработчик команды /free
+    Показывает свободные окна рабочего дня
+    """
+    calendar_manager = await get_calendar_manager(message.from_user.id)
+    if not calendar_manager:
+        await message.answer("Извините, календарь в данный момент недоступен. Пожалуйста, проверьте настройки CalDAV или попробуйте позже.")
+        return
+
+    try:
+        args = (message.text or "").split()[1:]
+        now = datetime.now()
         try:
-            start_time = datetime.strptime(f"{args[1]} {args[2]}", "%Y-%m-%d %H:%M")
+            day = datetime.strptime(args[0], "%Y-%m-%d").date() if args else now.date()
+            minutes = int(args[1]) if len(args) > 1 else DEFAULT_FREE_MINUTES
+            if minutes <= 0 or len(args) > 2:
+                raise ValueError
         except ValueError:
             await message.answer(
-                "Неверный формат даты или времени.\n"
-                "Используйте формат: ГГГГ-ММ-ДД ЧЧ:ММ"
+                "Пожалуйста, укажите дату и, при необходимости, минимальную длительность окна в минутах.\n"
+                "Пример: /free 2024-03-07 60"
             )
             return
 
-        # Добавление события в календарь
-        await message.answer(f"Добавляю событие '{summary}'...")
-        success = await calendar_manager.add_event(summary, start_time)
+        day_start = max(datetime.combine(day, WORKDAY_START), now)
+        day_end = datetime.combine(day, WORKDAY_END)
+        if day_start >= day_end:
+            await message.answer(f"Рабочее время {day:%d.%m.%Y} уже закончилось.")
+            return
+
+        busy = await calendar_manager.busy(day_start, day_end)
+        if busy is None:
+            await message.answer("Извините, не удалось получить занятость календаря.")
+            return
 
-        if success:
-            # Проверяем наличие события в списке
-            events = await calendar_manager.list_events(
-                start_date=start_time,
-                end_date=start_time + timedelta(hours=1)
-            )
-            if any(event['summary'] == summary for event in events):
-                await message.answer(f"Событие '{summary}' успешно добавлено и подтверждено в календаре.")
+        periods = busy.free_periods(day_start, day_end, timedelta(minutes=minutes))
+        if not periods:
+            await message.answer(f"{day:%d.%m.%Y} нет свободных окон от {minutes} минут.")
+            return
+
+        response = f"Свободное время {day:%d.%m.%Y} (окна от {minutes} минут):\n\n"
+        for period_start, period_end in periods:
+            response += f"🟢 {period_start:%H:%M} - {period_end:%H:%M}\n"
+        await message.answer(response)
+    except Exception as e:
+        await message.answer("Извините, произошла ошибка при поиске свободного времени.")
+        logging.error(f"Ошибка в обработчике free: {e}")
+
+@router.message(Command("remind"))
+async def command_remind_handler(message: Message) -> None:
+    """
+    Обработчик команды /remind
+    Включает напоминания о событиях календаря, меняет время напоминания или отключает их
+    """
+    try:
+        args = (message.text or "").split()[1:]
+        if args and args[0].lower() in ("off", "выкл", "нет"):
+            if await reminders.unsubscribe(message.from_user.id):
+                await message.answer("Напоминания о событиях отключены.")
             else:
-                await message.answer(f"Событие '{summary}' было добавлено, но его не видно в календаре. Пожалуйста, проверьте календарь напрямую или попробуйте снова.")
-        else:
-            await message.answer("Произошла ошибка при добавлении события в календарь. Пожалуйста, повторите попытку позже.")
+                await message.answer("Напоминания не были включены.")
+            return
+
+        if len(args) > 1 or (args and not (args[0].isdigit() and 1 <= int(args[0]) <= MAX_REMINDER_MINUTES)):
+            await message.answer(
+                f"Пожалуйста, укажите, за сколько минут до начала события напоминать (от 1 до {MAX_REMINDER_MINUTES}).\n"
+                "Пример: /remind 30\n"
+                "Отключить напоминания: /remind off"
+            )
+            return
 
+        minutes = int(args[0]) if args else await reminders.subscription(message.from_user.id)
+        minutes = await reminders.subscribe(message.from_user.id, message.chat.id, minutes)
+        await message.answer(
+            f"Напоминания включены: за {minutes} мин. до начала каждого события.\n"
+            "Изменить время: /remind [минут], отключить: /remind off"
+        )
     except Exception as e:
-        logging.error(f"Ошибка в обработчике add_event: {e}")
-        await message.answer("Извините, произошла ошибка при добавлении события. Пожалуйста, убедитесь, что формат команды верный и попробуйте снова.")
+        await message.answer("Извините, произошла ошибка при настройке напоминаний.")
+        logging.error(f"Ошибка в обработчике remind: {e}")
+
+@router.message(Command("add_events"), flags={"calendar": True})
+async def command_add_events_handler(message: Message) -> None:
+    """
+    Обработчик команды /add_events
+    Добавляет несколько событий: по одному в строке после команды
+    или из приложенного .ics файла
+    """
+    calendar_manager = await get_calendar_manager(message.from_user.id)
+    if not calendar_manager:
+        await message.answer("Извините, календарь в данный момент недоступен. Пожалуйста, проверьте настройки CalDAV или попробуйте позже.")
+        return
+
+    if message.document:
+        await ics_document_handler(message)
+        return
+
+    try:
+        text = (message.text or "").partition("\n")[2]
+        events, errors = parse_event_lines(text)
+        if not events:
+            await message.answer(
+                "Пожалуйста, укажите события, по одному в строке после команды, или приложите .ics файл.\n"
+                "Пример:\n"
+                "/add_events\n"
+                "Открытие конференции 2024-03-07 10:00\n"
+                "Доклад 2024-03-07 11:30"
+            )
+            return
+
+        await add_events_and_report(message, calendar_manager, events, errors)
+    except Exception as e:
+        logging.error(f"Ошибка в обработчике add_events: {e}")
+        await message.answer("Извините, произошла ошибка при добавлении событий. Пожалуйста, попробуйте снова.")
+
+@router.message(F.document.file_name.lower().endswith(".ics"), F.chat.type == "private", flags={"calendar": True})
+async def ics_document_handler(message: Message) -> None:
+    """
+    Обработчик .ics файлов
+    Добавляет в календарь все события из приложенного файла.
+    В группах файл импортируется только с подписью /add_events
+    """
+    calendar_manager = await get_calendar_manager(message.from_user.id)
+    if not calendar_manager:
+        await message.answer("Извините, календарь в данный момент недоступен. Пожалуйста, проверьте настройки CalDAV или попробуйте позже.")
+        return
+
+    try:
+        if message.document.file_size and message.document.file_size > MAX_ICS_FILE_SIZE:
+            await message.answer("Файл слишком большой. Максимальный размер .ics файла - 2 МБ.")
+            return
+
+        buffer = await message.bot.download(message.document, destination=BytesIO())
+        try:
+            events = calendar_utils.parse_ics(buffer.getvalue().decode("utf-8"))
+        except Exception as e:
+            logging.error(f"Ошибка разбора .ics файла: {e}")
+            await message.answer("Не удалось прочитать .ics файл. Убедитесь, что это корректный файл календаря.")
+            return
+
+        if not events:
+            await message.answer("В файле не найдено событий.")
+            return
+
+        await add_events_and_report(message, calendar_manager, events, [])
+    except Exception as e:
+        logging.error(f"Ошибка в обработчике .ics файла: {e}")
+        await message.answer("Извините, произошла ошибка при импорте файла. Пожалуйста, попробуйте снова.")
 
-@router.message(F.text)
-async def echo_handler(message: Message) -> None:
+@router.message(Command("connect"), flags={"calendar": True})
+async def command_connect_handler(message: Message) -> None:
     """
-    Обработчик текстовых сообщений
-    Повторяет полученное сообщение обратно пользователю
+    Обработчик команды /connect
+    Подключает личную учетную запись CalDAV пользователя
     """
+    args = (message.text or "").split()[1:]
+    # Сообщение содержит пароль, поэтому удаляем его из чата
+    try:
+        await message.delete()
+    except Exception as e:
+        logging.warning(f"Не удалось удалить сообщение с паролем: {e}")
+
+    if len(args) != 3:
+        await message.answer(
+            "Пожалуйста, укажите адрес CalDAV сервера, имя пользователя и пароль.\n"
+            "Пример: /connect https://caldav.example.com/ user@example.com пароль_приложения"
+        )
+        return
+
     try:
+        url, username, password = args
+        try:
+            await calendar_utils.check_server_url(url)
+        except ValueError as e:
+            await message.answer(str(e))
+            return
+
+        await message.answer("Проверяю подключение к календарю...")
+        # Менеджер попадает в пул и учетная запись сохраняется только после успешного подключения
+        manager = calendar_utils.CalendarManager(url, username, password, restricted=True)
+        if not await manager.connect():
+            await manager.close()
+            await message.answer("Не удалось подключиться к календарю. Проверьте адрес сервера, имя пользователя и пароль.")
+            return
+
+        await calendar_pool.put(manager)
+        accounts.set_account(message.from_user.id, url, username, password)
         await message.answer(
-            f"Вы сказали: {message.text}"
+            "Личный календарь подключен. Используется календарь по умолчанию.\n"
+            "Список календарей: /calendars"
         )
+    except Exception as e:
+        logging.error(f"Ошибка в обработчике connect: {e}")
+        await message.answer("Извините, произошла ошибка при подключении календаря. Пожалуйста, попробуйте снова.")
+
+@router.message(Command("disconnect"))
+async def command_disconnect_handler(message: Message) -> None:
+    """
+    Обработчик команды /disconnect
+    Удаляет личную учетную запись и выбор календаря пользователя
+    """
+    try:
+        if accounts.remove(message.from_user.id):
+            await message.answer("Личные настройки календаря удалены, используется общий календарь.")
+        else:
+            await message.answer("Личный календарь не был подключен.")
+    except Exception as e:
+        logging.error(f"Ошибка в обработчике disconnect: {e}")
+        await message.answer("Извините, произошла ошибка при удалении настроек календаря.")
+
+@router.message(Command("calendars"), flags={"calendar": True})
+async def command_calendars_handler(message: Message) -> None:
+    """
+    Обработчик команды /calendars
+    Показывает календари учетной записи пользователя
+    """
+    calendar_manager = await get_calendar_manager(message.from_user.id)
+    if not calendar_manager:
+        await message.answer("Извините, календарь в данный момент недоступен. Пожалуйста, проверьте настройки CalDAV или попробуйте позже.")
+        return
+
+    try:
+        calendars = await calendar_manager.list_calendars()
+        if not calendars:
+            await message.answer("Не удалось получить список календарей.")
+            return
+
+        current = str(calendar_manager.calendar.url)
+        response = "Доступные календари:\n\n"
+        for number, (name, url) in enumerate(calendars, start=1):
+            mark = " ✅" if url == current else ""
+            response += f"{number}. {name}{mark}\n"
+        response += "\nВыбрать календарь: /use_calendar [номер]"
+        await message.answer(response)
+    except Exception as e:
+        logging.error(f"Ошибка в обработчике calendars: {e}")
+        await message.answer("Извините, произошла ошибка при получении списка календарей.")
+
+@router.message(Command("use_calendar"), flags={"calendar": True})
+async def command_use_calendar_handler(message: Message) -> None:
+    """
+    Обработчик команды /use_calendar
+    Выбирает календарь для команд пользователя
+    """
+    calendar_manager = await get_calendar_manager(message.from_user.id)
+    if not calendar_manager:
+        await message.answer("Извините, календарь в данный момент недоступен. Пожалуйста, проверьте настройки CalDAV или попробуйте позже.")
+        return
+
+    try:
+        args = (message.text or "").split()[1:]
+        calendars = await calendar_manager.list_calendars()
+        if len(args) != 1 or not args[0].isdigit() or not 1 <= int(args[0]) <= len(calendars):
+            await message.answer("Пожалуйста, укажите номер календаря из списка /calendars.\nПример: /use_calendar 2")
+            return
+
+        name, url = calendars[int(args[0]) - 1]
+        accounts.set_calendar(message.from_user.id, url)
+        await message.answer(f"Выбран календарь: {name}")
+    except Exception as e:
+        logging.error(f"Ошибка в обработчике use_calendar: {e}")
+        await message.answer("Извините, произошла ошибка при выборе календаря.")
+
+@router.message(F.text, F.chat.type == "private", flags={"calendar": True})
+async def text_event_handler(message: Message) -> None:
+    """
+    Обработчик текстовых сообщений в личном чате
+    Добавляет событие, описанное обычным текстом: "встреча с командой завтра в 15:00 на 2 часа"
+    """
+    try:
+        if message.text.startswith("/"):
+            await message.answer("Неизвестная команда. Список команд: /help")
+            return
+
+        event = parse_event(message.text)
+        if event is None:
+            await message.answer(
+                "Не удалось найти в сообщении время события.\n"
+                "Пример: встреча с командой завтра в 15:00 на 2 часа"
+            )
+            return
+
+        await queue_event(message, event)
     except Exception as e:
         await message.answer("Извините, я не смог обработать ваше сообщение.")
-        logging.error(f"Ошибка в обработчике echo: {e}")
+        logging.error(f"Ошибка в обработчике текста: {e}")
 
 @router.error()
 async def error_handler(event, error) -> None:
@@ -0,0 +1,221 @@
+import re
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Свойства, при наличии которых объект разбирается полным парсером (vobject):
+# повторения требуют построения набора правил
+COMPLEX_PROPERTIES = frozenset(("RRULE", "RDATE", "EXDATE", "EXRULE", "RECURRENCE-ID"))
+
+_DURATION_RE = re.compile(
+    r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$"
+)
+_UNESCAPE_RE = re.compile(r"\\([\\;,nN])")
+_UNESCAPED = {'\\': '\\', ';': ';', ',': ',', 'n': '\n', 'N': '\n'}
+
+# Часовые пояса по TZID; None - пояс неизвестен zoneinfo
+_zones = {}
+
+
+class NeedsFullParser(ValueError):
+    """Объект содержит конструкции, которые быстрый парсер не обрабатывает"""
+
+
+class VEventRecord:
+    """
+    Компактная запись VEVENT: только свойства, нужные для отображения
+
+    :param summary: Название (SUMMARY)
+    :param start: Начало (DTSTART)
+    :param end: Окончание (DTEND) или None
+    :param duration: Длительность (DURATION) или None
+    """
+
+    __slots__ = ("summary", "start", "end", "duration")
+
+    def __init__(self, summary=None, start=None, end=None, duration=None):
+        self.summary = summary
+        self.start = start
+        self.end = end
+        self.duration = duration
+
+
+def _unfold(text: str):
+    """Строки содержимого с объединенными продолжениями (RFC 5545, 3.1)"""
+    current = None
+    for line in text.splitlines():
+        if line[:1] in (" ", "\t"):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _split_line(line: str):
+    """
+    Разбор строки содержимого на имя, параметры и значение
+
+    :return: Кортеж (ИМЯ, {ПАРАМЕТР: значение}, значение)
+    """
+    # Двоеточие внутри кавычек в значении параметра не отделяет значение свойства
+    if '"' in line:
+        quoted = False
+        for index, char in enumerate(line):
+            if char == '"':
+                quoted = not quoted
+            elif char == ":" and not quoted:
+                break
+        else:
+            raise NeedsFullParser(f"Нет значения в строке {line!r}")
+    else:
+        index = line.find(":")
+        if index < 0:
+            raise NeedsFullParser(f"Нет значения в строке {line!r}")
+    head, value = line[:index], line[index + 1:]
+    if ";" not in head:
+        return head.upper(), None, value
+    name, *params = head.split(";")
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition("=")
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), parameters, value
+
+
+def _zone(tzid: str):
+    if tzid not in _zones:
+        try:
+            _zones[tzid] = ZoneInfo(tzid)
+        except (ZoneInfoNotFoundError, ValueError):
+            _zones[tzid] = None
+    zone = _zones[tzid]
+    if zone is None:
+        raise NeedsFullParser(f"Неизвестный часовой пояс {tzid}")
+    return zone
+
+
+def parse_date_time(value: str, parameters: dict = None):
+    """
+    Разбор значения DATE или DATE-TIME
+
+    :return: date; datetime в UTC (суффикс Z), в поясе TZID или наивный (плавающее время)
+    """
+    if len(value) == 8 or (parameters and parameters.get('VALUE') == "DATE"):
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    if len(value) < 15 or value[8] != "T":
+        raise NeedsFullParser(f"Неизвестный формат даты {value!r}")
+    result = datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                      int(value[9:11]), int(value[11:13]), int(value[13:15]))
+    if value.endswith("Z"):
+        return result.replace(tzinfo=timezone.utc)
+    if parameters and 'TZID' in parameters:
+        return result.replace(tzinfo=_zone(parameters['TZID']))
+    return result
+
+
+def parse_duration(value: str) -> timedelta:
+    """Разбор значения DURATION (например, PT1H30M или -P1D)"""
+    match = _DURATION_RE.match(value.strip())
+    if not match:
+        raise NeedsFullParser(f"Неизвестный формат длительности {value!r}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    result = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                       minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -result if sign == "-" else result
+
+
+def unescape_text(value: str) -> str:
+    """Снятие экранирования значения TEXT"""
+    if "\\" not in value:
+        return value
+    return _UNESCAPE_RE.sub(lambda match: _UNESCAPED[match.group(1)], value)
+
+
+def parse_vevents(text: str) -> list:
+    """
+    Быстрое извлечение событий из iCalendar текста без построения дерева компонентов
+
+    Читаются только SUMMARY, DTSTART, DTEND и DURATION компонентов VEVENT,
+    вложенные компоненты (VALARM) и VTIMEZONE пропускаются, часовые пояса
+    берутся из базы zoneinfo по TZID.
+
+    :param text: Содержимое объекта календаря или .ics файла
+    :return: Список VEventRecord
+    :raises NeedsFullParser: Объект содержит повторения, неизвестный часовой пояс
+        или нестандартные значения - нужен полный разбор через vobject
+    """
+    records = []
+    record = None
+    # Глубина вложенности компонентов внутри VEVENT (VALARM и т.п.)
+    nested = 0
+    for line in _unfold(text):
+        if not line:
+            continue
+        if line[:6].upper() == "BEGIN:":
+            component = line[6:].strip().upper()
+            if record is not None:
+                nested += 1
+            elif component == "VEVENT":
+                record = VEventRecord()
+            continue
+        if line[:4].upper() == "END:":
+            if record is not None:
+                if nested:
+                    nested -= 1
+                elif line[4:].strip().upper() == "VEVENT":
+                    if record.start is None:
+                        raise NeedsFullParser("VEVENT без DTSTART")
+                    records.append(record)
+                    record = None
+            continue
+        if record is None or nested:
+            continue
+
+        name, parameters, value = _split_line(line)
+        if name == "SUMMARY":
+            record.summary = unescape_text(value)
+        elif name == "DTSTART":
+            record.start = parse_date_time(value, parameters)
+        elif name == "DTEND":
+            record.end = parse_date_time(value, parameters)
+        elif name == "DURATION":
+            record.duration = parse_duration(value)
+        elif name in COMPLEX_PROPERTIES:
+            raise NeedsFullParser(f"Свойство {name} требует полного разбора")
+
+    if record is not None:
+        raise NeedsFullParser("Незавершенный компонент VEVENT")
+    return records
+
+
+def parse_freebusy(text: str) -> list:
+    """
+    Занятые периоды из ответа free-busy-query (VFREEBUSY)
+
+    Учитываются свойства FREEBUSY с типом BUSY, BUSY-TENTATIVE и BUSY-UNAVAILABLE
+    (по умолчанию BUSY); период задается началом и окончанием или началом и длительностью.
+
+    :param text: Содержимое VCALENDAR с компонентом VFREEBUSY
+    :return: Список пар (начало, окончание)
+    :raises NeedsFullParser: Неизвестный формат значения
+    """
+    periods = []
+    for line in _unfold(text):
+        if line[:8].upper() != "FREEBUSY":
+            continue
+        name, parameters, value = _split_line(line)
+        if name != "FREEBUSY":
+            continue
+        if parameters and parameters.get('FBTYPE', "BUSY").upper() == "FREE":
+            continue
+        for period in value.split(","):
+            start, _, finish = period.strip().partition("/")
+            start = parse_date_time(start)
+            if finish[:1] in ("P", "+", "-"):
+                periods.append((start, start + parse_duration(finish)))
+            else:
+                periods.append((start, parse_date_time(finish)))
+    return periods
@@ -4,9 +4,14 @@ import sys
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 import config
 from handlers import router
+from metrics import MetricsServer
+from middlewares import TelegramRateLimitMiddleware
+from webhook import run_webhook, run_workers
 
 # Настройка расширенного логирования
 logging.basicConfig(
@@ -28,14 +33,18 @@ if not logger.handlers:
     ))
     logger.addHandler(handler)
 
-async def main() -> None:
+async def main(worker: int = 0) -> None:
     """
     Основная функция запуска бота
+
+    :param worker: Номер процесса при запуске нескольких процессов вебхука
     """
+    metrics_server = None
     try:
         logging.info("=============================================")
         logging.info("Инициализация бота...")
-        logging.info(f"Уровень логирования: {config.LOG_LEVEL}")
+        logging.info("Уровень логирования: %s", config.LOG_LEVEL)
+        logging.info("Режим получения обновлений: %s", config.RUN_MODE)
 
         # Проверка наличия токена
         if not config.BOT_TOKEN:
@@ -44,10 +53,16 @@ async def main() -> None:
 
         # Инициализация бота и диспетчера
         logging.info("Создание экземпляра бота...")
+        session = None
+        if config.TELEGRAM_API_URL:
+            session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
         bot = Bot(
             token=config.BOT_TOKEN,
+            session=session,
             default=DefaultBotProperties(parse_mode=ParseMode.HTML)
         )
+        # Ограничение частоты исходящих сообщений, чтобы не попасть под flood control Telegram
+        bot.session.middleware(TelegramRateLimitMiddleware())
 
         logging.info("Создание диспетчера...")
         dp = Dispatcher()
@@ -56,34 +71,56 @@ async def main() -> None:
         logging.info("Регистрация обработчиков сообщений...")
         dp.include_router(router)
 
+        # Запуск сервера метрик
+        if config.METRICS_PORT:
+            metrics_server = MetricsServer(config.METRICS_HOST, config.METRICS_PORT + worker)
+            await metrics_server.start()
+
         # Получение информации о боте
         bot_info = await bot.get_me()
-        logging.info(f"Бот успешно инициализирован: @{bot_info.username} ({bot_info.first_name})")
+        logging.info("Бот успешно инициализирован: @%s (%s)", bot_info.username, bot_info.first_name)
 
-        # Удаление вебхука
-        logging.info("Удаление старых вебхуков...")
-        await bot.delete_webhook(drop_pending_updates=True)
-        logging.info("Вебхуки успешно удалены")
+        if config.RUN_MODE == "webhook":
+            # Запуск HTTP сервера для приема обновлений от Telegram
+            await run_webhook(bot, dp, worker)
+        else:
+            # Удаление вебхука
+            logging.info("Удаление старых вебхуков...")
+            await bot.delete_webhook(drop_pending_updates=True)
+            logging.info("Вебхуки успешно удалены")
 
-        # Запуск процесса получения обновлений
-        logging.info("Запуск получения обновлений...")
-        await dp.start_polling(bot)
+            # Запуск процесса получения обновлений
+            logging.info("Запуск получения обновлений...")
+            await dp.start_polling(bot)
 
     except Exception as e:
-        logging.error(f"Критическая ошибка при запуске бота: {e}")
+        logging.error("Критическая ошибка при запуске бота: %s", e)
         logging.exception("Подробная информация об ошибке:")
         sys.exit(1)
     finally:
+        if metrics_server:
+            await metrics_server.stop()
         logging.info("Бот остановлен")
         logging.info("=============================================")
 
+def run_worker(worker: int) -> None:
+    """Запуск одного процесса вебхука"""
+    try:
+        asyncio.run(main(worker))
+    except KeyboardInterrupt:
+        pass
+
 if __name__ == "__main__":
     try:
         logging.info("Запуск асинхронного цикла событий...")
-        asyncio.run(main())
+        if config.RUN_MODE == "webhook" and config.WEBHOOK_WORKERS > 1:
+            logging.info("Запуск %d процессов вебхука...", config.WEBHOOK_WORKERS)
+            run_workers(run_worker, config.WEBHOOK_WORKERS)
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logging.info("Бот остановлен пользователем (KeyboardInterrupt)")
     except Exception as e:
-        logging.error(f"Непредвиденная ошибка в главном цикле: {e}")
+        logging.error("Непредвиденная ошибка в главном цикле: %s", e)
         logging.exception("Подробная информация об ошибке:")
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,122 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+import calendar_utils
+from config import (
+    COMMAND_RATE_LIMIT, COMMAND_CHAT_RATE_LIMIT, COMMAND_CHAT_BURST, COMMAND_MAX_WAIT,
+    TELEGRAM_RATE_LIMIT, TELEGRAM_CHAT_RATE_LIMIT, TELEGRAM_CHAT_BURST, TELEGRAM_GROUP_RATE_LIMIT
+)
+from metrics import CallbackMetric, Histogram
+from ratelimit import RateLimiter, current_chat_id
+
+# Ограничение частоты команд, обращающихся к календарю
+command_limiter = RateLimiter(COMMAND_RATE_LIMIT, COMMAND_CHAT_RATE_LIMIT, chat_burst=COMMAND_CHAT_BURST,
+                              max_wait=COMMAND_MAX_WAIT)
+
+# Ограничение частоты отправки сообщений в Telegram. Сообщения не отбрасываются, а ждут очереди
+telegram_limiter = RateLimiter(TELEGRAM_RATE_LIMIT, TELEGRAM_CHAT_RATE_LIMIT, chat_burst=TELEGRAM_CHAT_BURST,
+                               group_rate=TELEGRAM_GROUP_RATE_LIMIT, max_wait=float("inf"))
+
+HANDLER_SECONDS = Histogram("handler_seconds", "Длительность обработки обновлений по обработчикам", labels=("handler",))
+
+THROTTLED_TEXT = "Слишком много запросов к календарю. Пожалуйста, подождите немного и повторите."
+
+
+class CalendarThrottlingMiddleware(BaseMiddleware):
+    """
+    Middleware обработчиков, работающих с календарем
+
+    Запоминает чат текущего обновления (для ограничения запросов к CalDAV из пула потоков)
+    и пропускает обработчики с флагом calendar через ограничитель частоты команд:
+    при небольшом превышении команда ждет, при сильном - отклоняется.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat = data.get("event_chat")
+        chat_id = chat.id if chat else None
+        token = current_chat_id.set(chat_id)
+        try:
+            if get_flag(data, "calendar") and not await command_limiter.acquire(chat_id):
+                logging.info("Команда из чата %s отклонена: превышен лимит запросов", chat_id)
+                # В группах отклоненные команды не получают ответа, чтобы не добавлять сообщений к спаму
+                if isinstance(event, CallbackQuery):
+                    await event.answer(THROTTLED_TEXT)
+                elif isinstance(event, Message) and event.chat.type == "private":
+                    await event.answer(THROTTLED_TEXT)
+                return None
+            return await handler(event, data)
+        finally:
+            current_chat_id.reset(token)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Замер длительности обработчиков
+
+    Метка - имя обработчика без префикса command_ и суффикса _handler
+    (events, add_event, events_page, ics_document, text_event...).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        name = name.removeprefix("command_").removesuffix("_handler")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+
+class TelegramRateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота, ограничивающее частоту исходящих сообщений
+
+    Методы API, адресованные чату (отправка и редактирование сообщений и т.п.),
+    ждут токен в общем ведре и в ведре чата, чтобы не получить от Telegram ошибку flood control.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            await telegram_limiter.acquire(chat_id)
+        return await make_request(bot, method)
+
+
+def stats() -> dict:
+    """Счетчики объединенных, задержанных и отклоненных запросов"""
+    return {
+        'coalesced': calendar_utils.event_queries.stats(),
+        'commands': command_limiter.stats(),
+        'caldav': calendar_utils.caldav_limiter.stats(),
+        'telegram': telegram_limiter.stats(),
+    }
+
+
+def _limiter_samples() -> dict:
+    result = {}
+    for name, counters in stats().items():
+        for counter, value in counters.items():
+            if counter != 'in_flight':
+                result[(name, counter)] = value
+    return result
+
+
+CallbackMetric("rate_limit_requests_total", "Счетчики ограничения и объединения запросов",
+               _limiter_samples, labels=("limiter", "result"), metric_type="counter")
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+# Чат, в рамках обработки сообщения из которого выполняется текущий код.
+# Устанавливается middleware роутера и передается в потоки CalDAV вместе с контекстом.
+current_chat_id: ContextVar = ContextVar("current_chat_id", default=None)
+
+
+class TokenBucket:
+    """
+    Ведро токенов: не более rate операций в секунду с допустимым всплеском capacity
+
+    Токены резервируются заранее (их число может уйти в минус),
+    а вызывающий ждет столько, сколько нужно для пополнения ведра.
+    Синхронизацию обеспечивает владелец ведра (RateLimiter).
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """
+        Резервирование одного токена
+
+        :return: Сколько секунд нужно подождать, прежде чем использовать токен
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def cancel(self) -> None:
+        """Возврат зарезервированного, но не использованного токена"""
+        self.tokens += 1
+
+
+class RateLimiter:
+    """
+    Общее и по-чатовое ограничение частоты операций
+
+    Вызов ждет токены в общем ведре и в ведре своего чата.
+    Если ожидание превышает max_wait, операция отклоняется.
+    Ведра чатов хранятся в LRU словаре ограниченного размера.
+    Ограничитель можно использовать и из цикла событий (acquire),
+    и из потоков пула CalDAV (acquire_sync).
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float = 1,
+                 group_rate: float = None, max_wait: float = 5.0, max_chats: int = 10000):
+        """
+        :param global_rate: Операций в секунду для всех чатов вместе
+        :param chat_rate: Операций в секунду для одного чата
+        :param chat_burst: Допустимый всплеск операций в одном чате
+        :param group_rate: Операций в секунду для группового чата (по умолчанию как для личного)
+        :param max_wait: Максимальное ожидание в секундах, после которого операция отклоняется
+        :param max_chats: Сколько чатов помнить одновременно
+        """
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate or chat_rate
+        self.max_wait = max_wait
+        self.max_chats = max_chats
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.throttled = 0
+        self.dropped = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные идентификаторы и имена (@channel) принадлежат группам и каналам
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def _reserve(self, chat_id, max_wait):
+        """
+        Резервирование токенов для операции
+
+        :return: Время ожидания в секундах или None, если операция отклонена
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            buckets = [self.global_bucket]
+            if chat_id is not None:
+                buckets.append(self._chat_bucket(chat_id))
+
+            delay = max(bucket.reserve() for bucket in buckets)
+            if delay > max_wait:
+                for bucket in buckets:
+                    bucket.cancel()
+                self.dropped += 1
+                return None
+            if delay > 0:
+                self.throttled += 1
+            self.allowed += 1
+            return delay
+
+    async def acquire(self, chat_id: int = None, max_wait: float = None) -> bool:
+        """
+        Ожидание разрешения на операцию в цикле событий
+
+        :param chat_id: Чат, от имени которого выполняется операция (None - только общий лимит)
+        :param max_wait: Максимальное ожидание (по умолчанию из настроек ограничителя)
+        :return: False если операция отклонена
+        """
+        delay = self._reserve(chat_id, max_wait)
+        if delay is None:
+            return False
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+    def acquire_sync(self, chat_id: int = None, max_wait: float = None) -> bool:
+        """Ожидание разрешения на операцию в рабочем потоке (блокирует поток)"""
+        delay = self._reserve(chat_id, max_wait)
+        if delay is None:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def stats(self) -> dict:
+        return {'allowed': self.allowed, 'throttled': self.throttled, 'dropped': self.dropped}
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых запросов
+
+    Пока запрос с некоторым ключом выполняется, остальные вызовы с тем же
+    ключом не запускают новый запрос, а ждут результат уже идущего.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, factory):
+        """
+        Выполнение запроса или присоединение к уже идущему
+
+        :param key: Ключ запроса (одинаковые запросы должны иметь одинаковый ключ)
+        :param factory: Функция без аргументов, возвращающая корутину запроса
+        :return: Результат запроса
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Отмена одного из ожидающих не должна отменять общий запрос
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {'started': self.started, 'coalesced': self.coalesced, 'in_flight': len(self._inflight)}
@@ -0,0 +1,571 @@
+import asyncio
+import heapq
+import logging
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from html import escape
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from event_cache import to_naive
+from metrics import Counter
+
+# Сколько сообщений с напоминаниями отправлять одновременно (частоту ограничивает middleware сессии бота)
+SEND_CONCURRENCY = 30
+
+# Сколько пользователей обновлять одновременно и сколько брать за один проход
+REFRESH_CONCURRENCY = 8
+REFRESH_BATCH_SIZE = 100
+
+# Сколько событий перечислять в одном сообщении с напоминаниями
+MAX_EVENTS_PER_MESSAGE = 30
+
+REMINDER_RESULTS = Counter(
+    "reminders_total", "Напоминания: отправлены, пропущены (событие уже началось), не доставлены",
+    labels=("result",)
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminder_subscriptions (
+    user_id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    minutes INTEGER NOT NULL,
+    next_refresh REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS reminder_subscriptions_due ON reminder_subscriptions (next_refresh);
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    fire_at REAL NOT NULL,
+    sent INTEGER NOT NULL DEFAULT 0,
+    pending_uid TEXT,
+    UNIQUE (user_id, key)
+);
+CREATE INDEX IF NOT EXISTS reminders_start ON reminders (start_time);
+"""
+
+
+def _event_key(summary: str, start_time: datetime) -> str:
+    """Ключ экземпляра события: время начала и название (у экземпляров серии время разное)"""
+    return f"{start_time:%Y-%m-%dT%H:%M:%S} {summary}"
+
+
+class Reminder:
+    """Запланированное напоминание о начале события"""
+
+    __slots__ = ("id", "user_id", "chat_id", "summary", "start_time", "fire_at")
+
+    def __init__(self, row: tuple):
+        self.id, self.user_id, self.chat_id, self.summary, start_time, self.fire_at = row
+        self.start_time = datetime.fromisoformat(start_time) if isinstance(start_time, str) else start_time
+
+
+class ReminderScheduler:
+    """
+    Напоминания о предстоящих событиях календаря
+
+    Пользователь включает напоминания командой /remind и получает сообщение
+    за заданное число минут до начала каждого события. Расписание хранится
+    в SQLite, а в памяти напоминания упорядочены в куче по времени отправки:
+    добавление и извлечение стоят O(log n), отмена - O(1) (запись кучи
+    становится устаревшей и пропускается при извлечении). Одна задача спит
+    до ближайшего напоминания и отправляет все наступившие пакетом,
+    объединяя напоминания одного чата в одно сообщение.
+
+    Расписание обновляется инкрементально: раз в refresh_interval события
+    пользователя на horizon_days вперед читаются через кеш менеджера
+    (синхронизация изменений или проверка ctag), сравниваются с сохраненными
+    напоминаниями, и в базе и куче меняются только добавленные, перенесенные
+    и удаленные события. После перезапуска напоминания загружаются из базы
+    и отправляются вовремя без запросов к календарю, а время следующего
+    обновления каждого пользователя тоже сохранено, поэтому перезапуск
+    не вызывает повторного чтения всех календарей.
+
+    Напоминание о событии, добавленном через очередь записи, закреплено UID события
+    (pending_uid), пока очередь его не записала: такого события еще нет в календаре,
+    и обновление расписания не должно удалять напоминание, пока сервер недоступен.
+
+    Несколько процессов могут работать с одним файлом: обновление пользователя
+    и отправка напоминания закрепляются за одним процессом в транзакции.
+    """
+
+    def __init__(self, path: str, resolve, send=None, default_minutes: int = 15,
+                 horizon_days: int = 7, refresh_interval: float = 300, pending_writes=None):
+        """
+        :param path: Путь к файлу базы (пустая строка - хранить только в памяти)
+        :param resolve: Корутина (user_id) -> подключенный менеджер календаря или None
+        :param send: Корутина (chat_id, текст) для отправки напоминаний
+        :param default_minutes: За сколько минут до начала напоминать по умолчанию
+        :param horizon_days: На сколько дней вперед планировать напоминания
+        :param refresh_interval: Раз во сколько секунд перечитывать события пользователя
+        :param pending_writes: Функция (список UID) -> множество UID, которые еще ждут записи
+                               в календарь (WriteQueue.pending_uids); выполняется в потоке
+        """
+        self.path = path
+        self.resolve = resolve
+        self.send = send
+        self.pending_writes = pending_writes
+        self.default_minutes = default_minutes
+        self.horizon_days = horizon_days
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self._db = None
+        self._heap = []
+        self._scheduled = {}
+        self._timer_wakeup = None
+        self._refresh_wakeup = None
+        self._tasks = []
+        self._delivering = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path or ":memory:", timeout=30, check_same_thread=False,
+                                 isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            # Базы, созданные до закрепления напоминаний за записями очереди
+            columns = {row[1] for row in db.execute("PRAGMA table_info(reminders)")}
+            if "pending_uid" not in columns:
+                db.execute("ALTER TABLE reminders ADD COLUMN pending_uid TEXT")
+            self._db = db
+        return self._db
+
+    def _transaction(self, func, *args):
+        """Выполнение func(db, *args) в транзакции, блокирующей запись других процессов"""
+        with self.lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(db, *args)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return result
+
+    # Расписание в памяти
+
+    def _schedule(self, reminder: Reminder) -> None:
+        current = self._scheduled.get(reminder.id)
+        if current is not None and (current.fire_at, current.chat_id) == (reminder.fire_at, reminder.chat_id):
+            return
+        self._scheduled[reminder.id] = reminder
+        heapq.heappush(self._heap, (reminder.fire_at, reminder.id))
+        if self._heap[0][1] == reminder.id and self._timer_wakeup is not None:
+            self._timer_wakeup.set()
+
+    def _cancel(self, reminder_id: int) -> None:
+        self._scheduled.pop(reminder_id, None)
+        # Устаревших записей в куче стало намного больше действующих - перестраиваем ее
+        if len(self._heap) > 2 * len(self._scheduled) + 1024:
+            self._heap = [(reminder.fire_at, reminder.id) for reminder in self._scheduled.values()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> list:
+        """Извлечение напоминаний, время отправки которых наступило"""
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= now:
+            fire_at, reminder_id = heapq.heappop(heap)
+            reminder = self._scheduled.get(reminder_id)
+            if reminder is None or reminder.fire_at != fire_at:
+                continue
+            del self._scheduled[reminder_id]
+            due.append(reminder)
+        return due
+
+    def scheduled(self) -> int:
+        """Число напоминаний, ожидающих отправки в этом процессе"""
+        return len(self._scheduled)
+
+    # Работа с базой (выполняется в потоках)
+
+    def _load(self) -> list:
+        with self.lock:
+            rows = self._connect().execute(
+                "SELECT r.id, r.user_id, s.chat_id, r.summary, r.start_time, r.fire_at"
+                " FROM reminders r JOIN reminder_subscriptions s ON s.user_id = r.user_id WHERE r.sent = 0"
+            ).fetchall()
+        return [Reminder(row) for row in rows]
+
+    @staticmethod
+    def _claim_refresh(db, now: float, interval: float, limit: int) -> list:
+        """Выборка пользователей, расписание которых пора обновить, и перенос следующего обновления"""
+        # Напоминания о начавшихся событиях больше не нужны
+        db.execute("DELETE FROM reminders WHERE start_time < ?", (datetime.now().isoformat(),))
+        rows = db.execute(
+            "SELECT user_id, chat_id, minutes FROM reminder_subscriptions WHERE next_refresh <= ?"
+            " ORDER BY next_refresh LIMIT ?",
+            (now, limit)
+        ).fetchall()
+        # Случайный разброс распределяет обновления пользователей по интервалу
+        db.executemany("UPDATE reminder_subscriptions SET next_refresh = ? WHERE user_id = ?",
+                       [(now + interval * random.uniform(0.9, 1.1), row[0]) for row in rows])
+        return rows
+
+    def _next_refresh(self):
+        with self.lock:
+            return self._connect().execute("SELECT MIN(next_refresh) FROM reminder_subscriptions").fetchone()[0]
+
+    def _pinned_uids(self, user_id: int) -> list:
+        with self.lock:
+            return [row[0] for row in self._connect().execute(
+                "SELECT DISTINCT pending_uid FROM reminders WHERE user_id = ? AND pending_uid IS NOT NULL", (user_id,)
+            )]
+
+    @staticmethod
+    def _apply(db, user_id: int, chat_id: int, window_start: datetime, window_end: datetime,
+               desired: dict, written: set = frozenset()) -> tuple:
+        """
+        Приведение напоминаний пользователя в периоде к списку событий календаря
+
+        Напоминания, закрепленные за событиями очереди записи, не удаляются, пока UID
+        события не попадет в written; после этого закрепление снимается.
+
+        :param desired: {ключ события: (название, начало, время отправки)}
+        :param written: UID событий, которые очередь записи уже обработала
+        :return: Кортеж (идентификаторы удаленных напоминаний, неотправленные напоминания периода)
+        """
+        existing = {}
+        pinned = set()
+        for reminder_id, key, fire_at, sent, pending_uid in db.execute(
+            "SELECT id, key, fire_at, sent, pending_uid FROM reminders"
+            " WHERE user_id = ? AND start_time >= ? AND start_time < ?",
+            (user_id, window_start.isoformat(), window_end.isoformat())
+        ):
+            existing[key] = (reminder_id, fire_at, sent)
+            if pending_uid is not None and pending_uid not in written:
+                pinned.add(key)
+        db.executemany("UPDATE reminders SET pending_uid = NULL WHERE user_id = ? AND pending_uid = ?",
+                       [(user_id, uid) for uid in written])
+        deleted = [reminder_id for key, (reminder_id, _, _) in existing.items()
+                   if key not in desired and key not in pinned]
+        db.executemany("DELETE FROM reminders WHERE id = ?", [(reminder_id,) for reminder_id in deleted])
+
+        pending = []
+        for key, (summary, start_time, fire_at) in desired.items():
+            current = existing.get(key)
+            if current is None:
+                reminder_id = db.execute(
+                    "INSERT INTO reminders (user_id, key, summary, start_time, fire_at) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, key, summary, start_time.isoformat(), fire_at)
+                ).lastrowid
+            else:
+                reminder_id, old_fire_at, sent = current
+                if sent:
+                    continue
+                if old_fire_at != fire_at:
+                    db.execute("UPDATE reminders SET fire_at = ? WHERE id = ?", (fire_at, reminder_id))
+            pending.append(Reminder((reminder_id, user_id, chat_id, summary, start_time, fire_at)))
+        return deleted, pending
+
+    @staticmethod
+    def _claim_sent(db, ids: list) -> set:
+        """Отметка напоминаний отправленными; возвращает те, что не отправил другой процесс"""
+        claimed = set()
+        for reminder_id in ids:
+            if db.execute("UPDATE reminders SET sent = 1 WHERE id = ? AND sent = 0", (reminder_id,)).rowcount:
+                claimed.add(reminder_id)
+        return claimed
+
+    def _release(self, ids: list) -> None:
+        """Возврат в расписание напоминаний, отправка которых прервана остановкой бота"""
+        with self.lock:
+            self._connect().executemany("UPDATE reminders SET sent = 0 WHERE id = ?",
+                                        [(reminder_id,) for reminder_id in ids])
+
+    @staticmethod
+    def _subscribe(db, user_id: int, chat_id: int, minutes: int) -> None:
+        db.execute(
+            "INSERT INTO reminder_subscriptions (user_id, chat_id, minutes, next_refresh) VALUES (?, ?, ?, 0)"
+            " ON CONFLICT (user_id) DO UPDATE SET chat_id = excluded.chat_id, minutes = excluded.minutes,"
+            " next_refresh = 0",
+            (user_id, chat_id, minutes)
+        )
+
+    @staticmethod
+    def _unsubscribe(db, user_ids: list) -> int:
+        removed = 0
+        for user_id in user_ids:
+            removed += db.execute("DELETE FROM reminder_subscriptions WHERE user_id = ?", (user_id,)).rowcount
+            db.execute("DELETE FROM reminders WHERE user_id = ?", (user_id,))
+        return removed
+
+    def _subscription(self, user_id: int):
+        with self.lock:
+            return self._connect().execute(
+                "SELECT chat_id, minutes FROM reminder_subscriptions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+
+    # Управление подписками
+
+    async def subscribe(self, user_id: int, chat_id: int, minutes: int = None) -> int:
+        """
+        Включение напоминаний пользователя; расписание строится в фоне
+
+        :param chat_id: Чат, в который отправлять напоминания
+        :param minutes: За сколько минут до начала события напоминать (по умолчанию из настроек)
+        :return: Выбранное число минут
+        """
+        minutes = minutes or self.default_minutes
+        await asyncio.to_thread(self._transaction, self._subscribe, user_id, chat_id, minutes)
+        if self._refresh_wakeup is not None:
+            self._refresh_wakeup.set()
+        return minutes
+
+    async def unsubscribe(self, user_id: int) -> bool:
+        """
+        Отключение напоминаний пользователя
+
+        :return: True если напоминания были включены
+        """
+        removed = await asyncio.to_thread(self._transaction, self._unsubscribe, [user_id])
+        for reminder in [reminder for reminder in self._scheduled.values() if reminder.user_id == user_id]:
+            self._cancel(reminder.id)
+        return bool(removed)
+
+    async def subscription(self, user_id: int):
+        """
+        :return: За сколько минут до начала напоминать пользователю или None, если напоминания выключены
+        """
+        row = await asyncio.to_thread(self._subscription, user_id)
+        return row[1] if row else None
+
+    async def add(self, user_id: int, summary: str, start_time: datetime, uid: str = None) -> None:
+        """
+        Планирование напоминания о только что добавленном событии, не дожидаясь обновления расписания
+
+        Ничего не делает, если у пользователя выключены напоминания или событие за пределами горизонта.
+
+        :param uid: UID события в очереди записи: напоминание сохраняется, пока событие ждет записи
+        """
+        row = await asyncio.to_thread(self._subscription, user_id)
+        if row is None:
+            return
+        chat_id, minutes = row
+        now = datetime.now()
+        if not now <= start_time < now + timedelta(days=self.horizon_days):
+            return
+        fire_at = (start_time - timedelta(minutes=minutes)).timestamp()
+
+        def insert(db):
+            key = _event_key(summary, start_time)
+            db.execute(
+                "INSERT INTO reminders (user_id, key, summary, start_time, fire_at, pending_uid)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (user_id, key) DO UPDATE SET pending_uid = COALESCE(excluded.pending_uid, pending_uid)",
+                (user_id, key, summary, start_time.isoformat(), fire_at, uid)
+            )
+            return db.execute("SELECT id, sent FROM reminders WHERE user_id = ? AND key = ?", (user_id, key)).fetchone()
+
+        reminder_id, sent = await asyncio.to_thread(self._transaction, insert)
+        if not sent:
+            self._schedule(Reminder((reminder_id, user_id, chat_id, summary, start_time, fire_at)))
+
+    # Обновление расписания
+
+    async def _refresh_user(self, user_id: int, chat_id: int, minutes: int) -> None:
+        try:
+            manager = await self.resolve(user_id)
+        except Exception as e:
+            logging.error(f"Ошибка при получении календаря пользователя {user_id}: {e}")
+            return
+        if manager is None:
+            return
+
+        now = datetime.now()
+        # Период выровнен по началу дня, как у /events, чтобы использовать те же окна кеша событий
+        window_end = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=self.horizon_days)
+        try:
+            events = await manager.list_events(now.replace(hour=0, minute=0, second=0, microsecond=0), window_end,
+                                               raise_errors=True)
+        except Exception as e:
+            # При ошибке расписание не меняется: пустой ответ не должен удалять напоминания
+            logging.warning(f"Не удалось обновить напоминания пользователя {user_id}: {e}")
+            return
+
+        lead = timedelta(minutes=minutes)
+        desired = {}
+        for event in events:
+            # События на весь день напоминаний не получают
+            if not isinstance(event['start'], datetime):
+                continue
+            start_time = to_naive(event['start'])
+            if start_time < now:
+                continue
+            desired[_event_key(event['summary'], start_time)] = (
+                event['summary'], start_time, (start_time - lead).timestamp()
+            )
+
+        # Закрепленные напоминания проверяются по очереди записи: записанные или отклоненные
+        # события дальше сверяются с календарем как обычно
+        written = set()
+        uids = await asyncio.to_thread(self._pinned_uids, user_id)
+        if uids:
+            still_pending = await asyncio.to_thread(self.pending_writes, uids) if self.pending_writes else set()
+            written = set(uids) - still_pending
+
+        deleted, pending = await asyncio.to_thread(self._transaction, self._apply, user_id, chat_id,
+                                                   now, window_end, desired, written)
+        for reminder_id in deleted:
+            self._cancel(reminder_id)
+        for reminder in pending:
+            self._schedule(reminder)
+        logging.debug("Напоминания пользователя %s: событий %d, удалено %d", user_id, len(desired), len(deleted))
+
+    async def _run_refresh(self) -> None:
+        """Фоновое обновление расписания пользователей до остановки"""
+        semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+        async def refresh(row):
+            async with semaphore:
+                await self._refresh_user(*row)
+
+        while True:
+            self._refresh_wakeup.clear()
+            rows = await asyncio.to_thread(self._transaction, self._claim_refresh, time.time(),
+                                           self.refresh_interval, REFRESH_BATCH_SIZE)
+            if rows:
+                await asyncio.gather(*(refresh(row) for row in rows))
+                continue
+
+            due = await asyncio.to_thread(self._next_refresh)
+            # Подписки могут добавлять другие процессы бота, поэтому база проверяется не реже раза в минуту
+            timeout = 60 if due is None else min(60, max(0.0, due - time.time()))
+            try:
+                await asyncio.wait_for(self._refresh_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    # Отправка
+
+    @staticmethod
+    def _format(reminders: list, now: datetime) -> str:
+        def line(reminder):
+            minutes = max(0, round((reminder.start_time - now).total_seconds() / 60))
+            return f"{reminder.start_time:%H:%M} {escape(reminder.summary)} (через {minutes} мин.)"
+
+        if len(reminders) == 1:
+            return f"⏰ Скоро начнется событие:\n{line(reminders[0])}"
+        text = "⏰ Скоро начнутся события:\n" + "\n".join(map(line, reminders[:MAX_EVENTS_PER_MESSAGE]))
+        if len(reminders) > MAX_EVENTS_PER_MESSAGE:
+            text += f"\nи еще {len(reminders) - MAX_EVENTS_PER_MESSAGE}"
+        return text
+
+    async def _send_chat(self, chat_id: int, reminders: list, semaphore: asyncio.Semaphore) -> None:
+        text = self._format(reminders, datetime.now())
+        async with semaphore:
+            await self._send_with_retry(chat_id, text, reminders)
+        # При остановке бота во время отправки напоминания остаются в _delivering и возвращаются в базу
+        self._delivering.difference_update(reminder.id for reminder in reminders)
+
+    async def _send_with_retry(self, chat_id: int, text: str, reminders: list) -> None:
+        for attempt in range(2):
+            try:
+                await self.send(chat_id, text)
+                REMINDER_RESULTS.inc("sent", amount=len(reminders))
+                return
+            except TelegramRetryAfter as e:
+                if attempt:
+                    break
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                # Пользователь заблокировал бота - напоминания ему больше не отправляются
+                logging.info(f"Чат {chat_id} недоступен, напоминания отключены")
+                await asyncio.to_thread(self._transaction, self._unsubscribe,
+                                        list({reminder.user_id for reminder in reminders}))
+                break
+            except Exception as e:
+                logging.warning(f"Не удалось отправить напоминание в чат {chat_id}: {e}")
+                break
+        REMINDER_RESULTS.inc("failed", amount=len(reminders))
+
+    async def _deliver(self, reminders: list) -> None:
+        """Отправка наступивших напоминаний: одно сообщение на чат, параллельно до SEND_CONCURRENCY"""
+        claimed = await asyncio.to_thread(self._transaction, self._claim_sent,
+                                          [reminder.id for reminder in reminders])
+        self._delivering.update(claimed)
+        now = datetime.now()
+        by_chat = {}
+        for reminder in reminders:
+            if reminder.id not in claimed:
+                continue
+            # Напоминание задержалось (например, бот был остановлен) и событие уже началось
+            if reminder.start_time <= now:
+                REMINDER_RESULTS.inc("missed")
+                self._delivering.discard(reminder.id)
+                continue
+            by_chat.setdefault(reminder.chat_id, []).append(reminder)
+        if self.send is None or not by_chat:
+            self._delivering.difference_update(claimed)
+            return
+
+        semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+        await asyncio.gather(*(
+            self._send_chat(chat_id, sorted(items, key=lambda reminder: reminder.start_time), semaphore)
+            for chat_id, items in by_chat.items()
+        ))
+
+    async def _run_timer(self) -> None:
+        """Отправка напоминаний в срок до остановки"""
+        while True:
+            self._timer_wakeup.clear()
+            due = self._pop_due(time.time())
+            if due:
+                await self._deliver(due)
+                continue
+
+            timeout = min(60, max(0.0, self._heap[0][0] - time.time())) if self._heap else 60
+            try:
+                await asyncio.wait_for(self._timer_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_forever(self, loop) -> None:
+        while True:
+            try:
+                await loop()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Ошибка планировщика напоминаний: {e}")
+                await asyncio.sleep(5)
+
+    async def start(self) -> None:
+        """Загрузка сохраненного расписания и запуск фоновых задач"""
+        reminders = await asyncio.to_thread(self._load)
+        for reminder in reminders:
+            self._scheduled[reminder.id] = reminder
+        self._heap = [(reminder.fire_at, reminder.id) for reminder in reminders]
+        heapq.heapify(self._heap)
+        if reminders:
+            logging.info(f"Загружено напоминаний: {len(reminders)}")
+        self._timer_wakeup = asyncio.Event()
+        self._refresh_wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run_forever(self._run_timer)),
+                       asyncio.create_task(self._run_forever(self._run_refresh))]
+
+    async def stop(self) -> None:
+        """Остановка фоновых задач; расписание, включая неотправленные напоминания пакета, остается в базе"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._delivering:
+            await asyncio.to_thread(self._release, list(self._delivering))
+            self._delivering.clear()
+        with self.lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,48 @@
+"""
+Общие фикстуры тестов
+
+Модули бота читают конфигурацию при импорте, поэтому переменные окружения
+выставляются здесь, до импорта calendar_utils и handlers. Тесты работают в поясе UTC:
+заглушка CalDAV хранит время без пояса и отдает free-busy в UTC.
+"""
+import os
+import time
+
+import pytest
+
+from benchmarks.common import configure_env
+
+os.environ["TZ"] = "UTC"
+time.tzset()
+configure_env("http://127.0.0.1:1/dav/", "test", "test", CALDAV_RATE_LIMIT=10000, CALDAV_CHAT_RATE_LIMIT=10000,
+              ACCOUNTS_FILE="", WRITE_QUEUE_FILE="", REMINDERS_FILE="", METRICS_PORT=0)
+
+
+@pytest.fixture
+def local_timezone(monkeypatch):
+    """Смена локального пояса бота на время теста: local_timezone("Europe/Berlin")"""
+    def set_zone(name: str) -> None:
+        monkeypatch.setenv("TZ", name)
+        time.tzset()
+
+    yield set_zone
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def caldav_server():
+    """Запуск локальных заглушек CalDAV: caldav_server(sync_support=False); останавливаются после теста"""
+    pytest.importorskip("caldav")
+    from benchmarks.fake_caldav import FakeCalDAVServer
+
+    servers = []
+
+    def start(**options) -> FakeCalDAVServer:
+        server = FakeCalDAVServer(username="test", password="test", **options).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,261 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("caldav")
+
+
+def test_list_events_and_bulk_add(caldav_server):
+    from calendar_utils import CalendarManager
+
+    server = caldav_server(sync_support=False)
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    server.populate(20, start, span_days=7)
+    added = [(f"Пакет {i}", start + timedelta(days=1, minutes=15 * i)) for i in range(30)]
+
+    async def scenario():
+        manager = CalendarManager(server.url, "test", "test")
+        assert await manager.connect()
+        first = await manager.list_events(start, start + timedelta(days=7))
+        again = await manager.list_events(start, start + timedelta(days=7))
+        results = await manager.add_events(added)
+        after = await manager.list_events(start, start + timedelta(days=7))
+        await manager.close()
+        return manager, first, again, results, after
+
+    manager, first, again, results, after = asyncio.run(scenario())
+    assert len(first) == 20 and again == first
+    assert [event['start'] for event in first] == sorted(event['start'] for event in first)
+    assert all(results) and len({result.uid for result in results}) == 30
+    assert len(server.calendars["main"].objects) == 50
+    assert len(after) == 50
+    assert manager.cache_stats()['hits'] >= 1
+
+
+def test_weekly_event_keeps_local_time_across_dst_change(caldav_server, local_timezone):
+    from calendar_utils import CalendarManager
+    from event_cache import to_naive
+
+    # В 2026 году Европа переходит на зимнее время 25 октября
+    local_timezone("Europe/Berlin")
+    server = caldav_server()
+    start, end = datetime(2026, 10, 12), datetime(2026, 11, 3)
+    expected = [datetime(2026, 10, 19, 10), datetime(2026, 10, 26, 10), datetime(2026, 11, 2, 10)]
+
+    async def scenario():
+        writer = CalendarManager(server.url, "test", "test")
+        assert await writer.connect()
+        await writer.list_events(start, end)
+        assert await writer.add_event("Планерка", datetime(2026, 10, 19, 10), rrule="FREQ=WEEKLY;BYDAY=MO")
+        # Экземпляры из кеша записавшего менеджера и из данных, прочитанных с сервера
+        cached = await writer.list_events(start, end)
+        reader = CalendarManager(server.url, "test", "test")
+        assert await reader.connect()
+        fetched = await reader.list_events(start, end)
+        await writer.close()
+        await reader.close()
+        return cached, fetched
+
+    cached, fetched = asyncio.run(scenario())
+    for events in (cached, fetched):
+        assert [to_naive(event['start']) for event in events] == expected
+        assert [to_naive(event['end']) for event in events] == [start + timedelta(hours=1) for start in expected]
+
+    data = next(iter(server.calendars["main"].objects.values())).data
+    assert "DTSTART;TZID=Europe/Berlin:20261019T100000" in data
+    assert "RRULE:FREQ=WEEKLY;BYDAY=MO" in data
+    assert "BEGIN:VTIMEZONE" in data
+
+
+@pytest.mark.parametrize("url", [
+    "http://93.184.216.34/dav/", "https://127.0.0.1/dav/", "https://localhost/dav/", "https://10.0.0.5/",
+    "https://169.254.169.254/latest/", "https://[::1]/", "https://[::ffff:192.168.0.1]/", "caldav.example.com",
+])
+def test_check_server_url_rejects_local_and_plain_http(url):
+    from calendar_utils import check_server_url
+
+    with pytest.raises(ValueError):
+        asyncio.run(check_server_url(url, allowed_hosts=[]))
+
+
+def test_check_server_url_allows_public_https_and_allowlist():
+    from calendar_utils import check_server_url
+
+    asyncio.run(check_server_url("https://93.184.216.34:8443/dav/", allowed_hosts=[]))
+    asyncio.run(check_server_url("https://CalDAV.Internal/dav/", allowed_hosts=["caldav.internal"]))
+    with pytest.raises(ValueError):
+        asyncio.run(check_server_url("https://93.184.216.34/dav/", allowed_hosts=["caldav.internal"]))
+
+
+def test_pool_put_replaces_manager_with_same_key():
+    from calendar_utils import CalendarManager, CalendarPool
+
+    async def scenario():
+        pool = CalendarPool(max_size=2)
+        first = await pool.get("https://a.example/", "user", "old")
+        second = await pool.put(CalendarManager("https://a.example/", "user", "new"))
+        same = await pool.get("https://a.example/", "user", "new")
+        stats = pool.stats()
+        await pool.close()
+        return first, second, same, stats
+
+    first, second, same, stats = asyncio.run(scenario())
+    assert second is same and first is not second
+    assert stats == {'size': 1, 'created': 2, 'evicted': 1}
+
+
+def test_ics_import_keeps_series_exdates_and_all_day_events(caldav_server, local_timezone):
+    from datetime import date
+    from calendar_utils import CalendarManager, parse_ics
+    from event_cache import to_naive
+
+    local_timezone("Europe/Berlin")
+    server = caldav_server()
+    ics = "\r\n".join((
+        "BEGIN:VCALENDAR", "VERSION:2.0",
+        "BEGIN:VEVENT", "UID:standup", "SUMMARY:Стендап", "DTSTART;TZID=Europe/Berlin:20261019T093000",
+        "DTEND;TZID=Europe/Berlin:20261019T094500", "RRULE:FREQ=DAILY;COUNT=5",
+        "EXDATE;TZID=Europe/Berlin:20261020T093000", "END:VEVENT",
+        "BEGIN:VEVENT", "UID:standup", "SUMMARY:Стендап", "RECURRENCE-ID;TZID=Europe/Berlin:20261021T093000",
+        "DTSTART;TZID=Europe/Berlin:20261021T110000", "DTEND;TZID=Europe/Berlin:20261021T111500", "END:VEVENT",
+        "BEGIN:VEVENT", "UID:vacation", "SUMMARY:Отпуск", "DTSTART;VALUE=DATE:20261026",
+        "DTEND;VALUE=DATE:20261028", "END:VEVENT",
+        "END:VCALENDAR", "",
+    ))
+    events = parse_ics(ics)
+    assert [event[0] for event in events] == ["Стендап", "Стендап", "Отпуск"]
+    assert events[0][4] == "FREQ=DAILY;COUNT=5" and len(events[0][5]) == 2
+    assert events[2][1:3] == (date(2026, 10, 26), date(2026, 10, 28))
+
+    async def scenario():
+        writer = CalendarManager(server.url, "test", "test")
+        assert await writer.connect()
+        assert all(await writer.add_events(events))
+        reader = CalendarManager(server.url, "test", "test")
+        assert await reader.connect()
+        fetched = await reader.list_events(datetime(2026, 10, 19), datetime(2026, 11, 2))
+        await writer.close()
+        await reader.close()
+        return fetched
+
+    fetched = asyncio.run(scenario())
+    assert [(event['summary'], to_naive(event['start'])) for event in fetched] == [
+        ("Стендап", datetime(2026, 10, 19, 9, 30)),
+        ("Стендап", datetime(2026, 10, 21, 11)),
+        ("Стендап", datetime(2026, 10, 22, 9, 30)),
+        ("Стендап", datetime(2026, 10, 23, 9, 30)),
+        ("Отпуск", datetime(2026, 10, 26)),
+    ]
+    assert fetched[-1]['start'] == date(2026, 10, 26) and fetched[-1]['end'] == date(2026, 10, 28)
+
+
+def test_restricted_adapter_refuses_other_hosts_redirects_and_local_peers(monkeypatch):
+    import io
+    import socket
+    import requests
+    from requests.adapters import HTTPAdapter
+    from calendar_utils import ForbiddenRequestError, RestrictedAdapter
+
+    session = requests.Session()
+    session.mount("http://", RestrictedAdapter("localhost"))
+    session.mount("https://", RestrictedAdapter("localhost"))
+    for url in ("https://other.example/dav/", "http://localhost/dav/"):
+        with pytest.raises(ForbiddenRequestError):
+            session.get(url)
+
+    # Имя разрешено, но сервер отвечает с локального адреса
+    listener = socket.create_server(("127.0.0.1", 0))
+    try:
+        with pytest.raises(requests.exceptions.ConnectionError, match="не публичный"):
+            session.get(f"https://localhost:{listener.getsockname()[1]}/dav/", timeout=5)
+    finally:
+        listener.close()
+
+    def redirect(self, request, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = 302
+        response.raw = io.BytesIO()
+        response.headers["Location"] = "http://169.254.169.254/latest/"
+        response.request = request
+        return response
+
+    monkeypatch.setattr(HTTPAdapter, "send", redirect)
+    with pytest.raises(ForbiddenRequestError, match="Перенаправление"):
+        session.request("PROPFIND", "https://localhost/dav/")
+
+
+def test_stalled_account_does_not_delay_other_accounts(caldav_server):
+    import threading
+    import time
+    from calendar_utils import CalendarManager
+
+    stalled_server, server = caldav_server(sync_support=False), caldav_server(sync_support=False)
+    start = datetime(2026, 3, 2)
+    unblock = threading.Event()
+
+    def stall(*args):
+        # Сервер, который держит соединение дольше таймаута сокета
+        unblock.wait(10)
+        return []
+
+    async def scenario():
+        stalled = CalendarManager(stalled_server.url, "test", "test", timeout=0.1)
+        healthy = CalendarManager(server.url, "test", "test")
+        assert await stalled.connect() and await healthy.connect()
+        stalled._fetch_events_cached = stall
+        # Запросы зависшей учетной записи завершаются по таймауту, а ее потоки остаются занятыми
+        for round_number in range(10):
+            await asyncio.gather(*(stalled.list_events(start + timedelta(days=10 * round_number + i),
+                                                       start + timedelta(days=10 * round_number + i + 1))
+                                   for i in range(8)))
+        started = time.perf_counter()
+        await healthy.list_events(start, start + timedelta(days=7), raise_errors=True)
+        elapsed = time.perf_counter() - started
+        unblock.set()
+        await stalled.close()
+        await healthy.close()
+        return elapsed
+
+    assert asyncio.run(scenario()) < 1
+
+
+def test_concurrent_sync_shares_leader_result_and_error():
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from caldav.lib import error as caldav_error
+    from calendar_utils import CalendarManager
+
+    manager = CalendarManager("https://a.example/", "user", "secret", timeout=0.5)
+
+    def sync_concurrently(outcome, hold: float = 0.1):
+        started = threading.Event()
+
+        def sync():
+            started.set()
+            time.sleep(hold)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        manager._sync_cache = sync
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(manager._sync_once)
+            started.wait(5)
+            follower = executor.submit(manager._sync_once)
+        return leader, follower
+
+    # Ведомый поток получает результат ведущего, а не True
+    leader, follower = sync_concurrently(False)
+    assert leader.result() is False and follower.result() is False
+
+    error = caldav_error.DAVError("sync-collection не поддерживается")
+    leader, follower = sync_concurrently(error)
+    for future in (leader, follower):
+        with pytest.raises(caldav_error.DAVError):
+            future.result()
+
+    # Синхронизация не завершилась за таймаут менеджера - ведомый не считает кеш актуальным
+    leader, follower = sync_concurrently(True, hold=1)
+    assert leader.result() is True and follower.result() is False
@@ -0,0 +1,66 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+rrule = pytest.importorskip("dateutil.rrule")
+
+from event_cache import CachedEvent, EventCache, IntervalIndex  # noqa: E402
+
+
+def series(summary: str, start: datetime, rule: str, duration: timedelta = timedelta(hours=1), exdates=()):
+    rules = rrule.rrulestr(rule, dtstart=start, forceset=True)
+    for value in exdates:
+        rules.exdate(value)
+    return CachedEvent({'summary': summary, 'start': start, 'end': start + duration}, rules)
+
+
+def single(summary: str, start, end) -> CachedEvent:
+    return CachedEvent({'summary': summary, 'start': start, 'end': end})
+
+
+def starts(events: list) -> list:
+    return [(event['summary'], event['start']) for event in events]
+
+
+def test_weekly_series_occurrences_with_exdate():
+    event = series("Планерка", datetime(2023, 1, 2, 10), "FREQ=WEEKLY;BYDAY=MO,WE",
+                   exdates=[datetime(2026, 3, 4, 10)])
+    week = (datetime(2026, 3, 2), datetime(2026, 3, 9))
+    expected = [("Планерка", datetime(2026, 3, 2, 10))]
+    assert starts(event.occurrences(*week)) == expected
+    # Повторный запрос отвечается из развернутых интервалов
+    assert starts(event.occurrences(*week)) == expected
+    assert event.series_end() == datetime.max
+
+
+def test_occurrence_overlapping_period_start_is_included():
+    event = series("Ночная смена", datetime(2026, 1, 1, 22), "FREQ=DAILY;COUNT=5", duration=timedelta(hours=8))
+    assert starts(event.occurrences(datetime(2026, 1, 3), datetime(2026, 1, 3, 1))) == \
+        [("Ночная смена", datetime(2026, 1, 2, 22))]
+    assert event.series_end() == datetime(2026, 1, 6, 6)
+
+
+def test_interval_index_query():
+    index = IntervalIndex([(datetime(2026, 1, day), datetime(2026, 1, day + 2), day) for day in range(1, 20)])
+    assert sorted(index.query(datetime(2026, 1, 10), datetime(2026, 1, 12))) == [8, 9, 10, 11]
+
+
+def test_full_copy_query_and_busy():
+    cache = EventCache()
+    cache.apply_sync("token", {
+        "/a.ics": ('"1"', [single("Встреча", datetime(2026, 3, 3, 15), datetime(2026, 3, 3, 16))]),
+        "/b.ics": ('"2"', [series("Зарядка", datetime(2026, 1, 1, 8), "FREQ=DAILY", timedelta(minutes=30))]),
+        "/c.ics": ('"3"', [single("Отпуск", date(2026, 3, 3), date(2026, 3, 4))]),
+    }, [], full=True)
+    events = cache.query(datetime(2026, 3, 3), datetime(2026, 3, 4))
+    assert starts(events) == [("Отпуск", date(2026, 3, 3)), ("Зарядка", datetime(2026, 3, 3, 8)),
+                              ("Встреча", datetime(2026, 3, 3, 15))]
+    busy = cache.busy(datetime(2026, 3, 3), datetime(2026, 3, 4))
+    assert busy.free_periods(datetime(2026, 3, 3, 7), datetime(2026, 3, 3, 17)) == [
+        (datetime(2026, 3, 3, 7), datetime(2026, 3, 3, 8)),
+        (datetime(2026, 3, 3, 8, 30), datetime(2026, 3, 3, 15)),
+        (datetime(2026, 3, 3, 16), datetime(2026, 3, 3, 17)),
+    ]
+
+    cache.apply_sync("token2", {}, ["/a.ics"])
+    assert starts(cache.query(datetime(2026, 3, 3, 12), datetime(2026, 3, 4))) == [("Отпуск", date(2026, 3, 3))]
@@ -0,0 +1,46 @@
+from datetime import date, datetime
+
+import pytest
+
+pytest.importorskip("dateutil")
+
+from event_pages import EventPages, EventPagesCache, format_event_line, paginate, text_length  # noqa: E402
+
+
+def test_format_event_line_escapes_summary():
+    assert format_event_line({'summary': "<b>Встреча</b>", 'start': datetime(2026, 3, 7, 15)}) == \
+        "📅 &lt;b&gt;Встреча&lt;/b&gt; - 07.03.2026 15:00"
+    assert format_event_line({'summary': "Отпуск", 'start': date(2026, 3, 7)}) == "📅 Отпуск - 07.03.2026 (весь день)"
+
+
+def test_text_length_counts_utf16_units():
+    assert text_length("📅 а") == 4
+
+
+def test_paginate_keeps_lines_whole_within_limit():
+    lines = [f"строка {i:03d}" for i in range(100)]
+    pages = paginate(lines, limit=100)
+    assert all(text_length(page) <= 100 for page in pages)
+    assert "\n".join(pages).split("\n") == lines
+    assert paginate([], limit=100) == []
+
+
+def test_paginate_truncates_long_line():
+    pages = paginate(["x" * 300], limit=100)
+    assert len(pages) == 1 and text_length(pages[0]) == 100 and pages[0].endswith("…")
+
+
+def test_render_clamps_page_and_numbers_title():
+    events = [{'summary': f"Событие {i}" + "." * 200, 'start': datetime(2026, 3, 2, 9)} for i in range(60)]
+    pages = EventPages(datetime(2026, 3, 2), datetime(2026, 3, 9), events)
+    assert len(pages) > 1
+    assert pages.render(99, "События").startswith(f"События (стр. {len(pages)} из {len(pages)})")
+
+
+def test_pages_cache_expires():
+    cache = EventPagesCache(ttl=10)
+    pages = EventPages(datetime(2026, 3, 2), datetime(2026, 3, 9), [])
+    cache.put(1, pages)
+    assert cache.get(1, datetime(2026, 3, 2)) is pages
+    pages.created -= 11
+    assert cache.get(1, datetime(2026, 3, 2)) is None
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+
+from event_parser import describe_rrule, parse_event
+
+# Среда, полдень
+NOW = datetime(2026, 10, 14, 12)
+
+
+@pytest.mark.parametrize("text, summary, start, end, rrule", [
+    ("встреча с командой завтра в 15:00 на 2 часа", "встреча с командой",
+     datetime(2026, 10, 15, 15), datetime(2026, 10, 15, 17), None),
+    ("планерка по понедельникам в 10", "планерка",
+     datetime(2026, 10, 19, 10), datetime(2026, 10, 19, 11), "FREQ=WEEKLY;BYDAY=MO"),
+    ("обед с 13 до 14", "обед", datetime(2026, 10, 14, 13), datetime(2026, 10, 14, 14), None),
+    ("созвон 7 марта в 15:00", "созвон", datetime(2027, 3, 7, 15), datetime(2027, 3, 7, 16), None),
+    ("йога каждый день в 8:00", "йога", datetime(2026, 10, 15, 8), datetime(2026, 10, 15, 9), "FREQ=DAILY"),
+    ("отчет через 2 недели в 9:30 на полчаса", "отчет",
+     datetime(2026, 10, 28, 9, 30), datetime(2026, 10, 28, 10), None),
+    ("каждую среду и пятницу в 9 зарядка", "зарядка",
+     datetime(2026, 10, 16, 9), datetime(2026, 10, 16, 10), "FREQ=WEEKLY;BYDAY=WE,FR"),
+    ("бассейн каждый вторник, четверг в 7:30", "бассейн",
+     datetime(2026, 10, 15, 7, 30), datetime(2026, 10, 15, 8, 30), "FREQ=WEEKLY;BYDAY=TU,TH"),
+    ("конференция 20.10 в 9 на 2 дня", "конференция", datetime(2026, 10, 20, 9), datetime(2026, 10, 22, 9), None),
+    ("праздник на день рождения в 3 дня", "праздник на день рождения",
+     datetime(2026, 10, 14, 15), datetime(2026, 10, 14, 16), None),
+])
+def test_parse_event(text, summary, start, end, rrule):
+    event = parse_event(text, NOW)
+    assert (event.summary, event.start, event.end, event.rrule) == (summary, start, end, rrule)
+
+
+def test_text_without_time_is_not_an_event():
+    assert parse_event("просто текст", NOW) is None
+
+
+@pytest.mark.parametrize("text", [
+    "встреча через 99999999 дней в 10:00",
+    "встреча через 9999999999 дней в 10:00",
+    "отпуск завтра в 10:00 на 99999999 дней",
+    "звонок завтра в 10:00 на 99999999999999 часов",
+])
+def test_date_out_of_range_is_not_an_event(text):
+    assert parse_event(text, NOW) is None
+
+
+def test_describe_rrule():
+    assert describe_rrule("FREQ=WEEKLY;BYDAY=MO") == "по понедельникам"
+    assert describe_rrule("FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR") == "по будням"
+    assert describe_rrule("FREQ=DAILY;INTERVAL=2") == "каждые 2 дня"
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from freebusy import BusyMap
+
+DAY = datetime(2026, 3, 2)
+
+
+def at(hour: int, minute: int = 0, days: int = 0) -> datetime:
+    return DAY + timedelta(days=days, hours=hour, minutes=minute)
+
+
+def test_is_busy_overlap_excludes_touching_periods():
+    busy = BusyMap.from_intervals([(at(10), at(11))])
+    assert busy.is_busy(at(10, 30), at(10, 45))
+    assert busy.is_busy(at(9, 55), at(10, 5))
+    assert not busy.is_busy(at(9), at(10))
+    assert not busy.is_busy(at(11), at(11, 30))
+    assert not busy.is_busy(at(10, 30), at(10, 30))
+
+
+def test_periods_are_rounded_to_five_minutes():
+    busy = BusyMap.from_intervals([(at(10, 3), at(10, 7))])
+    assert busy.is_busy(at(10), at(10, 1))
+    assert busy.is_busy(at(10, 8), at(10, 9))
+    assert not busy.is_busy(at(10, 10), at(10, 15))
+    assert busy.free_periods(at(10), at(10, 30)) == [(at(10, 10), at(10, 30))]
+
+
+def test_event_over_midnight_marks_both_days():
+    busy = BusyMap.from_intervals([(at(23, 30), at(0, 30, days=1))])
+    assert set(busy.days) == {DAY.date(), (DAY + timedelta(days=1)).date()}
+    assert busy.is_busy(at(0, 0, days=1), at(0, 15, days=1))
+    assert not busy.is_busy(at(0, 30, days=1), at(1, 0, days=1))
+
+
+def test_free_period_over_midnight_is_one_window():
+    busy = BusyMap()
+    assert busy.free_periods(at(22), at(2, days=1)) == [(at(22), at(2, days=1))]
+    assert busy.free_periods(at(22), at(0, days=1)) == [(at(22), at(0, days=1))]
+
+
+def test_free_periods_keep_unaligned_bounds_and_drop_short_windows():
+    busy = BusyMap.from_intervals([(at(10), at(10, 20)), (at(10, 40), at(11)), (at(12), at(13))])
+    assert busy.free_periods(at(9, 3), at(13, 32)) == [
+        (at(9, 3), at(10)), (at(10, 20), at(10, 40)), (at(11), at(12)), (at(13), at(13, 32))
+    ]
+    assert busy.free_periods(at(9, 3), at(13, 32), timedelta(minutes=30)) == [
+        (at(9, 3), at(10)), (at(11), at(12)), (at(13), at(13, 32))
+    ]
+
+
+def test_update_merges_maps():
+    busy = BusyMap.from_intervals([(at(10), at(11))])
+    busy.update(BusyMap.from_intervals([(at(12), at(13)), (at(10), at(11))]))
+    assert busy.free_periods(at(10), at(13)) == [(at(11), at(12))]
+
+
+@pytest.mark.parametrize("options, sync_supported, freebusy_supported", [
+    (dict(sync_support=True), True, None),
+    (dict(sync_support=False, freebusy_support=True), False, True),
+    (dict(sync_support=False, freebusy_support=False), False, False),
+], ids=["full-copy", "free-busy-query", "window-events"])
+def test_busy_map_sources_match_server(caldav_server, options, sync_supported, freebusy_supported):
+    from calendar_utils import CalendarManager
+
+    server = caldav_server(**options)
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(weeks=2)
+    server.populate(60, start, span_days=14, recurring_every=5)
+    reference = BusyMap.from_intervals(
+        period for res in server.calendars["main"].objects.values() for period in res.busy_periods(start, end)
+    )
+
+    async def scenario():
+        manager = CalendarManager(server.url, "test", "test")
+        assert await manager.connect()
+        busy = await manager.busy(start, end)
+        await manager.close()
+        return manager, busy
+
+    manager, busy = asyncio.run(scenario())
+    assert (manager.cache.sync_supported, manager.freebusy_supported) == (sync_supported, freebusy_supported)
+    checks = [(start + timedelta(minutes=15 * i), start + timedelta(minutes=15 * i + 20)) for i in range(14 * 96)]
+    assert [busy.is_busy(*check) for check in checks] == [reference.is_busy(*check) for check in checks]
+    assert busy.free_periods(start, end, timedelta(minutes=30)) == \
+        reference.free_periods(start, end, timedelta(minutes=30))
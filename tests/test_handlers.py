@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+
+class StubMessage:
+    """Сообщение Telegram, сохраняющее ответы бота"""
+
+    def __init__(self, user_id: int = 1, chat_id: int = 10):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.chat = SimpleNamespace(id=chat_id)
+        self.answers = []
+
+    async def answer(self, text: str, **kwargs) -> None:
+        self.answers.append(text)
+
+
+def test_event_in_free_slot_is_not_reported_as_conflict(caldav_server, monkeypatch):
+    import handlers
+    from calendar_utils import CalendarManager
+    from event_parser import ParsedEvent
+    from write_queue import WriteQueue
+
+    server = caldav_server(latency=0.02, sync_support=False, freebusy_support=False)
+    base = (datetime.now() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+
+    async def scenario():
+        manager = CalendarManager(server.url, "test", "test")
+        assert await manager.connect()
+
+        async def resolve(user_id):
+            return manager
+
+        queue = WriteQueue("", resolve, retry_min_delay=0.01, retry_max_delay=0.05)
+        monkeypatch.setattr(handlers, "get_calendar_manager", resolve)
+        monkeypatch.setattr(handlers, "write_queue", queue)
+        queue.start()
+        messages = []
+        for i in range(10):
+            message = StubMessage()
+            start = base + timedelta(hours=i)
+            await handlers.queue_event(message, ParsedEvent(f"Событие {i}", start, start + timedelta(minutes=30)))
+            messages.append(message)
+        while queue.pending():
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        await manager.close()
+        return messages
+
+    messages = asyncio.run(scenario())
+    assert len(server.calendars["main"].objects) == 10
+    assert not [text for message in messages for text in message.answers if "Внимание" in text]
+
+
+def test_ics_document_is_imported_only_in_private_chats():
+    from aiogram.types import Chat, Document, Message
+    import handlers
+
+    handler = next(handler for handler in handlers.router.message.handlers
+                   if handler.callback is handlers.ics_document_handler)
+
+    def document_message(chat_type: str) -> Message:
+        return Message(message_id=1, date=datetime.now(), chat=Chat(id=10, type=chat_type),
+                       document=Document(file_id="file", file_unique_id="file", file_name="Events.ICS"))
+
+    async def matches(chat_type: str) -> bool:
+        passed, _ = await handler.check(document_message(chat_type))
+        return passed
+
+    assert asyncio.run(matches("private"))
+    assert not asyncio.run(matches("group"))
+    assert not asyncio.run(matches("supergroup"))
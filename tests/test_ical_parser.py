@@ -0,0 +1,51 @@
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from ical_parser import NeedsFullParser, parse_freebusy, parse_vevents
+
+
+def calendar(*lines: str) -> str:
+    return "\r\n".join(("BEGIN:VCALENDAR", "VERSION:2.0", *lines, "END:VCALENDAR", ""))
+
+
+def test_parse_vevents_values_and_time_zones():
+    records = parse_vevents(calendar(
+        "BEGIN:VEVENT", "UID:1", "SUMMARY:Встреча\\, важная", "DTSTART:20260302T090000Z", "DTEND:20260302T100000Z",
+        "BEGIN:VALARM", "ACTION:DISPLAY", "SUMMARY:Не название", "TRIGGER:-PT15M", "END:VALARM",
+        "END:VEVENT",
+        "BEGIN:VEVENT", "UID:2", "SUMMARY:Длинное ", " название", "DTSTART;TZID=Europe/Moscow:20260302T120000",
+        "DURATION:PT1H30M", "END:VEVENT",
+        "BEGIN:VEVENT", "UID:3", "SUMMARY:Отпуск", "DTSTART;VALUE=DATE:20260303", "DTEND;VALUE=DATE:20260305",
+        "END:VEVENT",
+    ))
+    assert [(r.summary, r.start, r.end, r.duration) for r in records] == [
+        ("Встреча, важная", datetime(2026, 3, 2, 9, tzinfo=timezone.utc),
+         datetime(2026, 3, 2, 10, tzinfo=timezone.utc), None),
+        ("Длинное название", datetime(2026, 3, 2, 12, tzinfo=ZoneInfo("Europe/Moscow")), None,
+         timedelta(hours=1, minutes=30)),
+        ("Отпуск", date(2026, 3, 3), date(2026, 3, 5), None),
+    ]
+
+
+@pytest.mark.parametrize("line", ["RRULE:FREQ=WEEKLY", "DTSTART;TZID=Нет/Пояса:20260302T120000"])
+def test_parse_vevents_needs_full_parser(line):
+    with pytest.raises(NeedsFullParser):
+        parse_vevents(calendar("BEGIN:VEVENT", "SUMMARY:Серия", "DTSTART:20260302T090000Z", line, "END:VEVENT"))
+
+
+def test_parse_freebusy_periods():
+    periods = parse_freebusy(calendar(
+        "BEGIN:VFREEBUSY",
+        "FREEBUSY;FBTYPE=BUSY:20260302T090000Z/20260302T100000Z,20260302T120000Z/PT30M",
+        "FREEBUSY;FBTYPE=FREE:20260302T130000Z/20260302T140000Z",
+        "FREEBUSY:20260302T150000Z/20260302T160000Z",
+        "END:VFREEBUSY",
+    ))
+    utc = timezone.utc
+    assert periods == [
+        (datetime(2026, 3, 2, 9, tzinfo=utc), datetime(2026, 3, 2, 10, tzinfo=utc)),
+        (datetime(2026, 3, 2, 12, tzinfo=utc), datetime(2026, 3, 2, 12, 30, tzinfo=utc)),
+        (datetime(2026, 3, 2, 15, tzinfo=utc), datetime(2026, 3, 2, 16, tzinfo=utc)),
+    ]
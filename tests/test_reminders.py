@@ -0,0 +1,129 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from reminders import Reminder, ReminderScheduler  # noqa: E402
+
+
+class StubCalendar:
+    """Менеджер календаря со списком событий в памяти"""
+
+    def __init__(self, events: list):
+        self.events = events
+        self.requests = 0
+
+    async def list_events(self, start, end, raise_errors=False):
+        self.requests += 1
+        return [event for event in self.events if start <= event['start'] < end]
+
+
+def event(summary: str, start: datetime) -> dict:
+    return {'summary': summary, 'start': start, 'end': start + timedelta(minutes=30)}
+
+
+def make_scheduler(path: str, calendar: StubCalendar, sent: list = None) -> ReminderScheduler:
+    async def resolve(user_id):
+        return calendar
+
+    async def send(chat_id, text):
+        sent.append((chat_id, text))
+
+    return ReminderScheduler(path, resolve, send=send if sent is not None else None, refresh_interval=3600)
+
+
+def test_heap_pops_due_reminders_in_order_and_skips_cancelled():
+    scheduler = ReminderScheduler("", None)
+    now = time.time()
+    for reminder_id, offset in enumerate((30, 10, 20, 40)):
+        scheduler._schedule(Reminder((reminder_id, 1, 1, f"Событие {reminder_id}", datetime.now(), now + offset)))
+    scheduler._cancel(2)
+    assert [reminder.id for reminder in scheduler._pop_due(now + 35)] == [1, 0]
+    assert scheduler.scheduled() == 1
+
+
+def test_refresh_changes_only_affected_reminders():
+    base = datetime.now().replace(microsecond=0) + timedelta(hours=2)
+    calendar = StubCalendar([event("Остается", base), event("Удаляется", base + timedelta(hours=1))])
+
+    async def scenario():
+        scheduler = make_scheduler("", calendar)
+        await scheduler.subscribe(1, 10, 15)
+        await scheduler._refresh_user(1, 10, 15)
+        kept = {reminder.summary: reminder.id for reminder in scheduler._scheduled.values()}
+
+        calendar.events = [calendar.events[0], event("Новое", base + timedelta(hours=3))]
+        await scheduler._refresh_user(1, 10, 15)
+        current = {reminder.summary: reminder.id for reminder in scheduler._scheduled.values()}
+        await scheduler.stop()
+        return kept, current
+
+    kept, current = asyncio.run(scenario())
+    assert set(kept) == {"Остается", "Удаляется"}
+    assert set(current) == {"Остается", "Новое"}
+    assert current["Остается"] == kept["Остается"]
+
+
+def test_reminders_are_sent_once_per_chat_and_survive_restart(tmp_path):
+    path = str(tmp_path / "reminders.db")
+    # Напоминания за минуту до начала наступают через доли секунды
+    soon = datetime.now() + timedelta(minutes=1, seconds=0.3)
+    later = datetime.now().replace(microsecond=0) + timedelta(hours=3)
+    calendar = StubCalendar([event("Первое", soon), event("Второе", soon), event("Позже", later)])
+    sent = []
+
+    async def scenario():
+        scheduler = make_scheduler(path, calendar, sent)
+        await scheduler.start()
+        await scheduler.subscribe(1, 10, 1)
+
+        async def delivered():
+            while not sent:
+                await asyncio.sleep(0.02)
+        await asyncio.wait_for(delivered(), 5)
+        await scheduler.stop()
+
+        requests = calendar.requests
+        restarted = make_scheduler(path, calendar, sent)
+        await restarted.start()
+        loaded = [reminder.summary for reminder in restarted._scheduled.values()]
+        await restarted.stop()
+        return requests, loaded
+
+    requests, loaded = asyncio.run(scenario())
+    assert len(sent) == 1 and sent[0][0] == 10
+    assert "Первое" in sent[0][1] and "Второе" in sent[0][1]
+    assert loaded == ["Позже"]
+    assert calendar.requests == requests
+
+
+def test_reminder_for_queued_event_is_kept_until_written():
+    base = datetime.now().replace(microsecond=0) + timedelta(hours=2)
+    calendar = StubCalendar([])
+    queued = {"uid-1"}
+
+    async def resolve(user_id):
+        return calendar
+
+    async def scenario():
+        scheduler = ReminderScheduler("", resolve, refresh_interval=3600,
+                                      pending_writes=lambda uids: queued & set(uids))
+        await scheduler.subscribe(1, 10, 15)
+        await scheduler.add(1, "В очереди", base, "uid-1")
+        # Событие еще не записано в календарь: обновление не удаляет напоминание
+        await scheduler._refresh_user(1, 10, 15)
+        while_queued = [reminder.summary for reminder in scheduler._scheduled.values()]
+
+        # Очередь отказалась от записи: события нет в календаре, и напоминание удаляется
+        queued.clear()
+        await scheduler._refresh_user(1, 10, 15)
+        after = [reminder.summary for reminder in scheduler._scheduled.values()]
+        await scheduler.stop()
+        return while_queued, after
+
+    while_queued, after = asyncio.run(scenario())
+    assert while_queued == ["В очереди"]
+    assert after == []
@@ -0,0 +1,134 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from write_queue import WriteQueue  # noqa: E402
+
+START = datetime(2030, 1, 7, 10)
+
+
+@dataclass
+class Result:
+    success: bool
+    status: int = None
+    error: str = None
+
+    def __bool__(self) -> bool:
+        return self.success
+
+
+class StubCalendar:
+    """Менеджер календаря, сохраняющий события по UID в памяти"""
+
+    def __init__(self, status: int = 201):
+        self.status = status
+        self.saved = {}
+
+    async def add_events(self, events):
+        results = []
+        for summary, start_time, end_time, uid, rrule in events:
+            if self.status >= 400:
+                results.append(Result(False, self.status, f"{self.status} Error"))
+                continue
+            self.saved[uid] = (summary, start_time, end_time, rrule)
+            results.append(Result(True, self.status))
+        return results
+
+
+async def wait_empty(queue: WriteQueue, timeout: float = 5) -> None:
+    async def poll():
+        while queue.pending():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+def make_queue(path, calendar, available, notifications) -> WriteQueue:
+    async def resolve(user_id):
+        return calendar if available[0] else None
+
+    async def notify(chat_id, text):
+        notifications.append((chat_id, text))
+
+    return WriteQueue(path, resolve, notify, retry_min_delay=0.01, retry_max_delay=0.05)
+
+
+def test_events_wait_for_server_and_are_written_once(tmp_path):
+    calendar, available, notifications = StubCalendar(), [False], []
+
+    async def scenario():
+        queue = make_queue(str(tmp_path / "queue.db"), calendar, available, notifications)
+        queue.start()
+        uids = [await queue.enqueue(1, 10, f"Событие {i}", START + timedelta(hours=i),
+                                    START + timedelta(hours=i + 1), "FREQ=DAILY" if i == 0 else None)
+                for i in range(5)]
+        await asyncio.sleep(0.1)
+        assert queue.pending() == 5
+        assert queue.pending_uids(uids[:2] + ["записано ранее"]) == set(uids[:2])
+        available[0] = True
+        await wait_empty(queue)
+        assert queue.pending_uids(uids) == set()
+        await queue.stop()
+        return uids
+
+    uids = asyncio.run(scenario())
+    assert sorted(calendar.saved) == sorted(uids)
+    assert calendar.saved[uids[0]] == ("Событие 0", START, START + timedelta(hours=1), "FREQ=DAILY")
+    assert len(notifications) == 5 and all("сохранено" in text for _, text in notifications)
+
+
+def test_permanent_error_drops_event_and_notifies(tmp_path):
+    calendar, notifications = StubCalendar(status=403), []
+
+    async def scenario():
+        queue = make_queue("", calendar, [True], notifications)
+        queue.start()
+        await queue.enqueue(1, 10, "Запрещено", START, START + timedelta(hours=1))
+        await wait_empty(queue)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert not calendar.saved
+    assert notifications == [(10, "Не удалось сохранить событие 'Запрещено': 403 Error. Пожалуйста, добавьте его снова.")]
+
+
+def test_queue_survives_restart(tmp_path):
+    path = str(tmp_path / "queue.db")
+    calendar, notifications = StubCalendar(), []
+
+    async def scenario():
+        # Процесс принял событие и остановился, не успев его отправить
+        queue = make_queue(path, calendar, [True], notifications)
+        uid = await queue.enqueue(1, 10, "После перезапуска", START, START + timedelta(hours=1))
+        await queue.stop()
+        assert not calendar.saved
+
+        restarted = make_queue(path, calendar, [True], notifications)
+        restarted.start()
+        await wait_empty(restarted)
+        await restarted.stop()
+        return uid
+
+    uid = asyncio.run(scenario())
+    assert list(calendar.saved) == [uid]
+
+
+def test_repeated_uid_does_not_create_duplicate(caldav_server):
+    from calendar_utils import CalendarManager
+
+    server = caldav_server()
+
+    async def scenario():
+        manager = CalendarManager(server.url, "test", "test")
+        assert await manager.connect()
+        first = await manager.add_event("Повтор", START)
+        second = await manager.add_event("Повтор", START, uid=first.uid)
+        await manager.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first and second and first.uid == second.uid
+    assert len(server.calendars["main"].objects) == 1
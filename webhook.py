@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+import config
+
+
+class WebhookHandler(SimpleRequestHandler):
+    """
+    Обработчик запросов вебхука
+
+    Проверяет секретный токен и сразу отвечает Telegram, а обновление
+    обрабатывается в фоновой задаче. При остановке сервера принятые
+    обновления дорабатываются (drain), а не обрываются.
+    """
+
+    @property
+    def in_flight(self) -> int:
+        """Число обновлений, которые еще обрабатываются"""
+        return len(self._background_feed_update_tasks)
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Ожидание завершения обработки принятых обновлений
+
+        :param timeout: Максимальное ожидание в секундах
+        :return: True если все обновления обработаны
+        """
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return True
+        logging.info(f"Ожидание обработки {len(tasks)} принятых обновлений...")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logging.warning(f"Не дождались обработки {len(pending)} обновлений за {timeout} сек")
+            for task in pending:
+                task.cancel()
+            return False
+        return True
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, worker: int = 0) -> None:
+    """
+    Прием обновлений через вебхук до получения SIGINT/SIGTERM
+
+    Порядок остановки: закрывается прием соединений, дорабатываются
+    принятые обновления, затем вызываются обработчики shutdown диспетчера.
+
+    :param worker: Номер процесса; вебхук в Telegram регистрирует только процесс 0
+    """
+    handler = WebhookHandler(dispatcher=dp, bot=bot, secret_token=config.WEBHOOK_SECRET)
+    app = web.Application()
+    app.router.add_post(config.WEBHOOK_PATH, handler.handle)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    # Несколько процессов слушают один порт, ядро распределяет между ними соединения
+    site = web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT, reuse_port=config.WEBHOOK_WORKERS > 1)
+    await site.start()
+    logging.info(f"Процесс {worker}: прием обновлений на {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+
+    try:
+        if worker == 0:
+            webhook_url = config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH
+            await bot.set_webhook(
+                webhook_url,
+                secret_token=config.WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logging.info(f"Вебхук установлен: {webhook_url}")
+        await stop.wait()
+    finally:
+        logging.info(f"Процесс {worker}: остановка приема обновлений...")
+        await site.stop()
+        await handler.drain(config.SHUTDOWN_TIMEOUT)
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+
+
+def run_workers(target, count: int) -> None:
+    """
+    Запуск нескольких процессов вебхука и ожидание их завершения
+
+    SIGTERM, полученный основным процессом, передается дочерним,
+    каждый из них корректно завершает свою работу.
+
+    :param target: Функция процесса, принимающая номер процесса
+    :param count: Число процессов
+    """
+    processes = [multiprocessing.Process(target=target, args=(worker,), name=f"webhook-{worker}")
+                 for worker in range(count)]
+    for process in processes:
+        process.start()
+
+    def terminate(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # SIGINT от терминала получают все процессы группы, остается дождаться их
+        for process in processes:
+            process.join()
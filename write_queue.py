@@ -0,0 +1,342 @@
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from metrics import Counter
+
+# Ответы сервера, после которых повторять запись бесполезно (кроме таймаута, конфликта блокировки
+# и превышения частоты запросов)
+_RETRYABLE_CLIENT_ERRORS = (408, 423, 429)
+
+WRITE_QUEUE_RESULTS = Counter(
+    "write_queue_results_total", "Обработанные записи очереди событий: сохранены, отложены, отклонены",
+    labels=("result",)
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER,
+    summary TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    rrule TEXT,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS pending_events_due ON pending_events (next_attempt);
+"""
+
+
+class PendingEvent:
+    """Событие, ожидающее записи в календарь"""
+
+    __slots__ = ("id", "uid", "user_id", "chat_id", "summary", "start_time", "end_time", "rrule", "created",
+                 "attempts")
+
+    def __init__(self, row: tuple):
+        (self.id, self.uid, self.user_id, self.chat_id, self.summary,
+         start_time, end_time, self.rrule, self.created, self.attempts) = row
+        self.start_time = datetime.fromisoformat(start_time)
+        self.end_time = datetime.fromisoformat(end_time)
+
+
+class WriteQueue:
+    """
+    Очередь записи событий в календарь с журналом в SQLite
+
+    Событие сначала сохраняется в локальную базу, и пользователь сразу получает
+    ответ, а фоновая задача пакетами отправляет события на CalDAV сервер.
+    Неудачные записи повторяются с экспоненциально растущей паузой, поэтому
+    недоступность сервера не теряет события, а очередь переживает перезапуск бота.
+    Каждое событие получает UID при постановке в очередь, и повторная отправка
+    не создает дубликатов.
+
+    Несколько процессов могут работать с одним файлом: записи пакета
+    блокируются на время отправки (locked_until), и другой процесс их не берет.
+    """
+
+    def __init__(self, path: str, resolve, notify=None, batch_size: int = 20,
+                 retry_min_delay: float = 5, retry_max_delay: float = 600,
+                 max_age: float = 86400, lease: float = 300):
+        """
+        :param path: Путь к файлу базы (пустая строка - хранить только в памяти)
+        :param resolve: Корутина (user_id) -> подключенный менеджер календаря или None
+        :param notify: Корутина (chat_id, текст) для сообщений о результате отложенной записи
+        :param batch_size: Сколько событий отправлять за один проход
+        :param retry_min_delay: Пауза перед первой повторной попыткой в секундах
+        :param retry_max_delay: Максимальная пауза между попытками в секундах
+        :param max_age: Сколько секунд пытаться записать событие, прежде чем отказаться
+        :param lease: На сколько секунд блокируются записи отправляемого пакета
+        """
+        self.path = path
+        self.resolve = resolve
+        self.notify = notify
+        self.batch_size = batch_size
+        self.retry_min_delay = retry_min_delay
+        self.retry_max_delay = retry_max_delay
+        self.max_age = max_age
+        self.lease = lease
+        self.lock = threading.Lock()
+        self._db = None
+        self._wakeup = None
+        self._task = None
+        self._claimed = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path or ":memory:", timeout=30, check_same_thread=False,
+                                 isolation_level=None)
+            # WAL: запись не блокирует чтение других процессов; журнал сбрасывается
+            # на диск при контрольных точках, что сохраняет данные при падении процесса
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            # Очереди, созданные до поддержки повторяющихся событий
+            columns = {row[1] for row in db.execute("PRAGMA table_info(pending_events)")}
+            if "rrule" not in columns:
+                db.execute("ALTER TABLE pending_events ADD COLUMN rrule TEXT")
+            self._db = db
+        return self._db
+
+    def _insert(self, user_id: int, chat_id: int, summary: str, start_time: datetime, end_time: datetime,
+                rrule: str) -> str:
+        uid = str(uuid.uuid4())
+        now = time.time()
+        with self.lock:
+            self._connect().execute(
+                "INSERT INTO pending_events"
+                " (uid, user_id, chat_id, summary, start_time, end_time, rrule, created, next_attempt)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (uid, user_id, chat_id, summary, start_time.isoformat(), end_time.isoformat(), rrule, now, now)
+            )
+        return uid
+
+    def _claim(self) -> list:
+        """Выборка и блокировка пакета событий, время отправки которых наступило"""
+        now = time.time()
+        with self.lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT id, uid, user_id, chat_id, summary, start_time, end_time, rrule, created, attempts"
+                    " FROM pending_events WHERE next_attempt <= ? AND locked_until <= ?"
+                    " ORDER BY next_attempt LIMIT ?",
+                    (now, now, self.batch_size)
+                ).fetchall()
+                db.executemany("UPDATE pending_events SET locked_until = ? WHERE id = ?",
+                               [(now + self.lease, row[0]) for row in rows])
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return [PendingEvent(row) for row in rows]
+
+    def _finish(self, done: list, retry: list) -> None:
+        """
+        Удаление обработанных событий и перенос неудачных попыток
+
+        :param done: Идентификаторы записанных или отклоненных событий
+        :param retry: Кортежи (идентификатор, число попыток, время следующей попытки, ошибка)
+        """
+        with self.lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany("DELETE FROM pending_events WHERE id = ?", [(event_id,) for event_id in done])
+                db.executemany(
+                    "UPDATE pending_events SET attempts = ?, next_attempt = ?, locked_until = 0, last_error = ?"
+                    " WHERE id = ?",
+                    [(attempts, next_attempt, error, event_id) for event_id, attempts, next_attempt, error in retry]
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _release(self, ids: list) -> None:
+        """Снятие блокировки с событий, отправка которых прервана остановкой бота"""
+        with self.lock:
+            self._connect().executemany("UPDATE pending_events SET locked_until = 0 WHERE id = ?",
+                                        [(event_id,) for event_id in ids])
+
+    def _next_due(self) -> float:
+        """Время, когда наступит срок отправки ближайшего события (None - очередь пуста)"""
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT MIN(MAX(next_attempt, locked_until)) FROM pending_events"
+            ).fetchone()
+        return row[0]
+
+    def pending(self) -> int:
+        """Число событий в очереди"""
+        with self.lock:
+            return self._connect().execute("SELECT COUNT(*) FROM pending_events").fetchone()[0]
+
+    def pending_uids(self, uids: list) -> set:
+        """
+        UID событий, которые еще ждут записи в календарь
+
+        Событие покидает очередь, когда сервер подтвердил запись или окончательно ее отклонил.
+
+        :param uids: Проверяемые UID
+        :return: Множество UID из uids, которые остаются в очереди
+        """
+        with self.lock:
+            db = self._connect()
+            return {row[0] for row in db.execute(
+                f"SELECT uid FROM pending_events WHERE uid IN ({', '.join('?' * len(uids))})", uids
+            )} if uids else set()
+
+    async def enqueue(self, user_id: int, chat_id: int, summary: str, start_time: datetime,
+                      end_time: datetime, rrule: str = None) -> str:
+        """
+        Постановка события в очередь записи
+
+        Возвращается после сохранения события в базе, не дожидаясь CalDAV сервера.
+
+        :param rrule: Правило повторения (RRULE) или None
+        :return: UID события
+        """
+        uid = await asyncio.to_thread(self._insert, user_id, chat_id, summary, start_time, end_time, rrule)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return uid
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_min_delay * 2 ** (attempts - 1), self.retry_max_delay)
+        # Случайный разброс, чтобы после восстановления сервера записи не отправлялись одновременно
+        return delay * random.uniform(0.9, 1.1)
+
+    async def _send_user_batch(self, user_id: int, events: list) -> tuple:
+        """
+        Отправка событий одного пользователя
+
+        :return: Кортеж (список (событие, AddEventResult или None), ошибка подключения или None)
+        """
+        try:
+            manager = await self.resolve(user_id)
+        except Exception as e:
+            logging.error(f"Ошибка при получении календаря пользователя {user_id}: {e}")
+            manager = None
+        if manager is None:
+            return [(event, None) for event in events], "Календарь недоступен"
+        results = await manager.add_events(
+            [(event.summary, event.start_time, event.end_time, event.uid, event.rrule) for event in events]
+        )
+        return list(zip(events, results)), None
+
+    async def _process(self, events: list) -> None:
+        by_user = {}
+        for event in events:
+            by_user.setdefault(event.user_id, []).append(event)
+        batches = await asyncio.gather(*(self._send_user_batch(user_id, items) for user_id, items in by_user.items()))
+
+        now = time.time()
+        done, retry, messages = [], [], []
+        postponed = {}
+        for results, unavailable in batches:
+            for event, result in results:
+                attempts = event.attempts + 1
+                if result:
+                    done.append(event.id)
+                    WRITE_QUEUE_RESULTS.inc("saved")
+                    if event.attempts:
+                        messages.append((event.chat_id, f"Событие '{event.summary}' сохранено в календаре."))
+                    continue
+
+                error = unavailable or result.error
+                status = result.status if result is not None else None
+                permanent = status is not None and 400 <= status < 500 and status not in _RETRYABLE_CLIENT_ERRORS
+                if permanent or now - event.created >= self.max_age:
+                    done.append(event.id)
+                    WRITE_QUEUE_RESULTS.inc("failed")
+                    logging.error(f"Событие {event.uid} ({event.summary}) не сохранено после {attempts} попыток: {error}")
+                    messages.append((event.chat_id, f"Не удалось сохранить событие '{event.summary}': {error}. "
+                                                    "Пожалуйста, добавьте его снова."))
+                else:
+                    retry.append((event.id, attempts, now + self._retry_delay(attempts), error))
+                    postponed[error] = postponed.get(error, 0) + 1
+                    WRITE_QUEUE_RESULTS.inc("retried")
+
+        for error, count in postponed.items():
+            logging.warning(f"Запись {count} событий отложена: {error}")
+        await asyncio.to_thread(self._finish, done, retry)
+        self._claimed.difference_update(event.id for event in events)
+
+        if self.notify is not None:
+            for chat_id, text in messages:
+                if chat_id is None:
+                    continue
+                try:
+                    await self.notify(chat_id, text)
+                except Exception as e:
+                    logging.warning(f"Не удалось сообщить в чат {chat_id} о записи события: {e}")
+
+    async def _run(self) -> None:
+        """Фоновая отправка событий до остановки очереди"""
+        while True:
+            self._wakeup.clear()
+            events = await asyncio.to_thread(self._claim)
+            if events:
+                self._claimed.update(event.id for event in events)
+                await self._process(events)
+                continue
+
+            due = await asyncio.to_thread(self._next_due)
+            # Без ближайшего срока очередь проверяется раз в минуту: события могут
+            # добавлять другие процессы бота
+            timeout = 60 if due is None else min(60, max(0.0, due - time.time()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await self._run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Ошибка очереди записи событий: {e}")
+                await asyncio.sleep(self.retry_min_delay)
+
+    def start(self) -> None:
+        """Открытие базы и запуск фоновой отправки"""
+        self._connect()
+        pending = self.pending()
+        if pending:
+            logging.info(f"В очереди записи {pending} событий, отправка продолжится")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        """Остановка фоновой отправки; события недописанного пакета остаются в очереди"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        with self.lock:
+            db = self._db
+        if db is not None:
+            if self._claimed:
+                self._release(list(self._claimed))
+                self._claimed.clear()
+            with self.lock:
+                db.close()
+                self._db = None